@@ -1,18 +1,35 @@
+import operator
 from WorldState import WorldState, calculate_move_cost
 
+# Action kinds: movement actions change agent_position to target_pos, task actions only apply effects
+MOVE = 'move'
+TASK = 'task'
+
+# Comparisons allowed in numeric_preconditions
+NUMERIC_OPERATORS = {'>=': operator.ge, '>': operator.gt, '<=': operator.le, '<': operator.lt}
+
 class Action:
-    def __init__(self, name, preconditions, local_effects, shared_effects, base_cost=1, target_pos=None, cost_modifiers=None):
+    def __init__(self, name, preconditions, local_effects, shared_effects, base_cost=1, target_pos=None, cost_modifiers=None, kind=TASK,
+                 numeric_preconditions=None, local_deltas=None, shared_deltas=None):
             self.name = name
+            self.kind = kind
             self.preconditions = preconditions
             self.local_effects = local_effects        # Affects agent_state_dict
             self.shared_effects = shared_effects      # Affects world_state_dict
+            # Numeric resources: {'key': ('>=', amount)} checks and {'key': +/-amount} changes
+            self.numeric_preconditions = numeric_preconditions if numeric_preconditions is not None else {}
+            self.local_deltas = local_deltas if local_deltas is not None else {}
+            self.shared_deltas = shared_deltas if shared_deltas is not None else {}
+            for op, _ in self.numeric_preconditions.values():
+                if op not in NUMERIC_OPERATORS:
+                    raise ValueError(f"Unknown numeric precondition '{op}' in {name}. Use one of {list(NUMERIC_OPERATORS)}")
             self.base_cost = base_cost
             self.target_pos = target_pos
             self.cost_modifiers = cost_modifiers if cost_modifiers is not None else []
 
     def get_cost(self, world_state_dict):
         current_cost = self.base_cost
-        if self.name.startswith('Move to'):
+        if self.kind == MOVE:
             current_pos = world_state_dict['agent_position']
             current_cost = calculate_move_cost(current_pos, self.target_pos)
         
@@ -23,24 +40,53 @@ class Action:
         return max(1, current_cost)
 
     def check_preconditions(self, world_state_dict, agent_state_dict):
-        # Merge shared and local state for precondition check
-        combined_state = {**world_state_dict, **agent_state_dict}
-        
-        if not all(combined_state.get(k) == v for k, v in self.preconditions.items()):
-            return False
+        # Look each key up in the local state first, then the shared state (no merged dict)
+        for k, v in self.preconditions.items():
+            current = agent_state_dict[k] if k in agent_state_dict else world_state_dict.get(k)
+            if current != v:
+                return False
 
-        if self.name.startswith('Move to'):
+        for k, (op, amount) in self.numeric_preconditions.items():
+            current = agent_state_dict[k] if k in agent_state_dict else world_state_dict.get(k)
+            if current is None or not NUMERIC_OPERATORS[op](current, amount):
+                return False
+
+        if self.kind == MOVE:
             if agent_state_dict['agent_position'] == self.target_pos:
                 return False
         
         return True
     
+    def min_cost(self):
+        """Lower bound of get_cost over every possible state (used by admissible heuristics)."""
+        if self.kind == MOVE:
+            # A move always changes position, so it is never cheaper than the cost floor of 1
+            return 1
+        reductions = sum(m['adjustment'] for m in self.cost_modifiers if m['adjustment'] < 0)
+        return max(1, self.base_cost + reductions)
+
+    def produces(self, key, value):
+        """True if applying this action sets key to value (in either the local or shared state)."""
+        if key == 'agent_position' and self.kind == MOVE:
+            return self.target_pos == value
+        if key in self.local_deltas or key in self.shared_deltas:
+            return True # A delta can reach any value, so assume it might (keeps heuristics admissible)
+        if key in self.local_effects:
+            return self.local_effects[key] == value
+        return key in self.shared_effects and self.shared_effects[key] == value
+
+    def combined_effects(self):
+        """All static effects of the action as one dict (local effects win, like the combined state)."""
+        return {**self.shared_effects, **self.local_effects}
+
     def apply_local_effects(self, agent_state_copy):
         """Applies local inventory and position changes."""
         agent_state_copy.update(self.local_effects)
+        for key, delta in self.local_deltas.items():
+            agent_state_copy[key] = agent_state_copy.get(key, 0) + delta
         
         # Dynamic Position Update
-        if self.name.startswith('Move to') and self.target_pos is not None:
+        if self.kind == MOVE and self.target_pos is not None:
             agent_state_copy['agent_position'] = self.target_pos
         
         return agent_state_copy
@@ -48,30 +94,31 @@ class Action:
     def apply_shared_effects(self, world_state_copy):
         """Applies changes to shared resources."""
         world_state_copy.update(self.shared_effects)
+        for key, delta in self.shared_deltas.items():
+            world_state_copy[key] = world_state_copy.get(key, 0) + delta
         return world_state_copy
+
+    def changes_shared_state(self):
+        return bool(self.shared_effects or self.shared_deltas)
     
 LOC = WorldState 
 
 ACTIONS = [
     # --- MOVEMENT ACTIONS (No direct effects, only update position dynamically) ---
-    Action(name='Move to Receiving', preconditions={}, local_effects={}, shared_effects={}, base_cost=1, target_pos=LOC.LOC_RECEIVING),
-    Action(name='Move to Cutter', preconditions={}, local_effects={}, shared_effects={}, base_cost=1, target_pos=LOC.LOC_CUTTER),
-    Action(name='Move to Assembler', preconditions={}, local_effects={}, shared_effects={}, base_cost=1, target_pos=LOC.LOC_ASSEMBLER),
-    Action(name='Move to Press', preconditions={}, local_effects={}, shared_effects={}, base_cost=1, target_pos=LOC.LOC_PRESS),
+    Action(name='Move to Receiving', preconditions={}, local_effects={}, shared_effects={}, base_cost=1, target_pos=LOC.LOC_RECEIVING, kind=MOVE),
+    Action(name='Move to Cutter', preconditions={}, local_effects={}, shared_effects={}, base_cost=1, target_pos=LOC.LOC_CUTTER, kind=MOVE),
+    Action(name='Move to Assembler', preconditions={}, local_effects={}, shared_effects={}, base_cost=1, target_pos=LOC.LOC_ASSEMBLER, kind=MOVE),
+    Action(name='Move to Press', preconditions={}, local_effects={}, shared_effects={}, base_cost=1, target_pos=LOC.LOC_PRESS, kind=MOVE),
 
     # --- RESOURCE ACQUISITION (The resource must be available and agent must not have it) ---
+    # One action covers any stock level: at least one unit in stock, and fetching takes one
     Action(
-        name='Fetch Raw Steel (Qty 2 -> 1)', 
-        preconditions={'agent_position': LOC.LOC_RECEIVING, 'has_raw_steel': 2, 'agent_has_steel': False},
+        name='Fetch Raw Steel', 
+        preconditions={'agent_position': LOC.LOC_RECEIVING, 'agent_has_steel': False},
+        numeric_preconditions={'has_raw_steel': ('>=', 1)},
         local_effects={'agent_has_steel': True}, 
-        shared_effects={'has_raw_steel': 1}, 
-        base_cost=15
-    ),
-    Action(
-        name='Fetch Raw Steel (Qty 1 -> 0)', 
-        preconditions={'agent_position': LOC.LOC_RECEIVING, 'has_raw_steel': 1, 'agent_has_steel': False},
-        local_effects={'agent_has_steel': True}, 
-        shared_effects={'has_raw_steel': 0}, 
+        shared_effects={}, 
+        shared_deltas={'has_raw_steel': -1},
         base_cost=15
     ),
 
@@ -1,9 +1,33 @@
-from Planner import plan_actions
+import time
+from Planner import plan_actions, IncrementalPlanner, AnytimePlanner
+from Regression import plan_backward
+from BatchExpansion import plan_batched
+from BoundedSearch import plan_bounded
+from Macros import MacroAction
 from Actions import ACTIONS
+from WorldStore import WorldStore
+from Trace import PLAN, EXPAND, ACTION, CONFLICT
 
 class Agent:
-    def __init__(self, name, start_pos, goal):
+    def __init__(self, name, start_pos, goal, plan_cache=None, incremental=False, trace=None, actions=None,
+                 agent_state=None, search_options=None, macro_library=None):
         self.name = name
+        self.actions = actions if actions is not None else ACTIONS
+        # Optional bounded search: {'weight': w, 'max_expansions': n, 'time_budget': seconds per
+        # update_plan, 'anytime': True to keep improving one plan across calls (ARA*),
+        # 'direction': 'backward' or 'bidirectional' for regression search (Regression.py),
+        # 'batch_size': n to expand n frontier nodes at a time, with 'backend' 'numpy' or 'python',
+        # 'max_nodes': n to hold at most n search nodes in memory (SMA*, BoundedSearch.py)}
+        self.search_options = dict(search_options or {})
+        if self.search_options.get('direction', 'forward') not in ('forward', 'backward', 'bidirectional'):
+            raise ValueError("search_options['direction'] must be 'forward', 'backward' or 'bidirectional'")
+        self.anytime_planner = AnytimePlanner() if self.search_options.get('anytime') else None
+        self.last_result = None  # PlanResult of the last update_plan (reason, bound, expansions)
+        self.trace = trace  # Optional Tracer for plan, action and conflict events (see Trace.py)
+        self.plan_cache = plan_cache  # Optional PlanCache shared between agents
+        self.macro_library = macro_library  # Optional MacroLibrary: plans with learned macros and feeds it
+        # Optional per-agent planner that repairs the previous search when a conflict forces a replan
+        self.incremental_planner = IncrementalPlanner() if incremental else None
         self.plan = []
         self.goal = goal
         self.agent_state = {
@@ -13,23 +37,88 @@ class Agent:
             'agent_has_machined_part': False,  # Local State for Agent B's item
             # ... other agent-local inventory
         }
+        if agent_state:
+            self.agent_state.update(agent_state)  # Extra local keys of a custom action set
         self.exectued_plan = []  # To track executed actions for visualization
+        # Versions of the shared keys the rest of the plan reads, when the world is a WorldStore
+        # (None: recheck every action's preconditions)
+        self.read_versions = None
+        self._reads = {}  # action name -> shared keys it reads
 
-    def update_plan(self, world_state):
-        # Plans a new action sequence.
-        cost, plan = plan_actions(
-            world_state, 
-            self.agent_state, 
-            self.goal, 
-            ACTIONS
-        )
+    def update_plan(self, world_state, stats=None):
+        # Plans a new action sequence (incrementally, or through the shared plan cache when there is one).
+        # stats: optional SearchStats that collects the search's counters (cache hits run no search).
+        options = self.search_options
+        budget = {}
+        if 'max_expansions' in options:
+            budget['max_expansions'] = options['max_expansions']
+        if 'time_budget' in options:
+            budget['deadline'] = time.perf_counter() + options['time_budget']
+        actions = self.actions
+        if self.macro_library is not None and self.macro_library.actions():
+            actions = list(actions) + list(self.macro_library.actions())
+        
+        if self.anytime_planner is not None:
+            result = self.anytime_planner.plan(world_state, self.agent_state, self.goal, actions, **budget)
+        elif self.incremental_planner is not None:
+            result = self.incremental_planner.plan(world_state, self.agent_state, self.goal, actions, stats=stats, **budget)
+        elif options.get('direction', 'forward') != 'forward':
+            result = plan_backward(world_state, self.agent_state, self.goal, actions, heuristic='max',
+                                   bidirectional=options['direction'] == 'bidirectional', stats=stats, **budget)
+        elif 'batch_size' in options:
+            result = plan_batched(world_state, self.agent_state, self.goal, actions, heuristic='max',
+                                  batch_size=options['batch_size'], backend=options.get('backend', 'auto'), stats=stats,
+                                  weight=options.get('weight', 1.0), **budget)
+        elif 'max_nodes' in options:
+            result = plan_bounded(world_state, self.agent_state, self.goal, actions, heuristic='max',
+                                  max_nodes=options['max_nodes'], stats=stats, **budget)
+        else:
+            planner = self.plan_cache.plan if self.plan_cache is not None else plan_actions
+            result = planner(
+                world_state, 
+                self.agent_state, 
+                self.goal, 
+                actions,
+                heuristic='max',
+                stats=stats,
+                weight=options.get('weight', 1.0),
+                **budget
+            )
+        self.last_result = result
+        if self.macro_library is not None and result.plan:
+            self.macro_library.observe(world_state, self.agent_state, result.plan, actions)
+        self.adopt_plan(result.plan, world_state)
+
+    def adopt_plan(self, plan, world_state=None):
+        """
+        Installs a freshly computed plan (from update_plan or a FactoryManager planning batch),
+        planned against world_state. If that is a WorldStore, the versions of every shared key
+        the plan reads are recorded, so execute_action can trust the plan while they hold.
+        """
         self.plan = plan
+        self.read_versions = None
+        if plan and isinstance(world_state, WorldStore):
+            keys = set()
+            for name, _ in plan:
+                keys.update(self._shared_reads(name))
+            self.read_versions = world_state.versions_of(keys)
         self.exectued_plan = []  # Reset executed plan on new planning
         if self.plan:
             self.exectued_plan = list(self.plan)  # Copy current plan to executed_plan
-            print(f"[{self.name}] New Plan: {' -> '.join([a[0] for a in self.plan])}")
-        else:
-            print(f"[{self.name}] No plan found.")
+        if self.trace is not None:
+            self.trace.emit(PLAN, agent=self.name, plan=[name for name, _ in plan or ()],
+                            cost=sum(cost for _, cost in plan) if plan else None)
+
+    def _shared_reads(self, name):
+        """Shared keys whose values the action's preconditions test (a macro's cover all its steps)."""
+        keys = self._reads.get(name)
+        if keys is None:
+            action = next((a for a in self.actions if a.name == name), None)
+            if action is None and self.macro_library is not None:
+                action = self.macro_library.macros.get(name)
+            keys = self._reads[name] = frozenset(
+                key for key in (*action.preconditions, *action.numeric_preconditions) if key not in self.agent_state)
+        return keys
 
     def execute_action(self, action, world_state):
             """
@@ -43,25 +132,48 @@ class Agent:
                 bool: True if the action executed successfully, False otherwise.
             """
             
+            if isinstance(action, MacroAction):
+                # Planned as one edge: run its primitive steps from here on, starting with the first
+                if self.trace is not None:
+                    self.trace.emit(EXPAND, agent=self.name, action=action.name)
+                self.plan[0:0] = [(step.name, cost) for step, cost in action.steps[1:]]
+                action = action.steps[0][0]
+
             # 1. CONFLICT CHECK (Decentralized Execution Validation)
-            # Check if the action's preconditions are STILL met against the current world state.
-            # This catches if another agent has consumed a resource or changed a machine status.
-            if not action.check_preconditions(world_state, self.agent_state):
-                print(f"[{self.name}] ❌ Plan FAILED: Preconditions not met for {action.name}. Re-planning...")
-                self.plan = None # Force the agent to calculate a new, valid plan
-                return False
+            # In a WorldStore, a plan whose shared keys nobody else wrote since it was made is still
+            # valid, and the commit applies it. Otherwise (another agent consumed a resource or
+            # changed a machine status) check the action's preconditions against the current state.
+            store = isinstance(world_state, WorldStore)
+            trusted = store and self.read_versions is not None and not world_state.commit(action, self.read_versions)
+            if not trusted:
+                self.read_versions = None # Someone else wrote a key the plan reads: check every step from now on
+                if not action.check_preconditions(world_state, self.agent_state):
+                    if self.trace is not None:
+                        self.trace.emit(CONFLICT, agent=self.name, action=action.name)
+                    self.plan = None # Force the agent to calculate a new, valid plan
+                    return False
+
+                # 2. APPLY SHARED EFFECTS (Update the Global World State)
+                # In place: the world state is the single source of truth
+                if store:
+                    world_state.commit(action)
+                else:
+                    action.apply_shared_effects(world_state)
+            elif action.changes_shared_state():
+                # Our own writes are part of the plan: move the record past them
+                for key in self.read_versions.keys() & (action.shared_effects.keys() | action.shared_deltas.keys()):
+                    self.read_versions[key] = world_state.version_of(key)
 
-            # 2. APPLY SHARED EFFECTS (Update the Global World State)
-            # We update the 'world_state' dictionary *in place* because it is the single source of truth.
-            # We pass a copy to the action method to prevent accidental modification during calculation.
-            world_state.update(action.apply_shared_effects(world_state.copy()))
-            
             # 3. APPLY LOCAL EFFECTS (Update the Agent's Private State)
-            # Update the agent's inventory and position.
-            self.agent_state.update(action.apply_local_effects(self.agent_state.copy()))
+            # Update the agent's inventory and position, in place.
+            action.apply_local_effects(self.agent_state)
             
             # 4. SUCCESS LOGGING
-            cost = action.get_cost(self.agent_state)
-            print(f"[{self.name}] Executed: {action.name}. Cost: {cost}")
+            # The values written, so a replay of the trace can rebuild the states without planning
+            if self.trace is not None:
+                self.trace.emit(ACTION, agent=self.name, action=action.name, cost=action.get_cost(self.agent_state),
+                                shared={key: world_state.get(key) for key in {**action.shared_effects, **action.shared_deltas}},
+                                local={key: self.agent_state.get(key)
+                                       for key in (*action.local_effects, *action.local_deltas, 'agent_position')})
             
             return True
\ No newline at end of file
@@ -0,0 +1,392 @@
+import heapq
+import math
+import operator
+import time
+from WorldState import calculate_move_cost
+from CompiledActions import compile_problem
+from Heuristics import resolve_heuristic
+from Planner import PlanResult, SearchTree, RELAXED_CHECK_AFTER, FOUND, UNREACHABLE, EXPANSION_LIMIT, DEADLINE
+from Pruning import prune_actions
+
+try:
+    import numpy as np
+except ImportError: # Optional: the pure-Python expander gives the same results
+    np = None
+
+BACKENDS = ('auto', 'numpy', 'python')
+
+# Numeric comparisons as inclusive (low, high) bounds on an integer slot value
+_BOUNDS = {
+    operator.ge: lambda threshold: (threshold, None),
+    operator.gt: lambda threshold: (threshold + 1, None),
+    operator.le: lambda threshold: (None, threshold),
+    operator.lt: lambda threshold: (None, threshold - 1),
+}
+
+
+class PythonExpander:
+    """Batch expansion without NumPy: compiled.successors for each state in turn."""
+
+    def __init__(self, compiled):
+        self.compiled = compiled
+
+    def expand(self, state_codes, skip_moves):
+        """One [(action_index, next_state_code, action_cost), ...] list per state, as compiled.successors."""
+        successors = self.compiled.successors
+        return [successors(state_code, skip) for state_code, skip in zip(state_codes, skip_moves)]
+
+
+class NumpyExpander:
+    """
+    Batch expansion of many packed states at once with NumPy array operations.
+
+    A batch of packed states becomes a (states, words) array of 64-bit words. The compiled
+    action set becomes matrices over it, one row per action: precondition masks and bits,
+    numeric bounds and deltas on the few numeric slots, and move costs per position. Cost
+    modifiers become one mask row per distinct condition, with a condition x action matrix of
+    adjustments. Applicability, numeric checks, delta ranges and costs are then computed for
+    every (state, action) pair in a few whole-array operations; cost modifiers are masked adds.
+    Only the applicable pairs go back to Python, which packs their successor states.
+
+    The result lists are identical to compiled.successors: same actions, order, states and costs.
+    """
+
+    def __init__(self, compiled):
+        if np is None:
+            raise ImportError("The numpy backend needs NumPy (use backend='python')")
+        self.compiled = compiled
+        layout = compiled.layout
+        actions = compiled.compiled
+        self.words = max(1, (layout.total_bits + 63) // 64)
+        slot_at = {offset: slot for slot, offset in enumerate(layout.offsets)}
+
+        def split(value):
+            """A packed int (mask or bits) as an array of 64-bit words."""
+            return np.array([(value >> (64 * w)) & 0xFFFFFFFFFFFFFFFF for w in range(self.words)], dtype=np.uint64)
+
+        def conditions(pairs):
+            """(mask, bits) pairs as (word columns any mask touches, masks, bits) arrays."""
+            masks = np.array([split(mask) for mask, _ in pairs], dtype=np.uint64).reshape(len(pairs), self.words)
+            bits = np.array([split(bits) for _, bits in pairs], dtype=np.uint64).reshape(len(pairs), self.words)
+            columns = np.flatnonzero(masks.any(0))
+            return columns, masks[:, columns], bits[:, columns]
+
+        # Preconditions: (word & mask) == bits on every word a precondition touches
+        self.pre_words, self.pre_masks, self.pre_bits = conditions([(a.pre_mask, a.pre_bits) for a in actions])
+
+        # Cost modifiers: one row per distinct condition (stations share them)
+        modifiers = {}
+        for action in actions:
+            for mask, bits, adjustment in action.modifiers:
+                modifiers.setdefault((mask, bits), []).append((action.index, adjustment))
+        self.modifier_words, self.modifier_masks, self.modifier_bits = conditions(list(modifiers))
+        self.modifier_adjust = np.zeros((len(modifiers), len(actions)))  # float64, so @ runs on BLAS
+        for m, adjustments in enumerate(modifiers.values()):
+            for a, adjustment in adjustments:
+                self.modifier_adjust[m, a] += adjustment
+
+        # The few slots read as values: numeric checks, deltas and the position (for move costs)
+        numeric_slots = sorted({slot_at[o] for a in actions for o, _, _, _ in a.numeric_checks})
+        delta_slots = sorted({slot_at[o] for a in actions for o, _, _ in a.deltas})
+        self.position_slot = layout.slot.get('agent_position')
+        self.targets = np.array([a.index for a in actions if a.target_bits is not None], dtype=np.int64)
+        slots = sorted(set(numeric_slots) | set(delta_slots) | ({self.position_slot} if len(self.targets) else set()))
+        column = {slot: j for j, slot in enumerate(slots)}
+        offsets = np.array([layout.offsets[s] for s in slots], dtype=np.int64)
+        widths = np.array([(layout.masks[s] >> layout.offsets[s]).bit_length() for s in slots], dtype=np.int64)
+        # Each slot is one word shifted down, plus the start of the next word if it straddles two
+        self.word_low = offsets // 64
+        self.shift_low = (offsets % 64).astype(np.uint64)
+        low_bits = np.minimum(widths, 64 - offsets % 64)
+        self.mask_low = np.array([(1 << int(bits)) - 1 for bits in low_bits], dtype=np.uint64)
+        straddles = widths > low_bits
+        self.straddles = bool(straddles.any())
+        self.word_high = np.minimum(self.word_low + 1, self.words - 1)
+        self.mask_high = np.array([(1 << int(w - b)) - 1 if s else 0 for w, b, s in zip(widths, low_bits, straddles)],
+                                  dtype=np.uint64)
+        self.shift_high = np.where(straddles, low_bits, 0).astype(np.uint64)
+
+        # Numeric preconditions as inclusive [low, high] bounds, for the actions that have them
+        self.numeric_columns = np.array([column[s] for s in numeric_slots], dtype=np.int64)
+        self.numeric_actions = np.array([a.index for a in actions if a.numeric_checks], dtype=np.int64)
+        shape = (len(self.numeric_actions), len(numeric_slots))
+        self.numeric_on = np.zeros(shape, dtype=bool)
+        self.numeric_low = np.zeros(shape, dtype=np.int64)
+        self.numeric_high = np.full(shape, np.iinfo(np.int64).max, dtype=np.int64)
+        for row, a in enumerate(self.numeric_actions.tolist()):
+            for offset, _, compare, threshold in actions[a].numeric_checks:
+                j = numeric_slots.index(slot_at[offset])
+                self.numeric_on[row, j] = True
+                low, high = _BOUNDS[compare](threshold)
+                if low is not None:
+                    self.numeric_low[row, j] = max(self.numeric_low[row, j], low)
+                if high is not None:
+                    self.numeric_high[row, j] = min(self.numeric_high[row, j], high)
+
+        # Numeric deltas: the effect code (if the action also sets the slot), then the delta
+        self.delta_columns = np.array([column[s] for s in delta_slots], dtype=np.int64)
+        self.delta_actions = np.array([a.index for a in actions if a.deltas], dtype=np.int64)
+        shape = (len(self.delta_actions), len(delta_slots))
+        self.delta_on, self.delta = np.zeros(shape, dtype=bool), np.zeros(shape, dtype=np.int64)
+        self.delta_set_on, self.delta_set = np.zeros(shape, dtype=bool), np.zeros(shape, dtype=np.int64)
+        self.delta_max = np.array([layout.masks[s] >> layout.offsets[s] for s in delta_slots], dtype=np.int64)
+        for row, a in enumerate(self.delta_actions.tolist()):
+            action = actions[a]
+            for offset, slot_mask, delta in action.deltas:
+                j = delta_slots.index(slot_at[offset])
+                self.delta_on[row, j], self.delta[row, j] = True, delta
+                if ~action.keep_mask & (slot_mask << offset):
+                    self.delta_set_on[row, j] = True
+                    self.delta_set[row, j] = (action.effect_bits >> offset) & slot_mask
+        self.bias = layout.NUMERIC_BIAS
+
+        # Costs: base cost, or the distance from the current position for moves. Rows per
+        # position code are filled the first time a code shows up.
+        self.base_cost = np.array([a.base_cost for a in actions], dtype=np.int64)
+        self.position_column = column.get(self.position_slot)
+        self.target_codes = np.full(len(actions), -1, dtype=np.int64)
+        position_codes = 1
+        if len(self.targets):
+            position_codes += layout.masks[self.position_slot] >> layout.offsets[self.position_slot]
+            for a in self.targets.tolist():
+                self.target_codes[a] = actions[a].target_bits >> compiled.position_offset
+        self.move_costs = np.zeros((position_codes, len(actions)), dtype=np.int64)
+        self.move_unreachable = np.zeros((position_codes, len(actions)), dtype=bool)
+        self.move_known = np.zeros(position_codes, dtype=bool)
+
+        # Moves skipped after a move: the ones applicable() leaves out when skip_moves is set
+        always = set(compiled.always)
+        self.skippable = np.array([compiled.is_move[a] and a in always for a in range(len(actions))], dtype=bool)
+        self.has_deltas = [bool(action.deltas) for action in actions]
+        self.keep = [action.keep_mask for action in actions]
+        self.effect = [action.effect_bits for action in actions]
+
+    def state_words(self, state_codes):
+        """(states, words) uint64 array of the packed states."""
+        size = 8 * self.words
+        raw = b''.join(state_code.to_bytes(size, 'little') for state_code in state_codes)
+        return np.frombuffer(raw, dtype='<u8').reshape(len(state_codes), self.words)
+
+    def slot_values(self, words):
+        """(states, slots) int64 array of the numeric, delta and position slots."""
+        values = (words[:, self.word_low] >> self.shift_low) & self.mask_low
+        if self.straddles:
+            values |= (words[:, self.word_high] & self.mask_high) << self.shift_high
+        return values.astype(np.int64)
+
+    def _add_positions(self, position_codes):
+        """Fills the move cost rows of position codes seen for the first time."""
+        compiled = self.compiled
+        for code in np.unique(position_codes).tolist():
+            position = compiled.layout.value(self.position_slot, code)
+            costs = self.base_cost.copy()
+            for a in self.targets.tolist():
+                distance = calculate_move_cost(position, compiled.actions[a].target_pos)
+                if distance == math.inf:
+                    self.move_unreachable[code, a] = True
+                else:
+                    costs[a] = distance
+            self.move_costs[code] = costs
+            self.move_known[code] = True
+
+    def expand(self, state_codes, skip_moves):
+        """One [(action_index, next_state_code, action_cost), ...] list per state, as compiled.successors."""
+        words = self.state_words(state_codes)
+        x = self.slot_values(words)
+
+        # 1. Applicability of every (state, action) pair
+        ok = ((words[:, None, self.pre_words] & self.pre_masks) == self.pre_bits).all(2)
+        if len(self.numeric_actions):
+            values = x[:, None, self.numeric_columns]
+            ok[:, self.numeric_actions] &= ((values != 0) & (values >= self.numeric_low) & (values <= self.numeric_high)
+                                            | ~self.numeric_on).all(2)
+        if len(self.targets):
+            positions = x[:, self.position_column]
+            ok &= positions[:, None] != self.target_codes
+        skip = np.array(skip_moves, dtype=bool)
+        if skip.any():
+            ok[skip] &= ~self.skippable
+
+        # 2. Numeric deltas must keep their slots in range (absent counts as 0)
+        if len(self.delta_actions):
+            after = np.where(self.delta_set_on, self.delta_set, x[:, None, self.delta_columns])
+            updated = np.where(after == 0, self.bias, after) + self.delta
+            ok[:, self.delta_actions] &= (((updated > 0) & (updated <= self.delta_max)) | ~self.delta_on).all(2)
+
+        # 3. Costs: base or distance, masked modifier adds, at least 1
+        if len(self.targets):
+            new = ~self.move_known[positions]
+            if new.any():
+                self._add_positions(positions[new])
+            costs = self.move_costs[positions]
+            ok &= ~self.move_unreachable[positions]
+        else:
+            costs = np.broadcast_to(self.base_cost, ok.shape)
+        if len(self.modifier_adjust):
+            holds = ((words[:, None, self.modifier_words] & self.modifier_masks) == self.modifier_bits).all(2)
+            costs = costs + (holds @ self.modifier_adjust).astype(np.int64)
+        costs = np.maximum(costs, 1)
+
+        # 4. Pack the successors of the applicable pairs (states in order, actions ascending)
+        apply, keep, effect, has_deltas = self.compiled.apply, self.keep, self.effect, self.has_deltas
+        results = [[] for _ in state_codes]
+        rows, columns = np.nonzero(ok)
+        for b, a, cost in zip(rows.tolist(), columns.tolist(), costs[rows, columns].tolist()):
+            state_code = state_codes[b]
+            if has_deltas[a]:
+                next_code = apply(a, state_code) # Checked in range above
+            else:
+                next_code = (state_code & keep[a]) | effect[a]
+            results[b].append((a, next_code, cost))
+        return results
+
+
+# Expanders are reused while the compiled action set is (see compile_problem's cache)
+_EXPANDERS = {}
+_EXPANDERS_SIZE = 64
+
+def make_expander(compiled, backend='auto'):
+    """The batch expander for a compiled action set: NumpyExpander, or PythonExpander without NumPy."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}'. Choose from: {', '.join(BACKENDS)}")
+    if backend == 'auto':
+        backend = 'numpy' if np is not None else 'python'
+    key = (compiled.version, backend)
+    expander = _EXPANDERS.get(key)
+    if expander is None:
+        if len(_EXPANDERS) >= _EXPANDERS_SIZE:
+            _EXPANDERS.clear()
+        expander = _EXPANDERS[key] = NumpyExpander(compiled) if backend == 'numpy' else PythonExpander(compiled)
+    return expander
+
+
+def plan_batched(world_state_dict, agent_state_dict, goal_state, available_actions, heuristic=None, batch_size=64,
+                 backend='auto', stats=None, weight=1.0, max_expansions=None, deadline=None, prune=True):
+    """
+    A* that pops up to batch_size frontier nodes at a time and expands them in one batch.
+
+    Same contract and optimal costs as plan_actions. A node popped in a batch may later be
+    reached more cheaply through another node of the same batch; it is then reopened, and a
+    goal found along the way is only returned once no open node has a lower f. Both backends
+    return identical successor lists, so they return identical plans.
+
+    Args:
+        batch_size (int): Frontier nodes expanded per batch (1 behaves like plan_actions).
+        backend (str): 'numpy', 'python' (the fallback, compiled.successors per state), or
+            'auto' for NumPy when it is installed.
+        heuristic, stats, weight, max_expansions, deadline, prune: As for plan_actions.
+            stats collects the counters and times the batch expansions as 'successors'.
+
+    Returns:
+        PlanResult.
+    """
+    if weight < 1:
+        raise ValueError("weight must be at least 1 (1 = optimal A*)")
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+    if prune:
+        available_actions = prune_actions(available_actions, goal_state)
+    compiled, start_code, goal_mask, goal_bits = compile_problem(
+        [world_state_dict, agent_state_dict], available_actions, goal_state)
+    expander = make_expander(compiled, backend)
+    h = resolve_heuristic(heuristic, goal_state, available_actions, compiled.layout)
+    if weight != 1:
+        base_h = h
+        h = lambda state_code: weight * base_h(state_code)
+    result = _search_batched(compiled, start_code, goal_mask, goal_bits, h, expander, batch_size, stats,
+                             max_expansions, deadline, lambda: not compiled.may_reach(start_code, goal_state), prune)
+    if result.cost is not None:
+        result.bound = weight
+    return result
+
+
+def _search_batched(compiled, start_code, goal_mask, goal_bits, h, expander, batch_size, stats,
+                    max_expansions, deadline, unreachable, prune_moves):
+    clock = time.perf_counter
+    started = clock()
+    tree = SearchTree()
+    root = tree.add(start_code, 0)
+    start_estimate = h(start_code)
+    pq = [(start_estimate, 0, root)] if start_estimate != math.inf else []
+    visited = {start_code: 0}
+    expansions = generated = duplicates = stale = 0
+    peak_heap = len(pq)
+    best, best_cost = None, math.inf   # Cheapest goal node popped so far
+    reason = None                       # Set when the search stops early
+    check_at = RELAXED_CHECK_AFTER
+    is_move = compiled.is_move if prune_moves and compiled.moves_compose else None
+    on_expand = stats.on_expand if stats is not None else None
+
+    while pq and pq[0][0] < best_cost and reason is None:
+        # 1. Pop up to batch_size live nodes that could still beat the best goal
+        batch = []
+        while pq and len(batch) < batch_size and pq[0][0] < best_cost:
+            _, cost, node = heapq.heappop(pq)
+            current_code = tree.states[node]
+            if cost > visited[current_code]:
+                stale += 1
+                continue
+            if current_code & goal_mask == goal_bits:
+                if cost < best_cost:
+                    best, best_cost = node, cost
+                continue
+            if expansions == max_expansions:
+                reason = EXPANSION_LIMIT
+                break
+            if deadline is not None and clock() > deadline:
+                reason = DEADLINE
+                break
+            if expansions == check_at and unreachable():
+                reason = UNREACHABLE
+                break
+            expansions += 1
+            if on_expand is not None:
+                on_expand(current_code, cost)
+            batch.append(node)
+        if reason is not None or not batch:
+            continue
+
+        # 2. Expand the whole batch at once
+        tick = clock()
+        skips = [is_move is not None and node != root and is_move[tree.actions[node]] for node in batch]
+        children = expander.expand([tree.states[node] for node in batch], skips)
+        if stats is not None:
+            stats.timings['successors'] += clock() - tick
+
+        # 3. A* updates, in the order the nodes were popped
+        for node, node_children in zip(batch, children):
+            cost = tree.costs[node]
+            generated += len(node_children)
+            for action_index, next_code, action_cost in node_children:
+                new_cost = cost + action_cost
+                known = visited.get(next_code)
+                if known is not None and new_cost >= known:
+                    duplicates += 1
+                    continue
+                estimate = h(next_code)
+                if estimate == math.inf:
+                    continue
+                visited[next_code] = new_cost
+                child = tree.add(next_code, new_cost, node, action_index)
+                heapq.heappush(pq, (new_cost + estimate, new_cost, child))
+        if len(pq) > peak_heap:
+            peak_heap = len(pq)
+
+    if best is not None and reason is None:
+        result = PlanResult(best_cost, tree.plan(best, compiled.actions), FOUND, 1.0, expansions)
+        if stats is not None and stats.on_goal is not None:
+            stats.on_goal(*result)
+    else:
+        result = PlanResult(None, None, reason or UNREACHABLE, expansions=expansions)
+    if stats is not None:
+        stats.searches += 1
+        stats.failures += result.reason == UNREACHABLE
+        stats.budget_stops += result.reason in (EXPANSION_LIMIT, DEADLINE)
+        stats.expanded += expansions
+        stats.generated += generated
+        stats.duplicates += duplicates
+        stats.stale += stale
+        stats.peak_heap = max(stats.peak_heap, peak_heap)
+        stats.peak_visited = max(stats.peak_visited, len(visited))
+        stats.wall_time += clock() - started
+    return result
@@ -0,0 +1,291 @@
+import heapq
+import math
+import time
+from array import array
+from CompiledActions import compile_problem
+from Heuristics import resolve_heuristic
+from Planner import PlanResult, RELAXED_CHECK_AFTER, FOUND, UNREACHABLE, EXPANSION_LIMIT, DEADLINE, MEMORY_LIMIT
+from Pruning import prune_actions
+
+# Evicting makes room for max_nodes // EVICT_FRACTION nodes at once, so the frontier is scanned
+# for the least promising leaves once per that many new nodes instead of once per node
+EVICT_FRACTION = 16
+
+
+class _NodeTable:
+    """
+    Array-backed search nodes, like SearchTree, whose slots are freed on eviction and reused.
+
+    A node holds its packed state, g-cost, f-value, parent slot, action index and depth, the
+    number of its children in memory, and the lowest f of the children evicted since it was
+    last expanded (forgotten), which is all that remains of them. Only the states, costs and
+    queued f-values are objects; the rest are machine numbers in typed arrays.
+    """
+    __slots__ = ('states', 'costs', 'f', 'parents', 'actions', 'depths', 'children', 'forgotten', 'queued', 'free')
+
+    def __init__(self):
+        self.states = []
+        self.costs = []
+        self.f = array('d')
+        self.parents = array('i')
+        self.actions = array('i')
+        self.depths = array('i')
+        self.children = array('i')
+        self.forgotten = array('d')
+        self.queued = []        # The f a node is queued under (None: not queued)
+        self.free = array('i')  # Slots of evicted nodes, for reuse
+
+    def add(self, state_code, cost, f, parent=-1, action_index=-1):
+        depth = self.depths[parent] + 1 if parent != -1 else 0
+        if self.free:
+            node = self.free.pop()
+            self.states[node] = state_code
+            self.costs[node] = cost
+            self.f[node] = f
+            self.parents[node] = parent
+            self.actions[node] = action_index
+            self.depths[node] = depth
+            self.children[node] = 0
+            self.forgotten[node] = math.inf
+            self.queued[node] = None
+            return node
+        self.states.append(state_code)
+        self.costs.append(cost)
+        self.f.append(f)
+        self.parents.append(parent)
+        self.actions.append(action_index)
+        self.depths.append(depth)
+        self.children.append(0)
+        self.forgotten.append(math.inf)
+        self.queued.append(None)
+        return len(self.states) - 1
+
+    def release(self, node):
+        self.states[node] = None
+        self.queued[node] = None
+        self.free.append(node)
+
+    def plan(self, node, available_actions):
+        """Rebuilds [(action_name, action_cost), ...] leading to node."""
+        plan = []
+        while self.parents[node] != -1:
+            parent = self.parents[node]
+            plan.append((available_actions[self.actions[node]].name, self.costs[node] - self.costs[parent]))
+            node = parent
+        plan.reverse()
+        return plan
+
+
+def plan_bounded(world_state_dict, agent_state_dict, goal_state, available_actions, heuristic=None, max_nodes=100000,
+                 stats=None, max_expansions=None, deadline=None, prune=True):
+    """
+    SMA*: A* that holds at most max_nodes search nodes in memory.
+
+    plan_actions keeps every state it reaches (visited) and every open node (the heap) until it
+    finishes. Here the nodes form a tree of at most max_nodes nodes, duplicate checks included.
+    When it is full, the least promising leaves (highest f, shallowest first) are evicted and
+    their f-values backed up into their parents. A parent with forgotten children is queued
+    again under the lowest of those f-values, and regenerates them only if nothing cheaper is
+    left, so memory is traded for re-expansions.
+
+    The plan is optimal whenever the optimal plan's path fits in max_nodes: costs match
+    plan_actions. A path of more than max_nodes - 1 actions cannot be held; if no plan fits,
+    the search stops with reason MEMORY_LIMIT. With a cap above the states plan_actions would
+    keep, nothing is evicted and it expands about as many nodes as plan_actions. An expansion
+    holds its successors for a moment before evicting, so the cap is exceeded by at most one
+    node's successors. A held node takes about 15% more memory than a state plan_actions keeps
+    (benchmarks.bounded_search reports the peak bytes per node).
+
+    Args:
+        max_nodes (int): Search nodes held at once (at least 2).
+        heuristic, stats, max_expansions, deadline, prune: As for plan_actions. stats records
+            peak_visited as the most nodes held at once, and counts evictions.
+
+    Returns:
+        PlanResult.
+    """
+    if max_nodes < 2:
+        raise ValueError("max_nodes must be at least 2")
+    if prune:
+        available_actions = prune_actions(available_actions, goal_state)
+    compiled, start_code, goal_mask, goal_bits = compile_problem(
+        [world_state_dict, agent_state_dict], available_actions, goal_state)
+    h = resolve_heuristic(heuristic, goal_state, available_actions, compiled.layout)
+    return _search_bounded(compiled, start_code, goal_mask, goal_bits, h, max_nodes, stats, max_expansions, deadline,
+                           lambda: not compiled.may_reach(start_code, goal_state), prune)
+
+
+def _search_bounded(compiled, start_code, goal_mask, goal_bits, h, max_nodes, stats,
+                    max_expansions, deadline, unreachable, prune_moves):
+    clock = time.perf_counter
+    started = clock()
+    successors = compiled.successors
+    is_move = compiled.is_move if prune_moves and compiled.moves_compose else None
+    on_expand = stats.on_expand if stats is not None else None
+
+    table = _NodeTable()
+    states, costs, fs, parents, depths = table.states, table.costs, table.f, table.parents, table.depths
+    children, forgotten, queued = table.children, table.forgotten, table.queued
+    nodes = {}      # state -> node held for it at the lowest cost (the duplicate check)
+    dead = {}       # node -> bits of the actions whose children cannot reach the goal within the cap
+    # Queued nodes, lowest f first (deepest first among equals). A node is queued while it is
+    # an unexpanded leaf, or while it has forgotten children to regenerate, under the lowest f
+    # it may still lead to. An entry is live while its node is queued under the same f.
+    open_list = []
+    # Dead ends, queued under inf: never expanded again, only evicted (first), so they are kept
+    # as bare slots rather than heap entries. A slot is live while its node is queued under inf.
+    dead_ends = array('i')
+    expansions = generated = duplicates = stale = evicted = 0
+    peak_held = peak_heap = 1
+    check_at = RELAXED_CHECK_AFTER
+    result = None
+    truncated = False   # Some path was cut short by the cap (a failure is then MEMORY_LIMIT)
+    room = max(1, max_nodes // EVICT_FRACTION)
+
+    def push(node, f):
+        queued[node] = f
+        heapq.heappush(open_list, (f, -depths[node], node))
+
+    def remove(node, backup, dominated=False):
+        """
+        Drops a leaf from memory, backing up f-value backup into its parent. A leaf backed up
+        as inf is never regenerated from its parent (it would only fail again), unless it was
+        dominated by a cheaper path to its state, whose branch may still be evicted.
+        """
+        nonlocal held
+        while True:
+            parent = parents[node]
+            if nodes.get(states[node]) == node:
+                del nodes[states[node]]
+            action_index = table.actions[node]
+            dead.pop(node, None)
+            table.release(node)
+            held -= 1
+            if parent == -1:
+                return # The root: nothing left to search
+            children[parent] -= 1
+            if backup < forgotten[parent]:
+                # Queue the parent to regenerate the child when nothing cheaper is left
+                forgotten[parent] = backup
+                push(parent, backup)
+            elif backup == math.inf and not dominated:
+                dead[parent] = dead.get(parent, 0) | 1 << action_index
+            if children[parent]:
+                return
+            # Every child is gone: the parent is a leaf again, valued by its best forgotten child
+            if forgotten[parent] != math.inf:
+                fs[parent] = max(fs[parent], forgotten[parent])
+                return
+            node, backup, dominated = parent, math.inf, False # Nothing below it reaches the goal: drop it too
+
+    def evict(count):
+        """Evicts the count least promising leaves, and drops dead heap entries on the way."""
+        nonlocal open_list, dead_ends, evicted
+        open_list = [entry for entry in open_list if queued[entry[2]] == entry[0] and -entry[1] == depths[entry[2]]]
+        heapq.heapify(open_list)
+        # Dead ends first (their f is inf), shallowest first, then the highest f among the leaves
+        ends = sorted({node for node in dead_ends if queued[node] == math.inf and parents[node] != -1}, key=depths.__getitem__)
+        victims = [(math.inf, node) for node in ends[:count]]
+        dead_ends = array('i', ends[count:])
+        if len(victims) < count:
+            leaves = [entry for entry in open_list if not children[entry[2]] and parents[entry[2]] != -1]
+            victims += [(f, node) for f, _, node in heapq.nsmallest(count - len(victims), leaves,
+                                                                    key=lambda entry: (-entry[0], -entry[1]))]
+        for f, node in victims:
+            if queued[node] == f and not children[node]: # Still a leaf queued under f
+                evicted += 1
+                remove(node, f)
+
+    root = table.add(start_code, 0, h(start_code))
+    nodes[start_code] = root
+    held = 1
+    if fs[root] != math.inf:
+        push(root, fs[root])
+    while open_list:
+        f, negative_depth, node = heapq.heappop(open_list)
+        if queued[node] != f or -negative_depth != depths[node]:
+            stale += 1
+            continue
+        if f == math.inf:
+            break # Only dead ends left
+        current_code = states[node]
+        if current_code & goal_mask == goal_bits:
+            result = PlanResult(costs[node], table.plan(node, compiled.actions), FOUND, 1.0, expansions)
+            if stats is not None and stats.on_goal is not None:
+                stats.on_goal(*result)
+            break
+        if expansions == max_expansions:
+            result = PlanResult(None, None, EXPANSION_LIMIT)
+            break
+        if deadline is not None and clock() > deadline:
+            result = PlanResult(None, None, DEADLINE)
+            break
+        if expansions == check_at and unreachable():
+            result = PlanResult(None, None, UNREACHABLE)
+            break
+        expansions += 1
+        cost = costs[node]
+        if on_expand is not None:
+            on_expand(current_code, cost)
+        queued[node] = None
+        forgotten[node] = math.inf
+
+        # Children still held are found by the duplicate check, so only forgotten ones come back.
+        # A child is only worth holding if it is the goal or its own children fit in memory too.
+        last_level = depths[node] + 3 > max_nodes
+        skip_moves = is_move is not None and parents[node] != -1 and is_move[table.actions[node]]
+        node_dead = dead.get(node, 0)
+        node_f = fs[node]
+        for action_index, next_code, action_cost in successors(current_code, skip_moves):
+            if node_dead >> action_index & 1:
+                continue
+            if last_level and next_code & goal_mask != goal_bits:
+                truncated = True
+                continue
+            generated += 1
+            new_cost = cost + action_cost
+            known = nodes.get(next_code)
+            if known is not None and costs[known] <= new_cost:
+                duplicates += 1
+                continue
+            estimate = h(next_code)
+            if estimate == math.inf:
+                continue # The goal cannot be reached from here
+            child_f = new_cost + estimate
+            child = table.add(next_code, new_cost, child_f if child_f > node_f else node_f, node, action_index)
+            nodes[next_code] = child
+            children[node] += 1
+            held += 1
+            push(child, fs[child])
+            if known is not None and not children[known] and queued[known] is not None:
+                remove(known, math.inf, dominated=True) # A leaf now reached more cheaply: nothing to back up
+        if not children[node]:
+            # A dead end (within the cap): kept for the duplicate check, and evicted first
+            fs[node] = math.inf
+            queued[node] = math.inf
+            dead_ends.append(node)
+        if held > peak_held:
+            peak_held = held
+        if len(open_list) > peak_heap:
+            peak_heap = len(open_list)
+
+        # Over the cap: evict the least promising leaves, making some room ahead
+        if held > max_nodes:
+            evict(held - max_nodes + room)
+
+    if result is None:
+        result = PlanResult(None, None, MEMORY_LIMIT if truncated else UNREACHABLE)
+    result.expansions = expansions
+    if stats is not None:
+        stats.searches += 1
+        stats.failures += result.reason == UNREACHABLE
+        stats.budget_stops += result.reason in (EXPANSION_LIMIT, DEADLINE, MEMORY_LIMIT)
+        stats.expanded += expansions
+        stats.generated += generated
+        stats.duplicates += duplicates
+        stats.stale += stale
+        stats.evicted += evicted
+        stats.peak_heap = max(stats.peak_heap, peak_heap)
+        stats.peak_visited = max(stats.peak_visited, peak_held)
+        stats.wall_time += clock() - started
+    return result
@@ -0,0 +1,260 @@
+import itertools
+import math
+from Actions import MOVE, NUMERIC_OPERATORS
+from WorldState import WorldState, calculate_move_cost
+from StateEncoding import build_layout
+from Pruning import moves_compose
+
+class CompiledAction:
+    """
+    An Action compiled against a StateLayout.
+
+    Preconditions, effects and cost-modifier conditions become (mask, bits) pairs over the
+    packed state int, so checking or applying the action is a couple of int operations.
+    Numeric preconditions compare one extracted slot, and numeric deltas are added in place.
+    """
+    __slots__ = ('index', 'name', 'kind', 'pre_mask', 'pre_bits', 'keep_mask', 'effect_bits',
+                 'target_bits', 'base_cost', 'modifiers', 'move_costs', 'numeric_checks', 'deltas')
+
+    def __init__(self, index, action, layout):
+        self.index = index
+        self.name = action.name
+        self.kind = action.kind
+        self.pre_mask, self.pre_bits = layout.encode_condition(action.preconditions)
+        effect_mask, self.effect_bits = layout.encode_condition(action.combined_effects())
+        # Moves can never target the spot the agent already stands on
+        self.target_bits = None
+        if action.kind == MOVE and action.target_pos is not None:
+            position_mask, self.target_bits = layout.field('agent_position', action.target_pos)
+            effect_mask |= position_mask
+            self.effect_bits = (self.effect_bits & ~position_mask) | self.target_bits
+        self.keep_mask = ~effect_mask
+        self.base_cost = action.base_cost
+        self.modifiers = [layout.encode_condition(m['condition']) + (m['adjustment'],)
+                          for m in action.cost_modifiers]
+        self.move_costs = {}    # position field bits -> distance to target_pos
+
+        # Numeric slots store value + NUMERIC_BIAS, and 0 means "absent"
+        self.numeric_checks = []    # (offset, slot mask, comparison, threshold code)
+        for key, (op, amount) in getattr(action, 'numeric_preconditions', {}).items():
+            slot = layout.slot[key]
+            self.numeric_checks.append((layout.offsets[slot], layout.masks[slot] >> layout.offsets[slot],
+                                        NUMERIC_OPERATORS[op], amount + layout.NUMERIC_BIAS))
+        self.deltas = []            # (offset, slot mask, delta)
+        deltas = {**getattr(action, 'shared_deltas', {}), **getattr(action, 'local_deltas', {})}
+        for key, delta in deltas.items():
+            slot = layout.slot[key]
+            self.deltas.append((layout.offsets[slot], layout.masks[slot] >> layout.offsets[slot], delta))
+
+
+class CompiledActionSet:
+    """
+    ACTIONS compiled into precomputed checkers and appliers over one StateLayout.
+
+    Each action is filed in a precondition index under one of its (key, value) preconditions,
+    preferring agent_position, so a state only looks at actions that can possibly apply.
+    Actions without preconditions (e.g. moves) are always candidates.
+
+    When moves compose (Pruning.moves_compose), the search may ask for the successors of a
+    state it reached by a move without any further moves (skip_moves=True).
+    """
+
+    # Every compiled set gets its own version, so packed states from different layouts never mix
+    _versions = itertools.count()
+
+    def __init__(self, available_actions, layout):
+        self.version = next(self._versions)
+        self.actions = list(available_actions)
+        self.by_name = {action.name: i for i, action in enumerate(self.actions)}
+        self.layout = layout
+        self.compiled = [CompiledAction(i, a, layout) for i, a in enumerate(self.actions)]
+        self.is_move = [action.kind == MOVE for action in self.actions]
+        self.moves_compose = moves_compose(self.actions)
+        self.position_mask = 0
+        self.position_offset = 0
+        if 'agent_position' in layout.slot:
+            slot = layout.slot['agent_position']
+            self.position_mask = layout.masks[slot]
+            self.position_offset = layout.offsets[slot]
+
+        # Precondition index: [(slot mask, {slot bits: [action indices]})]
+        self.always = []
+        index = {}
+        for action, compiled in zip(self.actions, self.compiled):
+            if not action.preconditions:
+                self.always.append(compiled.index)
+                continue
+            key = 'agent_position' if 'agent_position' in action.preconditions else min(action.preconditions, key=str)
+            mask, bits = layout.field(key, action.preconditions[key])
+            index.setdefault(mask, {}).setdefault(bits, []).append(compiled.index)
+        self.index = list(index.items())
+        self.always_tasks = [i for i in self.always if not self.is_move[i]]
+
+    def __setstate__(self, state):
+        # Unpickled (a DomainLoader artifact, a pool worker's copy): the version it brings was
+        # handed out by another process and may be taken here, which would mix up every cache
+        # keyed on it (plan cache, expanders, search memos), so it gets a fresh one
+        self.__dict__.update(state)
+        self.version = next(self._versions)
+
+    def applicable(self, state_code, skip_moves=False):
+        """Indices (in ACTIONS order) of every action whose preconditions hold in state_code (no moves if skip_moves)."""
+        candidates = list(self.always_tasks if skip_moves else self.always)
+        for mask, table in self.index:
+            bucket = table.get(state_code & mask)
+            if bucket:
+                candidates.extend(bucket)
+        candidates.sort()
+        result = []
+        for i in candidates:
+            action = self.compiled[i]
+            if state_code & action.pre_mask != action.pre_bits:
+                continue
+            if action.target_bits is not None and state_code & self.position_mask == action.target_bits:
+                continue
+            if action.numeric_checks and not self._numeric_checks_hold(action, state_code):
+                continue
+            result.append(i)
+        return result
+
+    @staticmethod
+    def _numeric_checks_hold(action, state_code):
+        for offset, mask, compare, threshold in action.numeric_checks:
+            field = (state_code >> offset) & mask
+            if not field or not compare(field, threshold):
+                return False # Absent keys never satisfy a numeric precondition
+        return True
+
+    def cost(self, i, state_code):
+        """Same result as Action.get_cost on the decoded state."""
+        action = self.compiled[i]
+        current_cost = action.base_cost
+        if action.target_bits is not None:
+            position_bits = state_code & self.position_mask
+            current_cost = action.move_costs.get(position_bits)
+            if current_cost is None:
+                position = self.layout.value(self.layout.slot['agent_position'], position_bits >> self.position_offset)
+                current_cost = action.move_costs[position_bits] = calculate_move_cost(position, self.actions[i].target_pos)
+        for mask, bits, adjustment in action.modifiers:
+            if state_code & mask == bits:
+                current_cost += adjustment
+        return max(1, current_cost)
+
+    def apply(self, i, state_code):
+        """The packed state after action i, or None if a numeric delta leaves its slot's range."""
+        action = self.compiled[i]
+        state_code = (state_code & action.keep_mask) | action.effect_bits
+        for offset, mask, delta in action.deltas:
+            field = (state_code >> offset) & mask
+            # An absent key counts as 0, like dict.get(key, 0) + delta
+            new_field = (field or self.layout.NUMERIC_BIAS) + delta
+            if not 0 < new_field <= mask:
+                return None
+            state_code += (new_field - field) << offset
+        return state_code
+
+    def may_reach(self, state_code, goal_state):
+        """
+        Delete-relaxation reachability test: False proves goal_state unreachable from state_code.
+
+        Facts only accumulate (every value a key ever takes stays available), numeric keys keep a
+        range that deltas widen without limit, and costs are ignored. This over-approximates
+        what is reachable, so False is always right and True only means "maybe".
+        """
+        facts = {}
+        ranges = {}     # numeric key -> [low, high]
+        for key, value in self.layout.decode(state_code).items():
+            if self.layout.numeric[self.layout.slot[key]]:
+                ranges[key] = [value, value]
+            else:
+                facts[key] = {value}
+
+        def holds(key, value):
+            if key in ranges:
+                low, high = ranges[key]
+                return value is not None and low <= value <= high
+            return value in facts.get(key, (None,))
+
+        def numeric_holds(key, op, amount):
+            if key not in ranges:
+                return False
+            low, high = ranges[key]
+            return {'>=': high >= amount, '>': high > amount, '<=': low <= amount, '<': low < amount}[op]
+
+        pending = list(self.actions)
+        progress = True
+        while progress:
+            progress = False
+            remaining = []
+            for action in pending:
+                if not (all(holds(k, v) for k, v in action.preconditions.items())
+                        and all(numeric_holds(k, op, amount)
+                                for k, (op, amount) in getattr(action, 'numeric_preconditions', {}).items())):
+                    remaining.append(action)
+                    continue
+                progress = True
+                for key, value in action.combined_effects().items():
+                    if key in ranges:
+                        ranges[key][0] = min(ranges[key][0], value)
+                        ranges[key][1] = max(ranges[key][1], value)
+                    else:
+                        facts.setdefault(key, {None}).add(value)
+                if action.kind == MOVE and action.target_pos is not None:
+                    facts.setdefault('agent_position', {None}).add(action.target_pos)
+                deltas = {**getattr(action, 'shared_deltas', {}), **getattr(action, 'local_deltas', {})}
+                for key, delta in deltas.items():
+                    low, high = ranges.setdefault(key, [0, 0]) # An absent key counts as 0
+                    ranges[key] = [-math.inf, high] if delta < 0 else [low, math.inf]
+            pending = remaining
+        return all(holds(key, value) for key, value in goal_state.items())
+
+    def successors(self, state_code, skip_moves=False):
+        """[(action_index, next_state_code, action_cost), ...] for every applicable action."""
+        result = []
+        for i in self.applicable(state_code, skip_moves):
+            next_code = self.apply(i, state_code)
+            if next_code is not None:
+                cost = self.cost(i, state_code)
+                if cost != math.inf: # A move to a station no walkway reaches
+                    result.append((i, next_code, cost))
+        return result
+
+
+# Compiled action sets are reused between searches over the same actions and state keys
+_COMPILED_CACHE = {}
+_COMPILED_CACHE_SIZE = 64
+
+def _cache_key(state_dicts, available_actions, goal_state):
+    # Key sets, not key order: the layout only depends on which keys exist
+    return (tuple(available_actions), tuple(frozenset(s) for s in state_dicts), frozenset(goal_state),
+            WorldState.navigation) # Compiled sets memoise move costs
+
+def compile_problem(state_dicts, available_actions, goal_state):
+    """
+    Returns (compiled_actions, start_code, goal_mask, goal_bits) for a search.
+
+    The layout and compiled actions are cached per (actions, state keys, goal keys, floor plan)
+    and rebuilt if a start or goal value no longer fits in its slot.
+    """
+    cache_key = _cache_key(state_dicts, available_actions, goal_state)
+    compiled = _COMPILED_CACHE.get(cache_key)
+    for attempt in range(2):
+        if compiled is None:
+            if len(_COMPILED_CACHE) >= _COMPILED_CACHE_SIZE:
+                _COMPILED_CACHE.clear()
+            layout = build_layout(state_dicts, available_actions, goal_state)
+            compiled = _COMPILED_CACHE[cache_key] = CompiledActionSet(available_actions, layout)
+        try:
+            start_code = compiled.layout.encode(*state_dicts)
+            goal_mask, goal_bits = compiled.layout.encode_condition(goal_state)
+            return compiled, start_code, goal_mask, goal_bits
+        except ValueError:
+            compiled = None
+    raise ValueError("Could not build a state layout for this problem")
+
+
+def preload_compiled(state_dicts, available_actions, goal_state, compiled):
+    """Seeds the cache with a CompiledActionSet built earlier (e.g. loaded from a compiled domain file)."""
+    if len(_COMPILED_CACHE) >= _COMPILED_CACHE_SIZE:
+        _COMPILED_CACHE.clear()
+    _COMPILED_CACHE[_cache_key(state_dicts, available_actions, goal_state)] = compiled
@@ -0,0 +1,324 @@
+import heapq
+import itertools
+import math
+from Actions import Action, NUMERIC_OPERATORS
+from CompiledActions import compile_problem
+from Heuristics import resolve_heuristic
+from Planner import SearchTree
+from Pruning import prune_actions
+from SearchStats import SearchStats
+
+# Spends one tick doing nothing: the low-level search inserts it to let another agent go first
+WAIT = Action(name='Wait', preconditions={}, local_effects={}, shared_effects={}, base_cost=1)
+
+WRITE = 'write'     # Constraint: the agent may not change the key at that tick
+READ = 'read'       # Constraint: the agent may not test the key at that tick
+GIVE_UP = ('give up',)  # Constraint: the agent gets no plan (it needs stock that nobody restores)
+
+
+class _Problem:
+    """One agent's search problem, compiled once and searched again under every new set of constraints."""
+
+    def __init__(self, world_state_dict, agent_state_dict, goal_state, available_actions, heuristic):
+        self.agent_state = agent_state_dict
+        self.goal = goal_state
+        pruned = prune_actions(available_actions, goal_state)
+        self.compiled, self.start_code, self.goal_mask, self.goal_bits = compile_problem(
+            [world_state_dict, agent_state_dict], pruned, goal_state)
+        self.h = resolve_heuristic(heuristic, goal_state, pruned, self.compiled.layout)
+        self.actions = list(self.compiled.actions) + [WAIT]
+        self.wait = len(self.compiled.actions)
+        self.index = {action.name: i for i, action in enumerate(self.actions)}
+        # Shared keys each action tests and changes (local keys cannot conflict)
+        self.reads = [frozenset(k for k in (*a.preconditions, *a.numeric_preconditions) if k not in agent_state_dict)
+                      for a in self.compiled.actions]
+        self.writes = [frozenset(k for k in (*a.shared_effects, *a.shared_deltas) if k not in agent_state_dict)
+                       for a in self.compiled.actions]
+        self.reachable = self.compiled.may_reach(self.start_code, goal_state)
+
+    def search(self, constraints, stats):
+        """
+        A* over (state, tick): the cheapest plan that breaks none of the constraints, Waits included.
+
+        After the last constrained tick the tick no longer matters, so states are merged from
+        there on and the search is as finite as plan_actions'. Returns (cost, plan) or (None, None).
+        """
+        stats.searches += 1
+        if GIVE_UP in constraints:
+            return None, None
+        if not self.reachable:
+            stats.failures += 1
+            return None, None
+        no_write, no_read, horizon = _index(constraints)
+        compiled, h, reads, writes, wait = self.compiled, self.h, self.reads, self.writes, self.wait
+
+        tree = SearchTree()
+        root = tree.add((self.start_code, 0), 0)
+        queue = [(h(self.start_code), 0, root)]
+        visited = {(self.start_code, 0): 0}
+        while queue:
+            _, cost, node = heapq.heappop(queue)
+            code, tick = tree.states[node]
+            if cost > visited[(code, min(tick, horizon))]:
+                continue
+            if code & self.goal_mask == self.goal_bits:
+                stats.expanded += 1
+                return cost, tree.plan(node, self.actions)
+            stats.expanded += 1
+            banned_writes = no_write.get(tick)
+            banned_reads = no_read.get(tick)
+            moves = compiled.successors(code)
+            if tick < horizon:
+                moves.append((wait, code, WAIT.base_cost))
+            for index, next_code, action_cost in moves:
+                if index != wait and ((banned_writes and banned_writes & writes[index])
+                                      or (banned_reads and banned_reads & reads[index])):
+                    continue
+                stats.generated += 1
+                key = (next_code, min(tick + 1, horizon))
+                new_cost = cost + action_cost
+                if new_cost < visited.get(key, math.inf):
+                    estimate = h(next_code)
+                    if estimate == math.inf:
+                        continue
+                    visited[key] = new_cost
+                    child = tree.add((next_code, tick + 1), new_cost, node, index)
+                    heapq.heappush(queue, (new_cost + estimate, new_cost, child))
+        stats.failures += 1
+        return None, None
+
+    def repair(self, plan, constraints):
+        """
+        The plan with Waits inserted before every step that would break a constraint, so the
+        steps run later (no search). Returns (cost, plan), or (None, None) for GIVE_UP.
+        """
+        if GIVE_UP in constraints:
+            return None, None
+        no_write, no_read, horizon = _index(constraints)
+        reads, writes, wait = self.reads, self.writes, self.wait
+        repaired = []
+        for name, cost in plan:
+            index = self.index[name]
+            while index != wait and len(repaired) < horizon and (writes[index] & no_write.get(len(repaired), frozenset())
+                                                                 or reads[index] & no_read.get(len(repaired), frozenset())):
+                repaired.append((WAIT.name, WAIT.base_cost))
+            repaired.append((name, cost))
+        return sum(cost for _, cost in repaired), repaired
+
+
+def _index(constraints):
+    """({tick: keys not to write}, {tick: keys not to read}, first tick after the last constraint)"""
+    no_write, no_read = {}, {}
+    for kind, key, tick in constraints:
+        (no_write if kind == WRITE else no_read).setdefault(tick, set()).add(key)
+    return no_write, no_read, max((tick for _, _, tick in constraints), default=-1) + 1
+
+
+def _restorable(key, reader, available_actions):
+    """True if some action can make reader's failed precondition on key hold again."""
+    if key in reader.numeric_preconditions:
+        increase = reader.numeric_preconditions[key][0] in ('>=', '>')
+        return any(key in action.shared_effects or (key in action.shared_deltas and (action.shared_deltas[key] > 0) == increase)
+                   for action in available_actions)
+    value = reader.preconditions.get(key)
+    return any(key in action.shared_deltas or (key in action.shared_effects and action.shared_effects[key] == value)
+               for action in available_actions)
+
+
+def _failing_keys(action, world_state_dict, agent_state_dict):
+    """Keys whose values make action's preconditions fail."""
+    state = {**world_state_dict, **agent_state_dict}
+    keys = [key for key, value in action.preconditions.items() if state.get(key) != value]
+    for key, (op, amount) in action.numeric_preconditions.items():
+        current = state.get(key)
+        if current is None or not NUMERIC_OPERATORS[op](current, amount):
+            keys.append(key)
+    return keys
+
+
+class ConflictPlanner:
+    """
+    Conflict-based search (CBS) for a joint plan in which no agent's action fails.
+
+    Every agent first plans alone. The joint plan is then run the way run_simulation runs it,
+    one action per agent per tick in agent order, skipping agents whose goal is met. The
+    first action whose preconditions fail is a conflict: the agent that tested key k at tick
+    t_read (reader) found it changed by another agent at tick t_write (writer). The search
+    branches on the two ways out, "the writer does not change k at t_write" and "the reader
+    does not test k at t_read", and replans only the constrained agent, with Wait actions to
+    step aside. If no action can ever make the reader's precondition hold again (stock nobody
+    restocks), waiting cannot help, so the second branch is "the reader gives up" instead.
+
+    A node's cost is its sum of plan costs, an agent that gave up counting the cost of the plan
+    it lost. With greedy=False nodes are expanded cheapest first, so the first conflict-free
+    node is the cheapest joint plan; but every agent queueing for one station can then be
+    delayed in every order of equal cost, and the nodes grow exponentially with the queue.
+    greedy (the default) expands the node with the fewest failing agents first (cheapest among
+    those), which finds a conflict-free joint plan in a few nodes per conflict instead. It also
+    reuses the parent node's plan for the constrained agent: Waits are inserted before the steps
+    that break its new constraints (_Problem.repair), and it only searches again when that plan
+    is gone (the agent gave up). A constrained search has to rule out every cheaper placement of
+    its Waits, which grows with the wait, so a queue of n agents costs O(n^2) expansions to
+    search but only n root searches to repair; the repaired plan never takes another route.
+
+    Agents already partway through a plan (fixed) take part in the run but are never constrained:
+    only the other agent of their conflicts is, and a conflict between fixed agents alone is left
+    to replanning.
+
+    max_nodes bounds the high-level search. When it runs out, the agents' independent plans
+    are returned and last_search['resolved'] is False: their conflicts are then handled by
+    replanning, as with reactive coordination.
+    """
+
+    def __init__(self, available_actions, heuristic='max', max_nodes=256, greedy=True):
+        self.available_actions = list(available_actions)
+        self.heuristic = heuristic
+        self.max_nodes = max_nodes
+        self.greedy = greedy
+        self.by_name = {action.name: action for action in (*self.available_actions, WAIT)}
+        self.last_search = None     # {'nodes', 'conflicts', 'repairs', 'resolved'} of the last plan_all
+
+    def plan_all(self, world_state_dict, requests, stats=None, fixed=None):
+        """
+        Args:
+            requests (list): [(agent_state_dict, goal_state), ...] planned jointly, in agent order.
+            stats (list): Optional SearchStats per request, for its agent's low-level searches.
+            fixed (dict): {request index: [(action_name, cost), ...]} the remaining plans of agents
+                that keep them. They are not planned, but the others' plans are made not to
+                conflict with them.
+
+        Returns:
+            [(total_cost, plan), ...] in request order (ParallelPlanner.plan_all's interface).
+            An agent left without a plan gets (None, None); a fixed one gets its plan back.
+        """
+        if not requests:
+            return []
+        fixed = fixed or {}
+        search_stats = stats if stats is not None else [SearchStats() for _ in requests]
+        problems = [None if i in fixed else _Problem(world_state_dict, agent_state, goal, self.available_actions, self.heuristic)
+                    for i, (agent_state, goal) in enumerate(requests)]
+        root = [(sum(cost for _, cost in fixed[i]), fixed[i]) if problem is None else problem.search((), search_stats[i])
+                for i, problem in enumerate(problems)]
+        penalties = [cost or 0 for cost, _ in root] # What an agent giving up costs: the plan it loses
+        counter = itertools.count()
+        queue = []
+        self._push(queue, counter, world_state_dict, requests, fixed, root, [()] * len(problems), penalties)
+        nodes = conflicts = repairs = 0
+        while queue and nodes < self.max_nodes:
+            _, _, solution, constraints, conflict = heapq.heappop(queue)
+            nodes += 1
+            if conflict is None:
+                self.last_search = {'nodes': nodes, 'conflicts': conflicts, 'repairs': repairs, 'resolved': True}
+                return solution
+            conflicts += 1
+            writer, reader, key, t_write, t_read, t_free = conflict
+            failed = self.by_name[solution[reader][1][t_read][0]]
+            branches = []
+            if writer is not None and writer not in fixed:
+                branches.append((writer, ((WRITE, key, t_write),)))
+            if reader not in fixed and key is not None and not _restorable(key, failed, self.available_actions):
+                branches.append((reader, (GIVE_UP,)))
+            elif reader not in fixed:
+                # Not testing k again before the plans change it back, rather than one tick at a
+                # time: the reader waits out a held station in one branch, not one per tick
+                branches.append((reader, tuple((READ, key, tick) for tick in range(t_read, max(t_read, t_free) + 1))))
+            for agent, new in branches:
+                new = tuple(constraint for constraint in new if constraint not in constraints[agent])
+                if not new:
+                    continue
+                child_constraints = list(constraints)
+                child_constraints[agent] = constraints[agent] + new
+                child = list(solution)
+                plan = solution[agent][1]
+                if self.greedy and plan is not None:
+                    child[agent] = problems[agent].repair(plan, child_constraints[agent])
+                    repairs += 1
+                else:
+                    child[agent] = problems[agent].search(child_constraints[agent], search_stats[agent])
+                self._push(queue, counter, world_state_dict, requests, fixed, child, child_constraints, penalties)
+        self.last_search = {'nodes': nodes, 'conflicts': conflicts, 'repairs': repairs, 'resolved': False}
+        return root
+
+    def _push(self, queue, counter, world_state_dict, requests, fixed, solution, constraints, penalties):
+        """Queues a node, with its first conflict found now so greedy ordering can count failing agents."""
+        conflict, failing = self._first_conflict(world_state_dict, requests, fixed, solution)
+        cost = sum(penalty if plan_cost is None else plan_cost for (plan_cost, _), penalty in zip(solution, penalties))
+        priority = (failing, cost) if self.greedy else (cost,)
+        heapq.heappush(queue, (priority, next(counter), solution, constraints, conflict))
+
+    def _first_conflict(self, world_state_dict, requests, fixed, solution):
+        """
+        Runs the joint plan tick by tick. Returns (conflict, number of agents whose action fails).
+
+        conflict is (writer, reader, key, t_write, t_read, t_free) for the first failing action
+        that a constraint can resolve, or None: a fixed reader whose writer is fixed too (or is
+        nobody) only counts as failing. writer is None if no other agent changed the key. t_free
+        is the last tick at which the reader's action would still fail on the key at its turn,
+        going by the other agents' plans (t_read if they never make it hold again).
+        """
+        world = dict(world_state_dict)
+        local = [dict(agent_state) for agent_state, _ in requests]
+        changes = {}    # key -> [(agent, tick)] of every change, oldest first
+        conflict = blocked = free_at = None
+        failed = set() # Agents whose action failed: run_simulation would replan them, so they stop here
+        length = max((len(plan) for _, plan in solution if plan), default=0)
+        running = [agent for agent, (_, plan) in enumerate(solution) if plan] # Agents still moving, in order
+        for tick in range(length):
+            moving = []
+            for agent in running:
+                if agent in failed:
+                    if conflict is None or agent != conflict[1] or free_at is not None:
+                        continue # Only the reader is followed, until its action would hold
+                    if tick > conflict[4] and conflict[2] not in _failing_keys(blocked, world, local[agent]):
+                        free_at = tick # The reader's turn, and its action would no longer fail on the key
+                        continue
+                    moving.append(agent)
+                    continue
+                plan = solution[agent][1]
+                if tick >= len(plan):
+                    continue
+                goal = requests[agent][1]
+                if all(world.get(k) == v for k, v in goal.items()):
+                    continue # Done: run_simulation stops moving this agent
+                moving.append(agent)
+                name = plan[tick][0]
+                if name == WAIT.name:
+                    continue
+                action = self.by_name[name]
+                if not action.check_preconditions(world, local[agent]):
+                    failed.add(agent)
+                    if conflict is None: # Only the first conflict counts; the rest of the run finds t_free
+                        found = ConflictPlanner._conflict(agent, tick, action, world, local[agent], changes)
+                        if agent not in fixed or (found[0] is not None and found[0] not in fixed):
+                            conflict = found
+                            blocked = action
+                    continue
+                before = {key: world.get(key) for key in (*action.shared_effects, *action.shared_deltas)}
+                action.apply_shared_effects(world)
+                action.apply_local_effects(local[agent])
+                for key, value in before.items():
+                    if world.get(key) != value:
+                        changes.setdefault(key, []).append((agent, tick))
+        if conflict is None:
+            return None, 0
+        writer, reader, key, t_write, t_read = conflict
+        if free_at is None and key not in _failing_keys(blocked, world, local[reader]):
+            free_at = max(length, t_read + 1) # Only once every plan has run out
+        t_free = t_read if free_at is None else free_at - 1
+        return (writer, reader, key, t_write, t_read, t_free), len(failed)
+
+    @staticmethod
+    def _conflict(agent, tick, action, world, local, changes):
+        """(writer, reader, key, t_write, t_read) for agent's action failing at tick."""
+        for key in _failing_keys(action, world, local):
+            if key in local:
+                continue
+            writers = [(other, when) for other, when in changes.get(key, ()) if other != agent]
+            if writers:
+                writer, t_write = writers[-1]
+                return writer, agent, key, t_write, tick
+            return None, agent, key, tick, tick
+        return None, agent, next(iter(action.preconditions), None), tick, tick
+
+    def close(self):
+        pass # Nothing to release (same interface as ParallelPlanner)
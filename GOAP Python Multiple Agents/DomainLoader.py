@@ -0,0 +1,372 @@
+import hashlib
+import json
+import os
+import pickle
+from Actions import Action, MOVE, TASK, NUMERIC_OPERATORS
+from WorldState import WorldState
+from Pruning import prune_actions, preload_pruned
+from CompiledActions import compile_problem, preload_compiled
+from Navigation import Navigation
+from PrivateCache import user_cache_dir, is_private, private_dir
+
+# Bump when the file format or the cached artifact changes (the code of the modules below is hashed too)
+CACHE_FORMAT = 1
+_CODE_MODULES = ('Actions.py', 'WorldState.py', 'StateEncoding.py', 'CompiledActions.py', 'Pruning.py',
+                 'Navigation.py', 'DomainLoader.py')
+
+_TOP_LEVEL = {'name', 'locations', 'move_actions', 'floor', 'world_state', 'agent_state', 'actions', 'agents'}
+_ACTION_FIELDS = {'name', 'kind', 'target', 'preconditions', 'local_effects', 'shared_effects', 'numeric_preconditions',
+                  'local_deltas', 'shared_deltas', 'base_cost', 'cost_modifiers'}
+
+
+class DomainError(ValueError):
+    """A domain file that does not describe a valid domain. The message says where."""
+
+
+class Domain:
+    """A loaded domain: everything FactoryManager.from_domain or plan_actions needs."""
+
+    def __init__(self, name, locations, actions, world_state, agent_state, agent_specs, navigation=None):
+        self.name = name
+        self.locations = locations          # {name: (x, y)}
+        self.actions = actions
+        self.world_state = world_state
+        self.agent_state = agent_state      # Local keys every agent starts with (besides agent_position)
+        self.agent_specs = agent_specs      # [(name, start_pos, goal)] as FactoryManager takes them
+        self.navigation = navigation        # Navigation for the domain's floor plan, or None (Manhattan)
+        self.source = None                  # Path it was loaded from
+        self.from_cache = False             # True if load_domain read the compiled artifact
+
+    def agent_state_for(self, i):
+        """Initial local state of agent i, for calling plan_actions directly."""
+        return {'agent_position': self.agent_specs[i][1], **self.agent_state}
+
+    def __repr__(self):
+        return f"Domain({self.name}: {len(self.locations)} locations, {len(self.actions)} actions, {len(self.agent_specs)} agents)"
+
+
+def _hashable(value):
+    """JSON/TOML arrays become tuples, so values can be interned by the state layout."""
+    if isinstance(value, list):
+        return tuple(_hashable(v) for v in value)
+    return value
+
+
+class _Parser:
+    """Validates the parsed document and builds the Domain, raising DomainError with a path on the first problem."""
+
+    def __init__(self, document):
+        self.document = document
+        self.locations = {}
+
+    def fail(self, where, message):
+        raise DomainError(f"{where}: {message}")
+
+    def mapping(self, value, where):
+        if value is None:
+            return {}
+        if not isinstance(value, dict):
+            self.fail(where, f"expected an object, got {type(value).__name__}")
+        return value
+
+    def number(self, value, where, integer=False):
+        if isinstance(value, bool) or not isinstance(value, int if integer else (int, float)):
+            self.fail(where, f"expected {'an integer' if integer else 'a number'}, got {value!r}")
+        return value
+
+    def position(self, value, where):
+        """A location name or an [x, y] pair."""
+        if isinstance(value, str):
+            if value not in self.locations:
+                self.fail(where, f"unknown location '{value}'")
+            return self.locations[value]
+        if (isinstance(value, list) and len(value) == 2
+                and all(isinstance(c, int) and not isinstance(c, bool) for c in value)):
+            return tuple(value)
+        self.fail(where, f"expected a location name or [x, y], got {value!r}")
+
+    def state(self, value, where):
+        """A state or condition dict; agent_position values may name a location."""
+        result = {}
+        for key, item in self.mapping(value, where).items():
+            if key == 'agent_position':
+                result[key] = self.position(item, f"{where}.{key}")
+            else:
+                result[key] = _hashable(item)
+        return result
+
+    def parse(self):
+        document = self.mapping(self.document, 'domain')
+        unknown = set(document) - _TOP_LEVEL
+        if unknown:
+            self.fail('domain', f"unknown fields {sorted(unknown)}")
+        for name, value in self.mapping(document.get('locations'), 'locations').items():
+            self.locations[name] = self.position(value, f"locations.{name}")
+
+        actions = []
+        move_actions = document.get('move_actions', False)
+        if move_actions:
+            options = self.mapping(move_actions if move_actions is not True else {}, 'move_actions')
+            base_cost = self.number(options.get('base_cost', 1), 'move_actions.base_cost')
+            for name, position in self.locations.items():
+                actions.append(Action(name=f'Move to {name}', preconditions={}, local_effects={}, shared_effects={},
+                                      base_cost=base_cost, target_pos=position, kind=MOVE))
+        entries = document.get('actions', [])
+        if not isinstance(entries, list):
+            self.fail('actions', "expected a list")
+        for i, entry in enumerate(entries):
+            actions.append(self.action(entry, f"actions[{i}]"))
+        names = set()
+        for action in actions:
+            if action.name in names:
+                self.fail('actions', f"duplicate action name '{action.name}'")
+            names.add(action.name)
+
+        world_state = self.state(document.get('world_state'), 'world_state')
+        agent_state = self.state(document.get('agent_state'), 'agent_state')
+        agent_specs = []
+        agents = document.get('agents', [])
+        if not isinstance(agents, list):
+            self.fail('agents', "expected a list")
+        for i, entry in enumerate(agents):
+            where = f"agents[{i}]"
+            entry = self.mapping(entry, where)
+            if 'name' not in entry or 'start' not in entry or not entry.get('goal'):
+                self.fail(where, "needs a name, a start and a non-empty goal")
+            start = self.position(entry['start'], f"{where}.start")
+            goal = self.state(entry['goal'], f"{where}.goal")
+            self.check_goal(goal, actions, world_state, f"{where}.goal")
+            agent_specs.append((entry['name'], start, goal))
+
+        navigation = None
+        if document.get('floor') is not None:
+            floor = self.mapping(document['floor'], 'floor')
+            grid = floor.get('grid')
+            if not isinstance(grid, list) or not all(isinstance(row, str) for row in grid):
+                self.fail('floor.grid', "expected a list of strings")
+            stations = list(self.locations.values()) + [start for _, start, _ in agent_specs]
+            try:
+                navigation = Navigation.from_grid(grid, stations, walls=floor.get('walls', '#'))
+            except ValueError as error:
+                self.fail('floor', str(error))
+        return Domain(document.get('name', 'domain'), self.locations, actions, world_state, agent_state, agent_specs,
+                      navigation)
+
+    def action(self, entry, where):
+        entry = self.mapping(entry, where)
+        unknown = set(entry) - _ACTION_FIELDS
+        if unknown:
+            self.fail(where, f"unknown fields {sorted(unknown)}")
+        if not isinstance(entry.get('name'), str):
+            self.fail(where, "needs a name")
+        where = f"{where} ('{entry['name']}')"
+        kind = entry.get('kind', TASK)
+        if kind not in (MOVE, TASK):
+            self.fail(where, f"kind must be '{MOVE}' or '{TASK}', got {kind!r}")
+        if (kind == MOVE) != ('target' in entry):
+            self.fail(where, "moves need a target, and only moves have one")
+
+        numeric_preconditions = {}
+        for key, check in self.mapping(entry.get('numeric_preconditions'), f"{where}.numeric_preconditions").items():
+            if not isinstance(check, list) or len(check) != 2 or check[0] not in NUMERIC_OPERATORS:
+                self.fail(f"{where}.numeric_preconditions.{key}", f"expected [op, amount] with op in {list(NUMERIC_OPERATORS)}")
+            numeric_preconditions[key] = (check[0], self.number(check[1], f"{where}.numeric_preconditions.{key}", True))
+        deltas = {}
+        for field in ('local_deltas', 'shared_deltas'):
+            deltas[field] = {key: self.number(delta, f"{where}.{field}.{key}", True)
+                             for key, delta in self.mapping(entry.get(field), f"{where}.{field}").items()}
+        cost_modifiers = []
+        modifiers = entry.get('cost_modifiers', [])
+        if not isinstance(modifiers, list):
+            self.fail(f"{where}.cost_modifiers", "expected a list")
+        for i, modifier in enumerate(modifiers):
+            modifier = self.mapping(modifier, f"{where}.cost_modifiers[{i}]")
+            cost_modifiers.append({
+                'condition': self.state(modifier.get('condition'), f"{where}.cost_modifiers[{i}].condition"),
+                'adjustment': self.number(modifier.get('adjustment'), f"{where}.cost_modifiers[{i}].adjustment"),
+            })
+        return Action(
+            name=entry['name'],
+            preconditions=self.state(entry.get('preconditions'), f"{where}.preconditions"),
+            local_effects=self.state(entry.get('local_effects'), f"{where}.local_effects"),
+            shared_effects=self.state(entry.get('shared_effects'), f"{where}.shared_effects"),
+            base_cost=self.number(entry.get('base_cost', 1), f"{where}.base_cost"),
+            target_pos=self.position(entry['target'], f"{where}.target") if kind == MOVE else None,
+            cost_modifiers=cost_modifiers,
+            kind=kind,
+            numeric_preconditions=numeric_preconditions,
+            **deltas)
+
+    def check_goal(self, goal, actions, world_state, where):
+        """Every goal key must already hold or be produced by some action (a typo otherwise fails silently)."""
+        for key, value in goal.items():
+            if world_state.get(key) == value or key == 'agent_position':
+                continue
+            if not any(action.produces(key, value) for action in actions):
+                self.fail(where, f"no action produces {key}={value!r}")
+
+
+def _parse(path, data):
+    """The file's document: TOML for .toml files, JSON otherwise."""
+    if path.endswith('.toml'):
+        try:
+            import tomllib
+        except ImportError: # Python < 3.11
+            raise DomainError(f"{path}: TOML domains need Python 3.11+ (tomllib); use JSON instead") from None
+        try:
+            return tomllib.loads(data.decode('utf-8'))
+        except tomllib.TOMLDecodeError as error:
+            raise DomainError(f"{path}: {error}") from None
+    try:
+        return json.loads(data)
+    except ValueError as error:
+        raise DomainError(f"{path}: {error}") from None
+
+
+_code_version = None
+
+def _cache_key(data):
+    """Hash of the file contents, the cache format and the code that builds the artifact."""
+    global _code_version
+    if _code_version is None:
+        digest = hashlib.sha256(str(CACHE_FORMAT).encode())
+        here = os.path.dirname(os.path.abspath(__file__))
+        for module in _CODE_MODULES:
+            with open(os.path.join(here, module), 'rb') as f:
+                digest.update(f.read())
+        _code_version = digest.hexdigest()
+    return hashlib.sha256(_code_version.encode() + data).hexdigest()[:32]
+
+
+def _compile_agents(domain):
+    """Pruned actions and compiled action sets for every agent's problem, as plan_actions would build them."""
+    entries = []
+    previous, WorldState.navigation = WorldState.navigation, domain.navigation
+    try:
+        for i, (_, _, goal) in enumerate(domain.agent_specs):
+            pruned = prune_actions(domain.actions, goal)
+            state_dicts = [domain.world_state, domain.agent_state_for(i)]
+            compiled = compile_problem(state_dicts, pruned, goal)[0]
+            entries.append((goal, pruned, state_dicts, compiled))
+    finally:
+        WorldState.navigation = previous
+    return entries
+
+
+def _install(domain, entries):
+    """Puts the compiled problems where plan_actions looks them up first."""
+    previous, WorldState.navigation = WorldState.navigation, domain.navigation
+    try:
+        for goal, pruned, state_dicts, compiled in entries:
+            preload_pruned(domain.actions, goal, pruned)
+            preload_compiled(state_dicts, pruned, goal, compiled)
+    finally:
+        WorldState.navigation = previous
+
+
+def load_domain(path, cache_dir=None, use_cache=True):
+    """
+    Loads a JSON or TOML domain file, validated and compiled.
+
+    The compiled artifact (actions, states, and every agent's pruned and compiled action set)
+    is pickled to cache_dir under a hash of the file's contents and of the planner code, and
+    later loads of the same file read it back instead of parsing and compiling again. The
+    compiled action sets are installed in the planner's caches, so the first searches of the
+    domain's agents skip compilation too. A missing or damaged artifact is rebuilt and written again.
+
+    Args:
+        path (str): A .json or .toml file (see domains/factory.json).
+        cache_dir (str): Where compiled artifacts live (default: goap_domains in the user's cache
+            directory, created private). Unless it and the artifact belong to the current user
+            and nobody else can write to them, the cache is not used, with a RuntimeWarning.
+        use_cache (bool): False always parses and compiles, and writes no artifact.
+
+    Returns:
+        Domain. Raises DomainError if the file is invalid.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    directory = cache_dir if cache_dir is not None else user_cache_dir('goap_domains')
+    artifact = os.path.join(directory, f'{_cache_key(data)}.pickle')
+    # Unpickling runs code, so an artifact someone else could have planted or replaced is never loaded
+    use_cache = use_cache and private_dir(directory, 'compiled domains')
+    if use_cache:
+        try:
+            with open(artifact, 'rb') as f:
+                if not is_private(os.fstat(f.fileno())):
+                    raise OSError("not private") # Checked on the open file, so it cannot be swapped after the check
+                domain, entries = pickle.load(f)
+            _install(domain, entries)
+            domain.source, domain.from_cache = path, True
+            return domain
+        except Exception:
+            pass # Missing, unreadable or damaged (pickle raises almost anything on bad bytes): rebuild it
+
+    domain = _Parser(_parse(path, data)).parse()
+    domain.source = path
+    entries = _compile_agents(domain)
+    if use_cache:
+        partial = f'{artifact}.{os.getpid()}.tmp'
+        with open(partial, 'wb') as f:
+            pickle.dump((domain, entries), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(partial, artifact) # Atomic, so concurrent loaders never read half an artifact
+    return domain
+
+
+def _dumps(value, indent=''):
+    """JSON with one entry per line, but positions, checks and other flat lists on one line."""
+    inner = indent + '  '
+    if isinstance(value, dict) and value:
+        items = [f"{inner}{json.dumps(key)}: {_dumps(item, inner)}" for key, item in value.items()]
+        return '{\n' + ',\n'.join(items) + f'\n{indent}}}'
+    if isinstance(value, list) and any(isinstance(item, (dict, list)) for item in value):
+        return '[\n' + ',\n'.join(inner + _dumps(item, inner) for item in value) + f'\n{indent}]'
+    return json.dumps(value)
+
+
+def save_domain(domain, path, locations=None):
+    """
+    Writes a domain as a JSON file load_domain reads back, e.g. to turn a domain built in Python
+    (a Domain, or anything with actions, world_state, agent_state and agent_specs) into a file.
+
+    Positions that match a named location (domain.locations, or the locations given) are written by name.
+    """
+    locations = dict(locations if locations is not None else getattr(domain, 'locations', {}))
+    names = {position: name for name, position in locations.items()}
+
+    def position(value):
+        return names.get(value, list(value))
+
+    def state(values):
+        return {key: position(value) if key == 'agent_position' else (list(value) if isinstance(value, tuple) else value)
+                for key, value in values.items()}
+
+    entries = []
+    for action in domain.actions:
+        entry = {'name': action.name}
+        if action.kind == MOVE:
+            entry['kind'] = MOVE
+            entry['target'] = position(action.target_pos)
+        for field in ('preconditions', 'local_effects', 'shared_effects'):
+            if getattr(action, field):
+                entry[field] = state(getattr(action, field))
+        if action.numeric_preconditions:
+            entry['numeric_preconditions'] = {key: list(check) for key, check in action.numeric_preconditions.items()}
+        for field in ('local_deltas', 'shared_deltas'):
+            if getattr(action, field):
+                entry[field] = dict(getattr(action, field))
+        entry['base_cost'] = action.base_cost
+        if action.cost_modifiers:
+            entry['cost_modifiers'] = [{'condition': state(m['condition']), 'adjustment': m['adjustment']}
+                                       for m in action.cost_modifiers]
+        entries.append(entry)
+    document = {
+        'name': getattr(domain, 'name', 'domain'),
+        'locations': {name: list(position) for name, position in locations.items()},
+        'world_state': state(domain.world_state),
+        'agent_state': state(domain.agent_state),
+        'actions': entries,
+        'agents': [{'name': agent, 'start': position(start), 'goal': state(goal)} for agent, start, goal in domain.agent_specs],
+    }
+    with open(path, 'w') as f:
+        f.write(_dumps(document) + '\n')
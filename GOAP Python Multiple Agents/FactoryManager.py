@@ -1,27 +1,143 @@
+import heapq
 import time
-import matplotlib.pyplot as plt
+from array import array
 from WorldState import WorldState, calculate_move_cost
 from Agent import Agent
+from Planner import EXPANSION_LIMIT, DEADLINE
 from Actions import ACTIONS
+from PlanCache import PlanCache
+from ParallelPlanner import ParallelPlanner
+from SearchStats import SearchStats
+from Macros import MacroAction, MacroLibrary
+from WorldStore import WorldStore
+from Pruning import prune_actions
+from ConflictPlanner import ConflictPlanner, WAIT
+from Trace import (Tracer, TraceRecorder, ConsoleSink, RUN, TICK, JOINT, START, FINISH, BLOCKED, GOAL, STUCK,
+                   BUDGET, STATUS, END)
+from Visualization import render_paths, OVERLAY
 
 class FactoryManager:
-    def __init__(self):
-        self.world_state = WorldState().state
+    def __init__(self, agent_specs=None, world_state=None, incremental=False, verbose=True, workers=None,
+                 collect_stats=False, actions=None, agent_state=None, search_options=None, macros=False, navigation=None,
+                 coordination='reactive', trace=None):
+        """
+        Args:
+            agent_specs (list): Optional [(name, start_pos, goal), ...] for any number of agents.
+                Defaults to Agent A (Finished Widget) and Agent B (Heavy Duty Assembly).
+            world_state (dict): Optional overrides for the initial shared world state.
+            incremental (bool): Agents repair their previous search (IncrementalPlanner)
+                instead of replanning from scratch after a conflict.
+            verbose (bool): Print every plan, action and status line (a ConsoleSink on the trace;
+                turn off for large runs).
+            workers (int): Plan every agent that needs a new plan in a tick in a process pool of
+                this size (0 = same batched planning, in-process). None plans agents one after
+                another as they act. Batched plans are made against the world state at the
+                start of the tick and applied in agent order, so runs stay reproducible.
+            collect_stats (bool): Record SearchStats for every search, totalled per agent
+                (agent_stats) and per tick (tick_stats).
+            actions (list): Action set to plan with (defaults to Actions.ACTIONS).
+            agent_state (dict): Extra initial local state for every agent, for keys a custom
+                action set uses.
+            search_options (dict): Bounded search for every agent's update_plan, e.g.
+                {'time_budget': 0.005}, {'anytime': True, 'max_expansions': 200} or
+                {'direction': 'backward'} or {'batch_size': 64} or {'max_nodes': 50000} (see Agent).
+                An agent whose search runs out of budget keeps its turn and retries next tick.
+                Batched planning (workers) does not use them.
+            macros (bool): Learn macro-actions from the agents' plans (a MacroLibrary shared by every
+                agent, like the plan cache) and plan with them. Batched planning does not use them.
+            navigation (Navigation): Floor plan for movement costs (sets WorldState.navigation for
+                every search). None keeps the current one (Manhattan distances by default).
+            coordination (str): 'reactive' lets agents plan alone and replan when another agent's
+                action breaks their plan. 'cbs' plans every agent that needs a plan in a tick
+                together, with conflict-based search (ConflictPlanner), into a joint plan whose
+                actions never fail (agents may Wait for each other, and for the remaining plans
+                of agents that keep theirs). It plans in-process, like
+                workers, and does not use search_options or macros.
+            trace (str): Path of a JSONL file to record every run's events to (a TraceRecorder; see
+                Trace.py), or any sink with record(event) and close(). Trace.replay rebuilds the
+                world-state timeline from it without planning.
+        """
+        if coordination not in ('reactive', 'cbs'):
+            raise ValueError("coordination must be 'reactive' or 'cbs'")
+        if coordination == 'cbs' and workers is not None:
+            raise ValueError("coordination='cbs' plans in-process: leave workers unset")
+        if navigation is not None:
+            WorldState.navigation = navigation
+        state = WorldState().state
+        state['has_raw_steel'] = 2 # Ensure resources for both
+        if world_state:
+            state.update(world_state)
+        # Versioned, so agents detect conflicts by key versions and actions apply in place
+        self.world_state = WorldStore(state)
+        self.verbose = verbose
+        # Simulation events go to the console and/or a trace file (None when neither: nothing is built)
+        sinks = [ConsoleSink()] if verbose else []
+        if trace is not None:
+            sinks.append(TraceRecorder(trace) if isinstance(trace, str) else trace)
+        self.trace = Tracer(sinks) if sinks else None
+        self.actions = actions if actions is not None else ACTIONS
+        if coordination == 'cbs':
+            self.actions = list(self.actions) + [WAIT] # Joint plans may hold an agent back
+        self.actions_by_name = {action.name: action for action in self.actions}
+        # Named stations, for visualize_plan
+        self.locations = {
+            'Receiving': WorldState.LOC_RECEIVING,
+            'Cutter': WorldState.LOC_CUTTER,
+            'Assembler': WorldState.LOC_ASSEMBLER,
+            'Press': WorldState.LOC_PRESS
+        }
         
-        # 🎯 Agent A Goal: Finished Widget
-        goal_A = {'has_finished_widget': 1}
+        if agent_specs is None:
+            # 🎯 Agent A Goal: Finished Widget
+            goal_A = {'has_finished_widget': 1}
+            
+            # 🎯 Agent B Goal: Heavy Duty Assembly (Requires Machined Part)
+            goal_B = {'has_heavy_duty_assembly': 1}
+            
+            agent_specs = [
+                ("Agent A", WorldState.LOC_RECEIVING, goal_A),
+                ("Agent B", WorldState.LOC_ASSEMBLER, goal_B)
+            ]
         
-        # 🎯 Agent B Goal: Heavy Duty Assembly (Requires Machined Part)
-        goal_B = {'has_heavy_duty_assembly': 1}
+        # One plan cache for every agent: identical (state, goal) searches are solved once
+        self.plan_cache = PlanCache()
+        self.macro_library = MacroLibrary() if macros else None
+        # Plans every agent that needs a plan in a tick at once (None: agents plan one after another)
+        if coordination == 'cbs':
+            self.batch_planner = ConflictPlanner(self.actions)
+        else:
+            self.batch_planner = ParallelPlanner(self.actions, workers) if workers is not None else None
         
         self.agents = [
-            Agent("Agent A", WorldState.LOC_RECEIVING, goal_A),
-            Agent("Agent B", WorldState.LOC_ASSEMBLER, goal_B)
+            Agent(name, start_pos, goal, self.plan_cache, incremental, self.trace, self.actions, agent_state, search_options,
+                  self.macro_library)
+            for name, start_pos, goal in agent_specs
         ]
         
         # New tracking variables
         self.agent_status = {agent.name: 'IN_PROGRESS' for agent in self.agents}
-        self.world_state['has_raw_steel'] = 2 # Ensure resources for both
+        self.status_counts = {'IN_PROGRESS': len(self.agents), 'COMPLETED': 0}
+        
+        # Search instrumentation (None when off, so planning runs uninstrumented)
+        self.collect_stats = collect_stats
+        self.agent_stats = {agent.name: SearchStats() for agent in self.agents} if collect_stats else None
+        self.tick_stats = [] if collect_stats else None
+
+    @classmethod
+    def from_domain(cls, domain, **options):
+        """
+        A manager for a Domain from DomainLoader.load_domain, taking the options of __init__.
+
+        The world and agent states are exactly the domain's (no factory defaults are merged in),
+        so the agents' first searches find the action sets load_domain compiled.
+        """
+        manager = cls(domain.agent_specs, actions=domain.actions, agent_state=domain.agent_state,
+                      navigation=domain.navigation, **options)
+        manager.world_state = WorldStore(domain.world_state)
+        manager.locations = dict(domain.locations)
+        for i, agent in enumerate(manager.agents):
+            agent.agent_state = domain.agent_state_for(i)
+        return manager
 
     def _check_agent_goal(self, agent):
         """Checks if an agent's specific goal is met in the shared world state."""
@@ -29,25 +145,24 @@ class FactoryManager:
         
         if goal_met and self.agent_status[agent.name] == 'IN_PROGRESS':
             self.agent_status[agent.name] = 'COMPLETED'
-            print(f"\n🎉 GOAL ACCOMPLISHED! {agent.name} has produced the required item.")
+            self.status_counts['IN_PROGRESS'] -= 1
+            self.status_counts['COMPLETED'] += 1
+            if self.trace is not None:
+                self.trace.emit(GOAL, agent=agent.name)
         
         return self.agent_status[agent.name] == 'COMPLETED'
     
     def visualize_plan(self, agent_name, final_plan, agent_locations):
         """
-        Plots the factory floor and the movement path of a single agent.
+        Plots the factory floor and the movement path of a single agent, in a window (blocks until closed).
         """
         if not final_plan:
             print(f"Cannot visualize: {agent_name} did not complete a plan.")
             return
+        import matplotlib.pyplot as plt # Only when drawing: importing matplotlib takes hundreds of ms
 
         # 1. Factory Setup: Define all fixed locations
-        loc_map = {
-            'Receiving': WorldState.LOC_RECEIVING,
-            'Cutter': WorldState.LOC_CUTTER,
-            'Assembler': WorldState.LOC_ASSEMBLER,
-            'Press': WorldState.LOC_PRESS
-        }
+        loc_map = self.locations
         loc_names = list(loc_map.keys())
         X = [p[0] for p in loc_map.values()]
         Y = [p[1] for p in loc_map.values()]
@@ -79,85 +194,359 @@ class FactoryManager:
         ax.legend()
         plt.show()
 
-    def run_simulation(self, max_steps=50):
+    def agent_paths(self, completed_only=True):
+        """
+        Yields (agent_name, xs, ys) for every agent's path in the last run, straight from the
+        per-agent history arrays (nothing is copied).
+
+        Args:
+            completed_only (bool): Only the agents that met their goal (the ones visualize shows).
+        """
+        for i, agent in enumerate(self.agents):
+            if not completed_only or self.final_plans[i]:
+                yield agent.name, self.path_x[i], self.path_y[i]
+
+    def render_paths(self, filename, layout=OVERLAY, completed_only=True, **options):
+        """
+        Draws the last run's agent paths into an image file, headless (see Visualization.render_paths).
+
+        Args:
+            filename (str): .png, .svg or any other format matplotlib writes.
+            layout (str): 'overlay' (every path on one plot) or 'grid' (one panel per agent).
+            completed_only (bool): Only the agents that met their goal.
+            options: columns, title or dpi for Visualization.render_paths.
+
+        Returns:
+            int: Number of paths drawn.
+        """
+        return render_paths(filename, self.agent_paths(completed_only), self.locations, layout, **options)
+
+    def run_simulation(self, max_steps=50, visualize=True):
         """
         Runs the turn-based simulation, processing each agent's next action 
         until all goals are met or max_steps is reached.
+
+        visualize: True plots every completed agent's path in its own window (each blocks until
+        closed). A file name (e.g. 'paths.png' or 'paths.svg') draws them all on one figure
+        into that file instead, headless (render_paths), for unattended runs.
+        
+        Scheduling: each tick only walks the ready queue (agents that can act or must replan),
+        in agent order. Completed agents leave the queue for good. Agents with no possible
+        plan are parked until an executed action changes the shared world state, because
+        replanning against an unchanged world would fail again. Idle agents therefore
+        cost nothing per tick.
         """
+        count = len(self.agents)
+        self._reset_history()
+        trace = self.trace
+        self._start_trace('ticks')
         
-        # Tracking list for visualization (starts at initial position)
-        agent_A_path = [self.agents[0].agent_state['agent_position']]
-        agent_B_path = [self.agents[1].agent_state['agent_position']]
-        
-        final_plan_A = None
-        final_plan_B = None
-        all_goals_met = False
-
-        print("\n--- Starting Multi-Agent Factory Simulation ---")
+        ready = [i for i in range(count) if not self._check_agent_goal(self.agents[i])]
+        parked = []             # Agents waiting for the shared world state to change
+        all_goals_met = not ready
         
         for step in range(max_steps):
             
             # 1. Check if ALL goals are met before running the step
-            all_goals_met = all(self._check_agent_goal(agent) for agent in self.agents)
             if all_goals_met:
-                print(f"\n✅ ALL GOALS ACHIEVED: Both products manufactured in {step} steps.")
+                if trace is not None:
+                    trace.emit(END, outcome='done', steps=step)
+                break
+            if not ready:
+                # Everyone left is parked and nothing can change the world any more
+                if trace is not None:
+                    trace.emit(END, outcome='stuck', steps=step)
                 break
 
-            print(f"\n--- Step {step+1} ---")
+            if trace is not None:
+                trace.now = step + 1
+                trace.emit(TICK)
             
-            # --- 2. Process Agent A ---
-            agent_A = self.agents[0]
-            if not self._check_agent_goal(agent_A):
-                self._process_agent(agent_A)
+            # 2. Process the ready agents in agent order
+            if self.collect_stats:
+                self.tick_stats.append(SearchStats())
+            next_ready = []
+            world_version = self.world_state.version # Advanced by every change to the shared state
+            no_plan = self._plan_batch(ready) if self.batch_planner is not None else ()
+            for i in ready:
+                agent = self.agents[i]
+                if self._check_agent_goal(agent):
+                    continue # Completed by another agent's shared effects
+                if i in no_plan:
+                    parked.append(i)
+                    continue
                 
-                # Update path and check for final completion
-                agent_A_path.append(agent_A.agent_state['agent_position'])
-                if self._check_agent_goal(agent_A) and not final_plan_A:
-                    # Capture the full plan on the step the goal is achieved
-                    final_plan_A = agent_A.exectued_plan
-            else:
-                print(f"[{agent_A.name}] Status: Goal already achieved (Completed).")
-
-            # --- 3. Process Agent B ---
-            agent_B = self.agents[1]
-            if not self._check_agent_goal(agent_B):
-                self._process_agent(agent_B)
+                position = agent.agent_state['agent_position']
+                if not self._process_agent(agent):
+                    parked.append(i)
+                    continue
                 
                 # Update path and check for final completion
-                agent_B_path.append(agent_B.agent_state['agent_position'])
-                if self._check_agent_goal(agent_B) and not final_plan_B:
+                new_position = agent.agent_state['agent_position']
+                if new_position != position:
+                    self.path_x[i].append(new_position[0])
+                    self.path_y[i].append(new_position[1])
+                if self._check_agent_goal(agent):
                     # Capture the full plan on the step the goal is achieved
-                    final_plan_B = agent_B.exectued_plan
-            else:
-                print(f"[{agent_B.name}] Status: Goal already achieved (Completed).")
+                    self.final_plans[i] = agent.exectued_plan
+                else:
+                    next_ready.append(i)
+            
+            # 3. A changed world can unblock parked agents (or complete their goals)
+            if parked and self.world_state.version != world_version:
+                next_ready.extend(parked)
+                next_ready.sort()
+                parked = []
+            ready = next_ready
+            all_goals_met = self.status_counts['IN_PROGRESS'] == 0
             
             # 4. Display current overall progress
-            print(f"\n[Overall Status] Agent A: {self.agent_status['Agent A']}, Agent B: {self.agent_status['Agent B']}")
+            if trace is not None:
+                trace.emit(STATUS, completed=self.status_counts['COMPLETED'],
+                           in_progress=self.status_counts['IN_PROGRESS'], stuck=len(parked))
         
+        self._finish(all_goals_met, visualize)
+        return all_goals_met
+
+    def run_event_simulation(self, until=None, max_events=None, visualize=True, budget_retries=100):
+        """
+        Runs the simulation on a clock instead of lockstep ticks: every action takes its cost in
+        time units, until all goals are met, nothing is left to happen, or the clock passes until.
+
+        Events are kept in a heap ordered by (time, agent order). An agent decides (plans if it
+        has to, then starts its next action) at one event, and the action's completion, at
+        now + its cost, is the next event. The effects are committed at completion, so they may
+        meet a conflict, and then the agent replans right away as in run_simulation. The clock
+        jumps from event to event, so the run costs O(actions executed x log agents) whatever
+        the durations.
+
+        An agent with no possible plan is parked on the shared keys its goal and its relevant
+        actions (Pruning) read, and is only woken when an action changes one of them. So is an
+        agent whose search runs out of max_expansions, since the same search would run out
+        again; an anytime search or one with a time_budget tries again one time unit later, and is
+        parked too after budget_retries such tries in a row, so every run ends. Batched and joint
+        planning (workers, 'cbs') are not used: every agent plans at its own decision events.
+
+        Args:
+            until (float): Stop at the first event after this time.
+            max_events (int): Stop after this many events.
+            visualize (bool or str): As for run_simulation.
+            budget_retries (int): Tries an anytime or time_budget search gets, one time unit
+                apart, before its agent is parked (counted again after a plan or a wake-up).
+
+        Returns:
+            bool: True if all goals are met. self.now is the clock at the last event, and self.events the event count.
+        """
+        self._reset_history()
+        self.now = 0
+        self.events = 0
+        world = self.world_state
+        trace = self.trace
+        self._start_trace('events')
+        # (time, agent index, action completing then or None for a decision): an agent has at most
+        # one pending event, so ties never compare actions
+        queue = [(0, i, None) for i, agent in enumerate(self.agents) if not self._check_agent_goal(agent)]
+        heapq.heapify(queue)
+        parked = set()
+        waiting = {}            # Shared key -> agents parked until it changes
+        retries = {}            # Agent -> budget failures in a row (anytime or time_budget searches)
+        if self.collect_stats:
+            self.tick_stats.append(SearchStats()) # The whole run is one "tick"
+
+        while queue:
+            if (until is not None and queue[0][0] > until) or (max_events is not None and self.events >= max_events):
+                break
+            self.now, i, action = heapq.heappop(queue)
+            self.events += 1
+            agent = self.agents[i]
+            if trace is not None:
+                trace.now = self.now
+
+            if action is not None:
+                # Completion: commit the effects and wake the agents parked on what changed
+                version = world.version
+                position = agent.agent_state['agent_position']
+                if trace is not None:
+                    trace.emit(FINISH, agent=agent.name, action=action.name)
+                agent.execute_action(action, world)
+                if world.version != version:
+                    for key in action.shared_effects.keys() | action.shared_deltas.keys():
+                        if world.version_of(key) > version:
+                            for j in waiting.pop(key, ()):
+                                if j in parked:
+                                    parked.discard(j)
+                                    retries.pop(j, None)
+                                    heapq.heappush(queue, (self.now, j, None))
+                new_position = agent.agent_state['agent_position']
+                if new_position != position:
+                    self.path_x[i].append(new_position[0])
+                    self.path_y[i].append(new_position[1])
+
+            # Decision: done, plan, or start the next action
+            if self._check_agent_goal(agent):
+                self.final_plans[i] = agent.exectued_plan
+                continue
+            planned = self._ensure_plan(agent)
+            if planned is None and (agent.anytime_planner is not None or 'time_budget' in agent.search_options):
+                retries[i] = retries.get(i, 0) + 1
+                if retries[i] <= budget_retries:
+                    heapq.heappush(queue, (self.now + 1, i, None)) # Keeps improving, or gets a fresh deadline
+                    continue
+            elif planned:
+                retries.pop(i, None)
+            if not planned:
+                # Stuck, out of an expansion budget that the same search would exhaust again, or out of retries
+                parked.add(i)
+                for key in self._wake_keys(agent):
+                    waiting.setdefault(key, set()).add(i)
+                continue
+            action_name, _ = agent.plan.pop(0)
+            action = self.actions_by_name.get(action_name) or self.macro_library.macros[action_name]
+            if isinstance(action, MacroAction):
+                # Planned as one edge, run as its primitive steps (like Agent.execute_action)
+                agent.plan[0:0] = [(step.name, cost) for step, cost in action.steps[1:]]
+                action = action.steps[0][0]
+            state = {**world, **agent.agent_state}
+            if not (agent.read_versions is not None and world.unchanged(agent.read_versions)) \
+                    and not action.check_preconditions(world, agent.agent_state):
+                # Someone changed what the plan relies on: replan now instead of starting a doomed action
+                if trace is not None:
+                    trace.emit(BLOCKED, agent=agent.name, action=action.name)
+                agent.plan = None
+                heapq.heappush(queue, (self.now, i, None))
+                continue
+            duration = action.get_cost(state)
+            if trace is not None:
+                trace.emit(START, agent=agent.name, action=action.name, until=self.now + duration)
+            heapq.heappush(queue, (self.now + duration, i, action))
+
+        all_goals_met = self.status_counts['IN_PROGRESS'] == 0
+        if trace is not None and (all_goals_met or not queue):
+            trace.emit(END, outcome='done' if all_goals_met else 'stuck', events=self.events)
+        self._finish(all_goals_met, visualize)
+        return all_goals_met
+
+    def _start_trace(self, mode):
+        """Opens a run in the trace with the states it starts from, for replay."""
+        if self.trace is not None:
+            self.trace.now = 0
+            self.trace.emit(RUN, mode=mode, world=dict(self.world_state),
+                            agents={agent.name: dict(agent.agent_state) for agent in self.agents})
+
+    def _reset_history(self):
+        # Per-agent history, allocated once and indexed by agent position in self.agents:
+        # the path only grows when the agent actually moves
+        self.path_x = [array('d', [agent.agent_state['agent_position'][0]]) for agent in self.agents]
+        self.path_y = [array('d', [agent.agent_state['agent_position'][1]]) for agent in self.agents]
+        self.final_plans = [None] * len(self.agents)
+
+    def _wake_keys(self, agent):
+        """Shared keys whose change can give a stuck agent a plan: its goal's, and those its relevant actions test."""
+        keys = set(agent.goal)
+        for action in prune_actions(agent.actions, agent.goal):
+            keys.update(action.preconditions)
+            keys.update(action.numeric_preconditions)
+        return [key for key in keys if key not in agent.agent_state]
+
+    def _finish(self, all_goals_met, visualize):
+        """Visualization, pool shutdown and the summary, after either kind of run."""
         # 5. POST-SIMULATION VISUALIZATION
-        print("\n--- Generating Visualization ---")
-        if final_plan_A:
-            self.visualize_plan(agent_A.name, final_plan_A, agent_A_path)
-        if final_plan_B:
-            self.visualize_plan(agent_B.name, final_plan_B, agent_B_path)
+        if isinstance(visualize, str):
+            self.render_paths(visualize)
+        elif visualize:
+            print("\n--- Generating Visualization ---")
+            for i, agent in enumerate(self.agents):
+                if self.final_plans[i]:
+                    self.visualize_plan(agent.name, self.final_plans[i], list(zip(self.path_x[i], self.path_y[i])))
         
-        if not all_goals_met:
-            print("\n❌ Simulation ended without achieving all goals.")
+        if self.batch_planner is not None:
+            self.batch_planner.close()
+        if self.trace is not None:
+            self.trace.close() # Flushes the trace file (a later run appends to it)
+        
+        if self.verbose:
+            if not all_goals_met:
+                print("\n❌ Simulation ended without achieving all goals.")
+            print(f"\n[Plan Cache] {self.plan_cache.stats()}")
+            if self.macro_library is not None:
+                print(f"[Macros] {self.macro_library.stats()}")
+            if self.collect_stats:
+                for name, stats in self.agent_stats.items():
+                    print(f"[Search Stats] {name}: {stats}")
 
-    def _process_agent(self, agent):
-        if not agent.plan:
+    def _plan_batch(self, ready):
+        """Plans, in one batch (parallel or joint), for every ready agent without a plan. Returns the ones left without a plan."""
+        needing = [i for i in ready if not self.agents[i].plan and not self._check_agent_goal(self.agents[i])]
+        if not needing:
+            return set()
+        batch_stats = [SearchStats() for _ in needing] if self.collect_stats else None
+        if isinstance(self.batch_planner, ConflictPlanner):
+            # Agents partway through a plan keep it, and the new plans are made not to conflict with it
+            position = {i: n for n, i in enumerate(needing)}
+            moving = [i for i in ready if i in position or self.agents[i].plan]
+            fixed = {n: list(self.agents[i].plan) for n, i in enumerate(moving) if i not in position}
+            stats = batch_stats and [batch_stats[position[i]] if i in position else SearchStats() for i in moving]
+            results = self.batch_planner.plan_all(
+                self.world_state, [(self.agents[i].agent_state, self.agents[i].goal) for i in moving], stats, fixed)
+            results = [result for n, result in enumerate(results) if n not in fixed]
+            if self.trace is not None:
+                self.trace.emit(JOINT, agents=len(needing), search=self.batch_planner.last_search)
+        else:
+            results = self.batch_planner.plan_all(
+                self.world_state, [(self.agents[i].agent_state, self.agents[i].goal) for i in needing], batch_stats)
+        no_plan = set()
+        for n, (i, (_, plan)) in enumerate(zip(needing, results)):
+            if self.collect_stats:
+                self._record_stats(self.agents[i], batch_stats[n])
+            self.agents[i].adopt_plan(plan, self.world_state)
+            if not plan:
+                no_plan.add(i)
+                if self.trace is not None:
+                    self.trace.emit(STUCK, agent=self.agents[i].name)
+        return no_plan
+
+    def _record_stats(self, agent, stats):
+        """Adds one planning call's SearchStats to the agent's totals and the current tick's."""
+        self.agent_stats[agent.name].merge(stats)
+        self.tick_stats[-1].merge(stats)
+
+    def _ensure_plan(self, agent):
+        """Plans if the agent has no plan. Returns True if it has one, False if it is stuck, None if out of budget."""
+        if agent.plan:
+            return True
+        if self.collect_stats:
+            stats = SearchStats()
+            agent.update_plan(self.world_state, stats)
+            self._record_stats(agent, stats)
+        else:
             agent.update_plan(self.world_state)
-            if not agent.plan:
-                # If no plan is found and goal is not met, the agent is stuck.
-                print(f"[{agent.name}] Status: STUCK (No possible plan found to complete goal).")
-                return
+        if not agent.plan and agent.last_result.reason in (EXPANSION_LIMIT, DEADLINE):
+            # Out of planning budget, not proven stuck: try again (or keep improving) later
+            if self.trace is not None:
+                self.trace.emit(BUDGET, agent=agent.name, reason=agent.last_result.reason)
+            return None
+        if not agent.plan:
+            # If no plan is found and goal is not met, the agent is stuck.
+            if self.trace is not None:
+                self.trace.emit(STUCK, agent=agent.name)
+            return False
+        return True
+
+    def _process_agent(self, agent):
+        """Plans if needed and executes the agent's next action. Returns False if the agent is stuck."""
+        planned = self._ensure_plan(agent)
+        if planned is None:
+            return True # Retry next tick
+        if not planned:
+            return False
 
         # Get the next action and attempt execution
         action_name, _ = agent.plan.pop(0)
-        action = next(a for a in ACTIONS if a.name == action_name)
+        action = self.actions_by_name.get(action_name)
+        if action is None:
+            action = self.macro_library.macros[action_name] # Expanded into its steps by the agent
         
         # Attempt to execute. If it fails, force re-plan.
+        # (The trace's ACTION or CONFLICT event is followed by the shared state on the console.)
         agent.execute_action(action, self.world_state)
-        
-        # Current shared state after action
-        print(f"  Shared State: Steel={self.world_state['has_raw_steel']}, Widget={self.world_state['has_finished_widget']}, Heavy={self.world_state['has_heavy_duty_assembly']}")
\ No newline at end of file
+        return True
@@ -0,0 +1,117 @@
+import math
+from WorldState import calculate_move_cost
+from Actions import MOVE
+
+# Every heuristic below is a lower bound on the remaining plan cost, so A* keeps returning
+# optimal plans. A heuristic is built once per search from the goal, the action list and the
+# search's StateLayout, and then called as h(state_code) for every generated packed state.
+
+def zero_heuristic(goal_state, available_actions, layout):
+    """Uniform-cost search (the original Dijkstra behaviour)."""
+    return lambda state_code: 0
+
+
+def goal_count_heuristic(goal_state, available_actions, layout):
+    """Unsatisfied goal keys weighted by the cheapest action that can produce each of them."""
+    # Cheapest producer per goal key, and the most goal keys a single action can satisfy
+    cheapest = {}
+    max_keys_per_action = 1
+    for action in available_actions:
+        satisfied = 0
+        for key, value in goal_state.items():
+            if action.produces(key, value):
+                satisfied += 1
+                cheapest[key] = min(cheapest.get(key, math.inf), action.min_cost())
+        max_keys_per_action = max(max_keys_per_action, satisfied)
+
+    goal_fields = [(key,) + layout.field(key, value) for key, value in goal_state.items()]
+
+    def h(state_code):
+        unsatisfied = [key for key, mask, bits in goal_fields if state_code & mask != bits]
+        if not unsatisfied:
+            return 0
+        costs = [cheapest.get(k, math.inf) for k in unsatisfied]
+        # Each unsatisfied key needs its own producer, and one action covers at most
+        # max_keys_per_action keys, so both bounds are admissible.
+        batches = math.ceil(len(unsatisfied) / max_keys_per_action)
+        return max(max(costs), batches * min(costs))
+    return h
+
+
+def distance_heuristic(goal_state, available_actions, layout):
+    """Walking-distance lower bound to the nearest station where an unsatisfied goal key can be produced.
+
+    Distances come from calculate_move_cost: WorldState.navigation's table lookups, or Manhattan.
+    """
+    stations = {}
+    for key, value in goal_state.items():
+        positions = set()
+        for action in available_actions:
+            if not action.produces(key, value):
+                continue
+            if key == 'agent_position':
+                positions.add(value)
+            elif 'agent_position' in action.preconditions:
+                positions.add(action.preconditions['agent_position'])
+            else:
+                # Producible from anywhere, so this key never forces a move
+                positions = None
+                break
+        if positions:
+            stations[key] = frozenset(positions)
+
+    # Multi-hop routes are only bounded by the direct distance if no move ever gets cheaper
+    moves = [a for a in available_actions if a.kind == MOVE]
+    exact = all(m['adjustment'] >= 0 for a in moves for m in a.cost_modifiers)
+
+    station_fields = [(layout.field(key, goal_state[key]), positions) for key, positions in stations.items()]
+    if not station_fields:
+        return lambda state_code: 0
+    distances = {}  # (position, positions) -> bound, positions repeat across states
+
+    def h(state_code):
+        position = layout.get(state_code, 'agent_position')
+        best = 0
+        for (mask, bits), positions in station_fields:
+            if state_code & mask == bits or position in positions:
+                continue
+            bound = distances.get((position, positions))
+            if bound is None:
+                bound = min(calculate_move_cost(position, p) for p in positions) if exact else 1
+                distances[(position, positions)] = bound
+            best = max(best, bound)
+        return best
+    return h
+
+
+def max_heuristic(goal_state, available_actions, layout):
+    """The larger of the goal-count and distance bounds (still admissible)."""
+    goal_count = goal_count_heuristic(goal_state, available_actions, layout)
+    distance = distance_heuristic(goal_state, available_actions, layout)
+    return lambda state_code: max(goal_count(state_code), distance(state_code))
+
+
+HEURISTICS = {
+    'zero': zero_heuristic,
+    'goal_count': goal_count_heuristic,
+    'distance': distance_heuristic,
+    'max': max_heuristic,
+}
+
+
+def resolve_heuristic(heuristic, goal_state, available_actions, layout):
+    """
+    Turns the planner's heuristic argument into a h(state_code) callable.
+
+    Args:
+        heuristic: None (uniform-cost), a name from HEURISTICS, or a callable
+            h(state_dict, goal_state) that must never overestimate the remaining cost.
+            Custom callables receive the decoded state dict.
+    """
+    if heuristic is None:
+        heuristic = 'zero'
+    if isinstance(heuristic, str):
+        if heuristic not in HEURISTICS:
+            raise ValueError(f"Unknown heuristic '{heuristic}'. Choose from: {', '.join(HEURISTICS)}")
+        return HEURISTICS[heuristic](goal_state, available_actions, layout)
+    return lambda state_code: heuristic(layout.decode(state_code), goal_state)
@@ -0,0 +1,164 @@
+from Actions import Action, MOVE
+
+class MacroAction(Action):
+    """
+    A learned sequence of primitive actions, planned as a single edge.
+
+    Its preconditions are the sequence's regressed preconditions plus the start values of
+    every key a step's cost depends on (the position before a move, modifier conditions), so
+    wherever it applies its base_cost is exactly the cost of its steps. Adding it to the
+    action set therefore never changes the optimal plan cost. Agent.execute_action replaces
+    it with its primitive steps when the agent reaches it.
+    """
+
+    def __init__(self, name, steps, **action_fields):
+        super().__init__(name=name, **action_fields)
+        self.steps = steps  # [(primitive Action, step cost)]
+
+
+def _at_least(op, amount):
+    """Numeric condition as (direction, bound): ('>=', x) or ('<=', x), for integer keys."""
+    if op == '>':
+        return '>=', amount + 1
+    if op == '<':
+        return '<=', amount - 1
+    return op, amount
+
+
+def compose(name, steps, world_state_dict, agent_state_dict):
+    """
+    Folds steps (primitive Actions), executed from the given states, into one MacroAction.
+
+    Returns None if the steps do not run from these states, or if the macro cannot be exact:
+    e.g. a cost or equality precondition reads a numeric key that earlier steps changed.
+    """
+    world, agent = dict(world_state_dict), dict(agent_state_dict)
+    preconditions = {}
+    numeric_preconditions = {}
+    written = set()         # Keys earlier steps set to a fixed value
+    offsets = {}            # Numeric key -> (delta so far, True if a local delta)
+    start = {**world_state_dict, **agent_state_dict}
+    costed = []
+
+    def fix(key):
+        """Pins key to its start value unless an earlier step already decided it."""
+        if key in written or key in preconditions:
+            return True
+        if key in offsets:
+            return False
+        preconditions[key] = start.get(key)
+        return True
+
+    for action in steps:
+        if not action.check_preconditions(world, agent):
+            return None
+        for key, value in action.preconditions.items():
+            if not fix(key):
+                return None
+        for key, (op, amount) in action.numeric_preconditions.items():
+            if key in written:
+                continue # A step set the value, and the check held on it
+            direction, bound = _at_least(op, amount - offsets.get(key, (0,))[0])
+            previous = numeric_preconditions.get(key)
+            if previous is not None:
+                if previous[0] != direction:
+                    return None # A range on one key does not fit one numeric precondition
+                bound = max(bound, previous[1]) if direction == '>=' else min(bound, previous[1])
+            numeric_preconditions[key] = (direction, bound)
+        if action.kind == MOVE and not fix('agent_position'):
+            return None
+        for modifier in action.cost_modifiers:
+            if not all(fix(key) for key in modifier['condition']):
+                return None
+
+        costed.append((action, action.get_cost({**world, **agent})))
+        agent = action.apply_local_effects(agent)
+        world = action.apply_shared_effects(world)
+        written.update(action.combined_effects())
+        for key in action.combined_effects():
+            offsets.pop(key, None) # Set outright: earlier deltas no longer matter
+        if action.kind == MOVE:
+            written.add('agent_position')
+        for deltas, local in ((action.shared_deltas, False), (action.local_deltas, True)):
+            for key, delta in deltas.items():
+                if key not in written:
+                    offsets[key] = (offsets.get(key, (0,))[0] + delta, local)
+
+    local_keys = set(agent_state_dict) | {k for action in steps for k in action.local_effects}
+    local_keys.add('agent_position')
+    return MacroAction(
+        name, costed,
+        preconditions=preconditions,
+        numeric_preconditions=numeric_preconditions,
+        local_effects={k: agent[k] for k in written if k in local_keys},
+        shared_effects={k: world[k] for k in written if k not in local_keys},
+        local_deltas={k: delta for k, (delta, local) in offsets.items() if local and delta},
+        shared_deltas={k: delta for k, (delta, local) in offsets.items() if not local and delta},
+        base_cost=sum(cost for _, cost in costed))
+
+
+class MacroLibrary:
+    """
+    Macro-actions learned from the plans agents solve, shared like PlanCache.
+
+    observe() slides a window over every solved plan. A window of 2..max_length steps that
+    ends with a task (not a move) and recurs min_uses times from the same context (same
+    composed preconditions) becomes a MacroAction. Planning with actions() then reaches those
+    states in one edge, so plans get shallower. The optimal cost is unchanged. A* still has
+    to close every state cheaper than the optimum, so node counts barely change: the gain is
+    in plan depth, not search effort.
+    """
+
+    def __init__(self, min_uses=3, max_length=4, max_macros=16):
+        self.min_uses = min_uses
+        self.max_length = max_length
+        self.max_macros = max_macros
+        self.uses = {}              # (step names, context) -> times seen
+        self.macros = {}            # name -> MacroAction
+        self._actions = ()
+        self.observed = 0
+
+    def actions(self):
+        """The learned macros, as a tuple that only changes when a macro is added."""
+        return self._actions
+
+    def primitives(self, plan, by_name):
+        """The primitive Actions behind [(action_name, cost), ...], macros expanded."""
+        steps = []
+        for action_name, _ in plan:
+            action = self.macros.get(action_name) or by_name[action_name]
+            if isinstance(action, MacroAction):
+                steps.extend(step for step, _ in action.steps)
+            else:
+                steps.append(action)
+        return steps
+
+    def observe(self, world_state_dict, agent_state_dict, plan, available_actions):
+        """Counts the windows of a plan solved from these states, adding macros that recur."""
+        self.observed += 1
+        steps = self.primitives(plan, {action.name: action for action in available_actions})
+        states = [(dict(world_state_dict), dict(agent_state_dict))]
+        for action in steps:
+            world, agent = states[-1]
+            states.append((action.apply_shared_effects(dict(world)), action.apply_local_effects(dict(agent))))
+
+        for first in range(len(steps)):
+            for last in range(first + 2, min(len(steps), first + self.max_length) + 1):
+                window = steps[first:last]
+                if window[-1].kind == MOVE:
+                    continue
+                names = ' -> '.join(action.name for action in window)
+                macro = compose(names, window, *states[first])
+                if macro is None:
+                    continue
+                context = (tuple(sorted(macro.preconditions.items(), key=str)),
+                           tuple(sorted(macro.numeric_preconditions.items())))
+                key = (names, context)
+                uses = self.uses[key] = self.uses.get(key, 0) + 1
+                if uses == self.min_uses and len(self.macros) < self.max_macros:
+                    macro.name = f"Macro {len(self.macros) + 1}: {names}"
+                    self.macros[macro.name] = macro
+                    self._actions = tuple(self.macros.values())
+
+    def stats(self):
+        return {'plans_observed': self.observed, 'candidates': len(self.uses), 'macros': len(self.macros)}
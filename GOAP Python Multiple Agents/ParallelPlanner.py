@@ -0,0 +1,137 @@
+from concurrent.futures import ProcessPoolExecutor
+from Heuristics import resolve_heuristic
+from Planner import _search
+from SearchStats import SearchStats
+from StateEncoding import build_layout
+from CompiledActions import CompiledActionSet
+from WorldState import WorldState
+
+# Per-process state of a pool worker: the compiled action set is shipped once, by the initializer
+_WORKER = {}
+
+def _init_worker(compiled, heuristic, navigation):
+    _WORKER['compiled'] = compiled
+    _WORKER['heuristic'] = heuristic
+    WorldState.navigation = navigation # Maps the parent's cached distance table
+
+
+def _plan_task(task):
+    """Runs one search inside a worker. The start state arrives as a packed int."""
+    start_code, goal_mask, goal_bits, goal_state, collect_stats = task
+    compiled = _WORKER['compiled']
+    h = resolve_heuristic(_WORKER['heuristic'], goal_state, compiled.actions, compiled.layout)
+    # Hooks cannot cross the process boundary, so workers send plain counters back
+    stats = SearchStats() if collect_stats else None
+    # One action set serves every agent's goal, so only move chains are pruned (not actions)
+    cost, plan = _search(compiled, start_code, goal_mask, goal_bits, h, stats=stats,
+                         unreachable=lambda: not compiled.may_reach(start_code, goal_state), prune_moves=True)
+    return cost, plan, stats
+
+
+class ParallelPlanner:
+    """
+    Plans for several agents at once in a concurrent.futures process pool.
+
+    plan_actions is a pure function of (world snapshot, agent state, goal, actions), so the
+    searches of every agent that needs to replan in a tick can run side by side. The compiled
+    action set (layout included) is sent to each worker once, when the pool starts; each task
+    then only carries the packed start state and the goal. Identical (state, goal) requests are
+    searched once, and results come back in request order, so runs stay reproducible.
+    """
+
+    def __init__(self, available_actions, max_workers=None, heuristic='max'):
+        """
+        Args:
+            max_workers (int): Pool size (None = one per CPU). 0 plans in-process, with the
+                same compiled search, as a baseline for measuring speedups.
+        """
+        self.available_actions = list(available_actions)
+        self.max_workers = max_workers
+        self.heuristic = heuristic
+        self.compiled = None
+        self.pool = None
+        self._shipped_size = None
+
+    def _layout_size(self):
+        return sum(len(values) for values in self.compiled.layout.values)
+
+    def _compile(self, world_state_dict, requests):
+        """(Re)compiles one layout covering the world, every agent state and every goal."""
+        goals = {}
+        for _, goal_state in requests:
+            goals.update(goal_state)
+        # Every agent's keys and values: agents need not share one key set
+        layout = build_layout([world_state_dict] + [agent_state for agent_state, _ in requests], self.available_actions, goals)
+        self.compiled = CompiledActionSet(self.available_actions, layout)
+        self._restart_pool()
+
+    def _restart_pool(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+        if self.max_workers != 0:
+            self.pool = ProcessPoolExecutor(self.max_workers, initializer=_init_worker,
+                                            initargs=(self.compiled, self.heuristic, WorldState.navigation))
+        self._shipped_size = self._layout_size()
+
+    def _encode(self, world_state_dict, requests, collect_stats):
+        tasks = []
+        for agent_state_dict, goal_state in requests:
+            start_code = self.compiled.layout.encode(world_state_dict, agent_state_dict)
+            goal_mask, goal_bits = self.compiled.layout.encode_condition(goal_state)
+            tasks.append((start_code, goal_mask, goal_bits, goal_state, collect_stats))
+        return tasks
+
+    def plan_all(self, world_state_dict, requests, stats=None):
+        """
+        Args:
+            requests (list): [(agent_state_dict, goal_state), ...] all planned against world_state_dict.
+            stats (list): Optional SearchStats per request. A search shared by identical requests
+                is counted once, in the first of them.
+
+        Returns:
+            [(total_cost, plan), ...] in request order, like calling plan_actions for each.
+        """
+        if not requests:
+            return []
+        if self.compiled is None:
+            self._compile(world_state_dict, requests)
+        collect_stats = stats is not None
+        try:
+            tasks = self._encode(world_state_dict, requests, collect_stats)
+        except (KeyError, ValueError, TypeError):
+            # A new state key, or a value that no longer fits its slot
+            self._compile(world_state_dict, requests)
+            tasks = self._encode(world_state_dict, requests, collect_stats)
+        if self._layout_size() != self._shipped_size:
+            # New values were interned here, so the workers' copy of the layout is out of date
+            self._restart_pool()
+
+        # Search each distinct (start state, goal) once
+        unique = {}
+        for task in tasks:
+            unique.setdefault(task[:3], task)
+        keys = list(unique)
+        if self.pool is None:
+            _init_worker(self.compiled, self.heuristic, WorldState.navigation)
+            results = list(map(_plan_task, unique.values()))
+        else:
+            workers = self.pool._max_workers
+            chunksize = max(1, len(keys) // (workers * 4))
+            results = list(self.pool.map(_plan_task, unique.values(), chunksize=chunksize))
+        by_key = dict(zip(keys, results))
+
+        answers = []
+        counted = set()
+        for i, task in enumerate(tasks):
+            cost, plan, search_stats = by_key[task[:3]]
+            answers.append((cost, list(plan) if plan is not None else None))
+            if collect_stats and task[:3] not in counted:
+                counted.add(task[:3])
+                stats[i].merge(search_stats)
+        return answers
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
@@ -0,0 +1,93 @@
+from collections import OrderedDict
+from Planner import plan_actions, PlanResult, FOUND, UNREACHABLE
+from CompiledActions import compile_problem
+
+class PlanCache:
+    """
+    Bounded LRU memo of plan_actions results, shared by every agent in a FactoryManager.
+
+    Entries are keyed by (action-set version, packed start state, goal). Because every cached
+    plan is optimal, the tail of a cached plan is also optimal from each state it passes
+    through, so a lookup from any state on a cached plan returns the remaining suffix.
+    Weighted searches (weight > 1) bypass the cache, and searches stopped by a budget are
+    not remembered, so only optimal plans and proven failures are ever stored.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()    # entry key -> (cost, plan, path of state codes)
+        self.suffixes = {}              # (version, state_code, goal) -> (entry key, plan position)
+        self.hits = 0
+        self.suffix_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def plan(self, world_state_dict, agent_state_dict, goal_state, available_actions, **planner_options):
+        """Drop-in replacement for plan_actions that answers from the cache when it can."""
+        if planner_options.get('weight', 1) != 1:
+            return plan_actions(world_state_dict, agent_state_dict, goal_state, available_actions, **planner_options)
+        compiled, start_code, _, _ = compile_problem([world_state_dict, agent_state_dict], available_actions, goal_state)
+        goal = tuple(sorted(goal_state.items(), key=str))
+        key = (compiled.version, start_code, goal)
+
+        # 1. Exact hit on a start state solved before
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            cost, plan, _ = entry
+            return PlanResult(cost, (list(plan) if plan is not None else None), FOUND if plan is not None else UNREACHABLE)
+
+        # 2. The start state lies on a cached plan: return the remaining tail
+        suffix = self.suffixes.get(key)
+        if suffix is not None:
+            entry_key, position = suffix
+            self.entries.move_to_end(entry_key)
+            self.suffix_hits += 1
+            _, plan, _ = self.entries[entry_key]
+            tail = plan[position:]
+            return PlanResult(sum(step_cost for _, step_cost in tail), tail)
+
+        # 3. Miss: plan from scratch and remember every state the plan passes through
+        self.misses += 1
+        result = plan_actions(world_state_dict, agent_state_dict, goal_state, available_actions, **planner_options)
+        if result.reason not in (FOUND, UNREACHABLE):
+            return result # Stopped by a budget: nothing was proved
+        cost, plan = result
+        path = [start_code]
+        for action_name, _ in plan or []:
+            path.append(compiled.apply(compiled.by_name[action_name], path[-1]))
+        self._store(key, (cost, list(plan) if plan is not None else None, path))
+        return result
+
+    def _store(self, key, entry):
+        self.entries[key] = entry
+        version, _, goal = key
+        # The final state already satisfies the goal, so only index the states before it
+        for position, state_code in enumerate(entry[2][1:-1], start=1):
+            self.suffixes.setdefault((version, state_code, goal), (key, position))
+        while len(self.entries) > self.maxsize:
+            self._evict()
+
+    def _evict(self):
+        old_key, (_, _, path) = self.entries.popitem(last=False)
+        version, _, goal = old_key
+        for state_code in path[1:-1]:
+            suffix_key = (version, state_code, goal)
+            if self.suffixes.get(suffix_key, (None,))[0] == old_key:
+                del self.suffixes[suffix_key]
+        self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.suffixes.clear()
+
+    def stats(self):
+        """Counters for monitoring: hits, suffix_hits, misses, evictions and current size."""
+        return {
+            'hits': self.hits,
+            'suffix_hits': self.suffix_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self.entries),
+        }
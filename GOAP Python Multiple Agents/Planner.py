@@ -1,56 +1,733 @@
 import heapq
+import math
+import time
+from array import array
+from Heuristics import resolve_heuristic
+from CompiledActions import compile_problem
+from Pruning import prune_actions
 
-def plan_actions(world_state_dict, agent_state_dict, goal_state, available_actions):
-    
-    # 1. Capture the initial keys to use for splitting the state later
-    initial_world_keys = set(world_state_dict.keys())
-    initial_agent_keys = set(agent_state_dict.keys())
+# Why a search stopped (PlanResult.reason)
+FOUND = 'found'
+UNREACHABLE = 'unreachable'         # Proved: no plan exists from this state
+EXPANSION_LIMIT = 'max_expansions'  # Gave up: max_expansions reached first
+DEADLINE = 'deadline'               # Gave up: deadline passed first
+MEMORY_LIMIT = 'max_nodes'          # Gave up: the plan needs more nodes in memory than allowed (BoundedSearch.py)
 
-    def get_state_tuple(world_state, agent_state):
-        """Converts the combined state into a stable, hashable tuple."""
-        combined = {**world_state, **agent_state} 
-        return tuple(sorted(combined.items()))
+# Searches still running after this many expansions run a relaxed reachability test once, so
+# unreachable goals fail without exhausting the state space (cheap searches never pay for it)
+RELAXED_CHECK_AFTER = 256
 
-    start_state_tuple = get_state_tuple(world_state_dict, agent_state_dict)
-    
-    pq = [(0, start_state_tuple, [])]
-    visited = {start_state_tuple: 0}
+
+class PlanResult(tuple):
+    """
+    The (total_cost, plan) pair returned by the planners, so `cost, plan = plan_actions(...)`
+    keeps working, with details of the search as attributes:
+
+        reason: FOUND, UNREACHABLE, EXPANSION_LIMIT or DEADLINE.
+        bound: the plan costs at most bound x the optimal cost (1.0 = optimal, inf = no plan).
+        expansions: nodes expanded.
+    """
+
+    def __new__(cls, cost, plan, reason=FOUND, bound=1.0, expansions=0):
+        result = super().__new__(cls, (cost, plan))
+        result.reason = reason
+        result.bound = bound if cost is not None else math.inf
+        result.expansions = expansions
+        return result
+
+    def __reduce__(self):
+        return PlanResult, (self[0], self[1], self.reason, self.bound, self.expansions)
+
+    @property
+    def cost(self):
+        return self[0]
+
+    @property
+    def plan(self):
+        return self[1]
+
+
+def plan_actions(world_state_dict, agent_state_dict, goal_state, available_actions, heuristic=None, report_savings=False,
+                 stats=None, weight=1.0, max_expansions=None, deadline=None, prune=True):
+    """
+    A* search over the combined (world + agent) state for the cheapest plan reaching goal_state.
+
+    Args:
+        heuristic: None for uniform-cost search, a name from Heuristics.HEURISTICS
+            ('goal_count', 'distance', 'max') or a callable h(combined_state_dict, goal_state).
+            It must never overestimate the remaining cost, otherwise plans may not be optimal.
+        report_savings (bool): Also run the uniform-cost search and print how many
+            node expansions the heuristic saved.
+        stats (SearchStats): Optional object that collects counters, timings and hooks for this search.
+        weight (float): Weighted A* (f = g + weight * h). Values above 1 expand fewer nodes and
+            return a plan costing at most weight x the optimum.
+        max_expansions (int): Stop with reason EXPANSION_LIMIT after expanding this many nodes.
+        deadline (float): Stop with reason DEADLINE once time.perf_counter() passes this value.
+        prune (bool): Search only the actions relevant to the goal and never chain two moves
+            (see Pruning.py). Neither changes the optimal cost; False searches every action.
+
+    Returns:
+        PlanResult: (total_cost, [(action_name, action_cost), ...]), or (None, None) if no plan
+        was found, with .reason, .bound and .expansions.
+    """
+    if weight < 1:
+        raise ValueError("weight must be at least 1 (1 = optimal A*)")
+    if prune:
+        available_actions = prune_actions(available_actions, goal_state)
+    # Compile the combined state layout and the actions over it (cached between searches).
+    # The layout remembers which keys are world keys and which are agent keys.
+    compiled, start_code, goal_mask, goal_bits = compile_problem(
+        [world_state_dict, agent_state_dict], available_actions, goal_state)
+    h = resolve_heuristic(heuristic, goal_state, available_actions, compiled.layout)
+    if weight != 1:
+        base_h = h
+        h = lambda state_code: weight * base_h(state_code)
+    result = _search(compiled, start_code, goal_mask, goal_bits, h, stats=stats,
+                     max_expansions=max_expansions, deadline=deadline,
+                     unreachable=lambda: not compiled.may_reach(start_code, goal_state), prune_moves=prune)
+    if result.cost is not None:
+        result.bound = weight
+
+    if report_savings:
+        baseline = _search(compiled, start_code, goal_mask, goal_bits, lambda state_code: 0).expansions
+        print(f"[Planner] Heuristic expanded {result.expansions} nodes vs {baseline} for uniform-cost search "
+              f"(saved {baseline - result.expansions}).")
+
+    return result
+
+
+class SearchTree:
+    """
+    Array-backed search nodes.
+
+    A node is an index into parallel arrays holding its packed state, g-cost, parent node and
+    the index of the action that produced it. Plans are rebuilt by walking parent pointers
+    once the goal is popped, instead of copying a plan list on every heap push.
+    """
+    __slots__ = ('states', 'costs', 'parents', 'actions')
+
+    def __init__(self):
+        self.states = []
+        self.costs = []
+        self.parents = array('l')
+        self.actions = array('l')
+
+    def add(self, state_code, cost, parent=-1, action_index=-1):
+        self.states.append(state_code)
+        self.costs.append(cost)
+        self.parents.append(parent)
+        self.actions.append(action_index)
+        return len(self.states) - 1
+
+    def plan(self, node, available_actions):
+        """Rebuilds [(action_name, action_cost), ...] leading to node."""
+        plan = []
+        while self.parents[node] != -1:
+            parent = self.parents[node]
+            plan.append((available_actions[self.actions[node]].name, self.costs[node] - self.costs[parent]))
+            node = parent
+        plan.reverse()
+        return plan
+
+
+def _search(compiled, start_code, goal_mask, goal_bits, h, successors=None, closed=None, stats=None,
+            max_expansions=None, deadline=None, unreachable=None, prune_moves=False):
+    """
+    The A* loop shared by plan_actions and IncrementalPlanner.
+
+    Args:
+        successors: Optional replacement for compiled.successors(state_code, skip_moves) (e.g. a memoised one).
+        closed (dict): Optional dict filled with {state_code: g_cost} for every expanded state.
+        stats (SearchStats): Optional; runs the instrumented copy of this loop instead.
+        max_expansions, deadline: Optional budgets (see plan_actions).
+        unreachable: Optional callable, run once after RELAXED_CHECK_AFTER expansions; True
+            proves the goal unreachable and ends the search.
+        prune_moves (bool): Don't expand moves from a state reached by a move, when the
+            compiled actions' moves compose (see Pruning.moves_compose).
+
+    Returns:
+        PlanResult with bound 1.0 (callers that weight h set the bound).
+    """
+    if stats is not None:
+        return _search_instrumented(compiled, start_code, goal_mask, goal_bits, h, successors, closed, stats,
+                                    max_expansions, deadline, unreachable, prune_moves)
+
+    # States are packed into ints by a compiled StateLayout (see StateEncoding.py) and actions
+    # are compiled to bit masks over it (see CompiledActions.py): hashing, visited lookups,
+    # precondition checks and effects are all int operations.
+    tree = SearchTree()
+    root = tree.add(start_code, 0)
+    start_estimate = h(start_code)
+    if start_estimate == math.inf:
+        return PlanResult(None, None, UNREACHABLE) # Fails fast: the heuristic proves it
+
+    # Priority Queue: (f_cost = g_cost + h, g_cost, node)
+    pq = [(start_estimate, 0, root)]
+
+    # Visited states: {state_code: total_cost}
+    visited = {start_code: 0}
+    expansions = 0
+    if successors is None:
+        successors = compiled.successors
+    clock = time.perf_counter
+    check_at = RELAXED_CHECK_AFTER if unreachable is not None else -1
+    # A state reached by a move only needs its task successors (the root was not reached by one)
+    is_move = compiled.is_move if prune_moves and compiled.moves_compose else None
+
+    while pq:
+        _, cost, node = heapq.heappop(pq)
+        current_code = tree.states[node]
+
+        # Skip stale entries: a cheaper path to this state was pushed after this one
+        if cost > visited[current_code]:
+            continue
+
+        # 1. Goal Check (then the budgets, checked once per expansion)
+        if current_code & goal_mask == goal_bits:
+            return PlanResult(cost, tree.plan(node, compiled.actions), FOUND, 1.0, expansions)
+        if expansions == max_expansions:
+            return PlanResult(None, None, EXPANSION_LIMIT, expansions=expansions)
+        if deadline is not None and clock() > deadline:
+            return PlanResult(None, None, DEADLINE, expansions=expansions)
+        if expansions == check_at and unreachable():
+            return PlanResult(None, None, UNREACHABLE, expansions=expansions)
+        expansions += 1
+        if closed is not None:
+            closed[current_code] = cost
+
+        # 2. Explore the applicable actions (found through the precondition index)
+        skip_moves = is_move is not None and node != root and is_move[tree.actions[node]]
+        for action_index, next_code, action_cost in successors(current_code, skip_moves):
+            new_cost = cost + action_cost
+
+            # 3. A* check (If this is a cheaper path to an already visited state)
+            if next_code not in visited or new_cost < visited[next_code]:
+                estimate = h(next_code)
+                if estimate == math.inf:
+                    continue # The goal cannot be reached from here
+                visited[next_code] = new_cost
+                child = tree.add(next_code, new_cost, node, action_index)
+                heapq.heappush(pq, (new_cost + estimate, new_cost, child))
+
+    return PlanResult(None, None, UNREACHABLE, expansions=expansions)
+
+
+def _timed_successors(compiled, timings):
+    """compiled.successors, with the precondition, effect and cost steps timed separately."""
+    clock = time.perf_counter
+    applicable, apply, action_cost = compiled.applicable, compiled.apply, compiled.cost
+
+    def successors(state_code, skip_moves=False):
+        started = clock()
+        indices = applicable(state_code, skip_moves)
+        checked = clock()
+        next_codes = [apply(i, state_code) for i in indices]
+        applied = clock()
+        result = []
+        for i, next_code in zip(indices, next_codes):
+            if next_code is not None:
+                cost = action_cost(i, state_code)
+                if cost != math.inf:
+                    result.append((i, next_code, cost))
+        timings['preconditions'] += checked - started
+        timings['effects'] += applied - checked
+        timings['costs'] += clock() - applied
+        return result
+    return successors
+
+
+def _search_instrumented(compiled, start_code, goal_mask, goal_bits, h, successors, closed, stats,
+                         max_expansions, deadline, unreachable, prune_moves):
+    """
+    _search with SearchStats counters, timings and hooks.
+
+    Kept as a separate copy of the loop so that searches without stats pay nothing for it.
+    Same expansion order and results as _search.
+    """
+    clock = time.perf_counter
+    started = clock()
+    timings = stats.timings
+    on_expand, on_goal = stats.on_expand, stats.on_goal
+    if successors is None:
+        successors = _timed_successors(compiled, timings)
+        timed_separately = True
+    else:
+        timed_separately = False
+
+    tree = SearchTree()
+    root = tree.add(start_code, 0)
+    start_estimate = h(start_code)
+    pq = [(start_estimate, 0, root)] if start_estimate != math.inf else []
+    visited = {start_code: 0}
+    expansions = generated = duplicates = stale = 0
+    peak_heap = len(pq)
+    result = PlanResult(None, None, UNREACHABLE)
+    check_at = RELAXED_CHECK_AFTER if unreachable is not None else -1
+    is_move = compiled.is_move if prune_moves and compiled.moves_compose else None
 
     while pq:
-        cost, current_tuple, plan = heapq.heappop(pq)
-        
-        # 2. Convert the tuple back to a combined dictionary
-        # THIS LINE is where the error happens if current_tuple is corrupted.
-        current_combined = dict(current_tuple) 
-
-        # 3. GOAL CHECK: Check against the full combined state
-        # The goal_state is a dict, so .items() works here.
-        if all(current_combined.get(k) == v for k, v in goal_state.items()):
-            return cost, plan
-
-        # 4. DEFENSIVE STATE SPLITTING: Use initial keys to split the combined state
-        current_world = {k: current_combined[k] for k in current_combined if k in initial_world_keys}
-        current_agent = {k: current_combined[k] for k in current_combined if k in initial_agent_keys}
-
-        # 5. Explore Actions
-        for action in available_actions:
-            # Pass the split states to the precondition check
-            if action.check_preconditions(current_world, current_agent):
-                
-                # Apply effects to copies of the world and agent states
-                next_world = action.apply_shared_effects(current_world.copy())
-                next_agent = action.apply_local_effects(current_agent.copy())
-                
-                action_cost = action.get_cost(current_agent)
-                new_cost = cost + action_cost
-                
-                # Generate the next hashable tuple
-                next_tuple = get_state_tuple(next_world, next_agent)
-
-                # A* check
-                if next_tuple not in visited or new_cost < visited[next_tuple]:
-                    visited[next_tuple] = new_cost
-                    new_plan = plan + [(action.name, action_cost)]
-                    heapq.heappush(pq, (new_cost, next_tuple, new_plan))
-    
-    return None, None
\ No newline at end of file
+        tick = clock()
+        _, cost, node = heapq.heappop(pq)
+        timings['queue'] += clock() - tick
+        current_code = tree.states[node]
+
+        if cost > visited[current_code]:
+            stale += 1
+            continue
+
+        if current_code & goal_mask == goal_bits:
+            result = PlanResult(cost, tree.plan(node, compiled.actions), FOUND)
+            if on_goal is not None:
+                on_goal(*result)
+            break
+        if expansions == max_expansions:
+            result = PlanResult(None, None, EXPANSION_LIMIT)
+            break
+        if deadline is not None and clock() > deadline:
+            result = PlanResult(None, None, DEADLINE)
+            break
+        if expansions == check_at and unreachable():
+            break
+        expansions += 1
+        if closed is not None:
+            closed[current_code] = cost
+        if on_expand is not None:
+            on_expand(current_code, cost)
+
+        tick = clock()
+        children = successors(current_code, is_move is not None and node != root and is_move[tree.actions[node]])
+        if not timed_separately:
+            timings['successors'] += clock() - tick
+
+        for action_index, next_code, action_cost in children:
+            generated += 1
+            new_cost = cost + action_cost
+
+            tick = clock()
+            known = visited.get(next_code)
+            timings['hashing'] += clock() - tick
+            if known is not None and new_cost >= known:
+                duplicates += 1
+                continue
+
+            tick = clock()
+            estimate = h(next_code)
+            timings['heuristic'] += clock() - tick
+            if estimate == math.inf:
+                continue
+
+            tick = clock()
+            visited[next_code] = new_cost
+            timings['hashing'] += clock() - tick
+            child = tree.add(next_code, new_cost, node, action_index)
+            tick = clock()
+            heapq.heappush(pq, (new_cost + estimate, new_cost, child))
+            timings['queue'] += clock() - tick
+        if len(pq) > peak_heap:
+            peak_heap = len(pq)
+
+    stats.searches += 1
+    stats.failures += result.reason == UNREACHABLE
+    stats.budget_stops += result.reason in (EXPANSION_LIMIT, DEADLINE)
+    stats.expanded += expansions
+    stats.generated += generated
+    stats.duplicates += duplicates
+    stats.stale += stale
+    stats.peak_heap = max(stats.peak_heap, peak_heap)
+    stats.peak_visited = max(stats.peak_visited, len(visited))
+    stats.wall_time += clock() - started
+    result.expansions = expansions
+    return result
+
+
+class IncrementalPlanner:
+    """
+    Per-agent planner that repairs its previous searches instead of replanning from scratch.
+
+    Actions only read the packed state, so when other agents change world keys the action graph
+    itself is unchanged; only the agent's start state moves. What a finished search learned
+    therefore stays valid for later replans towards the same goal:
+
+    * Successor lists of expanded states are memoised, so re-expanding them skips precondition,
+      effect and cost evaluation.
+    * Every expanded state s gets a learned goal-distance bound max(h(s), C* - g(s)) (as in
+      Adaptive A*), or infinity when the search proved the goal unreachable from it. The bound
+      stays admissible, so later searches stay optimal and expand far fewer nodes.
+    * States on the last optimal plan return their remaining tail directly.
+
+    Everything is dropped when the goal or the compiled action set changes.
+    """
+
+    def __init__(self, heuristic='max', reuse=True, max_states=200000, prune=True):
+        """
+        Args:
+            reuse (bool): False turns every call into a full replan (benchmark baseline).
+            max_states (int): Memoised states kept before the memory is reset.
+            prune (bool): Goal-relevance and move pruning, as in plan_actions.
+        """
+        self.heuristic = heuristic
+        self.prune = prune
+        self.reuse = reuse
+        self.max_states = max_states
+        self.key = None
+        self.successor_cache = {}
+        self.learned = {}           # state_code -> admissible goal-distance bound
+        self.tails = {}             # state_code -> index into last_plan
+        self.last_plan = []
+        self.searches = 0
+        self.expansions = 0
+        self.reused_tails = 0
+
+    def reset(self):
+        self.successor_cache.clear()
+        self.learned.clear()
+        self.tails.clear()
+        self.last_plan = []
+
+    def plan(self, world_state_dict, agent_state_dict, goal_state, available_actions, stats=None,
+             max_expansions=None, deadline=None):
+        """Same contract as plan_actions: returns a PlanResult (always optimal when a plan is found)."""
+        if self.prune:
+            available_actions = prune_actions(available_actions, goal_state)
+        compiled, start_code, goal_mask, goal_bits = compile_problem(
+            [world_state_dict, agent_state_dict], available_actions, goal_state)
+        key = (compiled.version, tuple(sorted(goal_state.items(), key=str)))
+        if key != self.key or not self.reuse or len(self.successor_cache) > self.max_states:
+            self.reset()
+            self.key = key
+
+        # 1. Still on the last optimal plan (e.g. the world change did not touch it)
+        position = self.tails.get(start_code)
+        if position is not None:
+            self.reused_tails += 1
+            tail = self.last_plan[position:]
+            return PlanResult(sum(step_cost for _, step_cost in tail), tail)
+
+        learned = self.learned
+        if learned.get(start_code) == math.inf:
+            return PlanResult(None, None, UNREACHABLE) # Proved unreachable by an earlier search
+
+        # 2. Search with the learned bounds and memoised successors
+        base_h = resolve_heuristic(self.heuristic, goal_state, available_actions, compiled.layout)
+        h = lambda state_code: max(base_h(state_code), learned.get(state_code, 0))
+        successor_cache = self.successor_cache
+
+        def successors(state_code, skip_moves=False):
+            result = successor_cache.get((state_code, skip_moves))
+            if result is None:
+                result = successor_cache[state_code, skip_moves] = compiled.successors(state_code, skip_moves)
+            return result
+
+        closed = {}
+        result = _search(compiled, start_code, goal_mask, goal_bits, h, successors, closed, stats,
+                         max_expansions, deadline, lambda: not compiled.may_reach(start_code, goal_state), self.prune)
+        self.searches += 1
+        self.expansions += result.expansions
+        cost, plan = result
+
+        # 3. Learn from the finished search (a search stopped by a budget proves nothing)
+        if cost is None:
+            if result.reason == UNREACHABLE:
+                for state_code in closed:
+                    learned[state_code] = math.inf
+            return result
+        for state_code, g_cost in closed.items():
+            if cost - g_cost > learned.get(state_code, 0):
+                learned[state_code] = cost - g_cost
+        self.last_plan = list(plan)
+        self.tails.clear()
+        state_code = start_code
+        for i, (action_name, _) in enumerate(plan):
+            self.tails[state_code] = i
+            state_code = compiled.apply(compiled.by_name[action_name], state_code)
+        return result
+
+
+class AnytimePlanner:
+    """
+    Anytime Repairing A* (ARA*) for agents with a per-tick planning budget.
+
+    The first call runs a weighted A* with the largest weight, which finds some plan quickly.
+    Each later call for the same problem (same compiled actions, start state and goal) picks
+    up where the last one stopped: it finishes the interrupted pass, then lowers the weight
+    and repairs the search instead of restarting it (states improved after expansion wait in
+    an INCONS list and rejoin OPEN for the next pass). Every call returns the best plan so
+    far, with .bound = the proven suboptimality factor; at weight 1 it is optimal (bound 1.0).
+    """
+
+    def __init__(self, heuristic='max', weights=(3.0, 2.0, 1.5, 1.25, 1.0), prune=True):
+        """
+        Args:
+            weights (tuple): Decreasing heuristic weights of the passes, ending at 1.0.
+            prune (bool): Goal-relevance and move pruning, as in plan_actions.
+        """
+        if list(weights) != sorted(weights, reverse=True) or weights[-1] != 1.0:
+            raise ValueError("weights must decrease and end with 1.0")
+        self.heuristic = heuristic
+        self.weights = tuple(weights)
+        self.prune = prune
+        self.key = None
+        self.passes = 0             # Completed passes over every problem
+        self.expansions = 0
+
+    def _reset(self, compiled, start_code, goal_state, goal_mask, goal_bits, available_actions):
+        self.compiled = compiled
+        self.goal_mask, self.goal_bits = goal_mask, goal_bits
+        self.h = resolve_heuristic(self.heuristic, goal_state, available_actions, compiled.layout)
+        self.step = 0
+        self.weight = self.weights[0]
+        self.g = {start_code: 0}
+        self.parents = {start_code: None}   # state -> (parent state, action index, action cost)
+        self.closed = set()
+        self.incons = set()
+        self.best_code = start_code if start_code & goal_mask == goal_bits else None
+        self.best_cost = 0 if self.best_code is not None else math.inf
+        self.open = []
+        start_estimate = self.h(start_code)
+        # Anytime searches are the long ones, so the relaxed reachability test is always worth it
+        if self.best_code is None and start_estimate != math.inf and compiled.may_reach(start_code, goal_state):
+            self.open.append((self.weight * start_estimate, 0, start_code))
+        self.done = self.best_code is not None or not self.open
+
+    def plan(self, world_state_dict, agent_state_dict, goal_state, available_actions, max_expansions=None, deadline=None):
+        """
+        Improves the plan for this problem within the budget.
+
+        Returns:
+            PlanResult: the best plan so far. reason is FOUND once the search is finished
+            (optimal, or proved unreachable: UNREACHABLE), otherwise the budget that ran out.
+        """
+        if self.prune:
+            available_actions = prune_actions(available_actions, goal_state)
+        compiled, start_code, goal_mask, goal_bits = compile_problem(
+            [world_state_dict, agent_state_dict], available_actions, goal_state)
+        key = (compiled.version, start_code, goal_mask, goal_bits)
+        if key != self.key:
+            self.key = key
+            self._reset(compiled, start_code, goal_state, goal_mask, goal_bits, available_actions)
+
+        expansions = 0
+        reason = None
+        clock = time.perf_counter
+        while not self.done:
+            # One pass of weighted A*: stop once nothing in OPEN can beat the incumbent
+            stopped = self._improve(max_expansions - expansions if max_expansions is not None else None,
+                                    deadline, clock)
+            expansions += stopped[1]
+            if stopped[0] is not None:
+                reason = stopped[0]
+                break
+            self.passes += 1
+            self._next_pass()
+        self.expansions += expansions
+
+        if self.best_code is None:
+            return PlanResult(None, None, reason or UNREACHABLE, expansions=expansions)
+        plan = self._plan()
+        return PlanResult(sum(step_cost for _, step_cost in plan), plan, reason or FOUND, self._bound(), expansions)
+
+    def _improve(self, max_expansions, deadline, clock):
+        """Runs the current pass. Returns (budget reason or None when the pass finished, expansions)."""
+        open_list, g, closed, h, compiled = self.open, self.g, self.closed, self.h, self.compiled
+        weight, goal_mask, goal_bits = self.weight, self.goal_mask, self.goal_bits
+        parents = self.parents
+        is_move = compiled.is_move if self.prune and compiled.moves_compose else None
+        expansions = 0
+        while open_list:
+            f_cost, g_cost, state_code = open_list[0]
+            if g_cost > g[state_code] or state_code in closed:
+                heapq.heappop(open_list) # Stale entry
+                continue
+            if f_cost >= self.best_cost:
+                break
+            if expansions == max_expansions:
+                return EXPANSION_LIMIT, expansions
+            if deadline is not None and clock() > deadline:
+                return DEADLINE, expansions
+            heapq.heappop(open_list)
+            closed.add(state_code)
+            expansions += 1
+            # Skip moves after a move, judged by the state's current best parent
+            parent = parents[state_code]
+            skip_moves = is_move is not None and parent is not None and is_move[parent[1]]
+            for action_index, next_code, action_cost in compiled.successors(state_code, skip_moves):
+                new_cost = g_cost + action_cost
+                if new_cost >= g.get(next_code, math.inf):
+                    continue
+                g[next_code] = new_cost
+                parents[next_code] = (state_code, action_index, action_cost)
+                if next_code & goal_mask == goal_bits:
+                    if new_cost < self.best_cost:
+                        self.best_cost, self.best_code = new_cost, next_code
+                    continue
+                estimate = h(next_code)
+                if estimate == math.inf:
+                    continue
+                if next_code in closed and weight > 1:
+                    self.incons.add(next_code)  # Repaired in the next pass
+                else:
+                    closed.discard(next_code)   # The last (optimal) pass reopens like plain A*
+                    heapq.heappush(open_list, (new_cost + weight * estimate, new_cost, next_code))
+        return None, expansions
+
+    def _next_pass(self):
+        """Lowers the weight and moves INCONS back into OPEN, re-keyed for the new weight."""
+        if self.step == len(self.weights) - 1:
+            self.done = True
+            return
+        self.step += 1
+        self.weight = weight = self.weights[self.step]
+        g, h = self.g, self.h
+        closed = self.closed
+        states = {s for _, g_cost, s in self.open if g_cost == g[s] and s not in closed}
+        states.update(self.incons)
+        self.open = [(g[s] + weight * h(s), g[s], s) for s in states]
+        heapq.heapify(self.open)
+        self.incons = set()
+        self.closed = set()
+
+    def _bound(self):
+        """
+        The ARA* suboptimality bound: min(weight of the last finished pass,
+        incumbent / lowest g + h still in OPEN or INCONS).
+        """
+        if self.done:
+            return 1.0
+        finished = self.weights[self.step - 1] if self.step else math.inf
+        g, h = self.g, self.h
+        lower = min((g[s] + h(s) for _, g_cost, s in self.open if g_cost == g[s] and s not in self.closed),
+                    default=math.inf)
+        lower = min([lower] + [g[s] + h(s) for s in self.incons])
+        if lower <= 0:
+            return finished
+        return max(1.0, min(finished, self.best_cost / lower))
+
+    def _plan(self):
+        plan = []
+        state_code = self.best_code
+        while self.parents[state_code] is not None:
+            state_code, action_index, action_cost = self.parents[state_code]
+            plan.append((self.compiled.actions[action_index].name, action_cost))
+        plan.reverse()
+        return plan
+
+
+def plan_many(world_state_dict, agent_state_dict, goals, available_actions, heuristic=None, stats=None,
+              max_expansions=None, deadline=None, prune=True):
+    """
+    Optimal plans from one start state to each of several goals, in a single A* search.
+
+    h is the minimum of the goals' heuristics over the goals still open, so it stays admissible
+    for every one of them, and each goal is settled (optimally) the first time a state that
+    satisfies it is popped. Settling a goal can only raise h, so queued f values are refreshed
+    lazily when they are popped. The search stops once every goal is settled or ruled out, or
+    a budget runs out.
+
+    Args:
+        goals (list): Goal dicts, e.g. one per order a dispatcher considers.
+        heuristic: As for plan_actions. The default uniform-cost search is usually fastest:
+            the minimum over many goals prunes little, and costs one call per goal and state.
+        stats, max_expansions, deadline, prune: As for plan_actions (stats gets the counters,
+            not the timings or hooks).
+
+    Returns:
+        list: One PlanResult per goal, in order. Goals not settled when a budget ran out get
+        that budget as their reason; .expansions is the shared search's total.
+    """
+    started = time.perf_counter()
+    unique = list({tuple(sorted(goal.items(), key=str)): None for goal in goals})
+    goal_states = [dict(items) for items in unique]
+    if prune:
+        kept = set()
+        for goal_state in goal_states:
+            kept.update(prune_actions(available_actions, goal_state))
+        available_actions = [action for action in available_actions if action in kept]
+    merged = {}
+    for goal_state in goal_states:
+        for key, value in goal_state.items():
+            merged.setdefault(key, value)
+    compiled, start_code, _, _ = compile_problem([world_state_dict, agent_state_dict], available_actions, merged)
+    layout = compiled.layout
+
+    results = [None] * len(goal_states)
+    targets = []    # (result index, goal mask, goal bits, h) of the goals still open
+    for i, goal_state in enumerate(goal_states):
+        condition = layout.encode_condition(goal_state)
+        if condition is None:
+            results[i] = PlanResult(None, None, UNREACHABLE)
+        else:
+            targets.append((i,) + condition + (resolve_heuristic(heuristic, goal_state, available_actions, layout),))
+
+    def h(state_code):
+        return min((target[3](state_code) for target in targets), default=0)
+
+    tree = SearchTree()
+    root = tree.add(start_code, 0)
+    start_estimate = h(start_code)
+    pq = [(start_estimate, 0, root)] if start_estimate != math.inf else []
+    visited = {start_code: 0}
+    expansions = generated = 0
+    clock = time.perf_counter
+    is_move = compiled.is_move if prune and compiled.moves_compose else None
+    reason = UNREACHABLE
+
+    while pq and targets:
+        f_cost, cost, node = heapq.heappop(pq)
+        current_code = tree.states[node]
+        if cost > visited[current_code]:
+            continue
+
+        # Settle every open goal this state satisfies
+        reached = [target for target in targets if current_code & target[1] == target[2]]
+        if reached:
+            plan = tree.plan(node, compiled.actions)
+            for target in reached:
+                results[target[0]] = PlanResult(cost, plan, FOUND)
+            targets = [target for target in targets if target not in reached]
+            if not targets:
+                break
+
+        # Lazy f refresh: goals settled since this entry was pushed may have raised h
+        estimate = h(current_code)
+        if cost + estimate > f_cost:
+            if estimate != math.inf:
+                heapq.heappush(pq, (cost + estimate, cost, node))
+            continue
+
+        if expansions == max_expansions:
+            reason = EXPANSION_LIMIT
+            break
+        if deadline is not None and clock() > deadline:
+            reason = DEADLINE
+            break
+        if expansions == RELAXED_CHECK_AFTER:
+            for target in targets:
+                if not compiled.may_reach(start_code, goal_states[target[0]]):
+                    results[target[0]] = PlanResult(None, None, UNREACHABLE)
+            targets = [target for target in targets if results[target[0]] is None]
+        expansions += 1
+
+        skip_moves = is_move is not None and node != root and is_move[tree.actions[node]]
+        for action_index, next_code, action_cost in compiled.successors(current_code, skip_moves):
+            generated += 1
+            new_cost = cost + action_cost
+            if next_code not in visited or new_cost < visited[next_code]:
+                estimate = h(next_code)
+                if estimate == math.inf:
+                    continue
+                visited[next_code] = new_cost
+                child = tree.add(next_code, new_cost, node, action_index)
+                heapq.heappush(pq, (new_cost + estimate, new_cost, child))
+
+    for target in targets:
+        results[target[0]] = PlanResult(None, None, reason)
+    for result in results:
+        result.expansions = expansions
+    if stats is not None:
+        stats.searches += 1
+        stats.expanded += expansions
+        stats.generated += generated
+        stats.peak_visited = max(stats.peak_visited, len(visited))
+        stats.wall_time += clock() - started
+    by_goal = dict(zip(unique, results))
+    return [by_goal[tuple(sorted(goal.items(), key=str))] for goal in goals]
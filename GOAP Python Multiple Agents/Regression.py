@@ -0,0 +1,568 @@
+import heapq
+import itertools
+import math
+import operator
+import time
+from Actions import MOVE, NUMERIC_OPERATORS
+from WorldState import calculate_move_cost
+from CompiledActions import compile_problem
+from Heuristics import resolve_heuristic
+from Planner import PlanResult, SearchTree, plan_actions, FOUND, UNREACHABLE, EXPANSION_LIMIT, DEADLINE
+from Pruning import prune_actions
+
+# Backward (regression) search. Goals are a few keys while states keep growing, so instead of
+# expanding whole states forward from the start, this search starts from the goal as a partial
+# state and regresses it through the actions that could have achieved it, until the start state
+# satisfies the partial state. A partial state is (mask, bits, checks) over the same packed
+# layout as the forward search; checks hold the numeric conditions, which masks cannot express.
+
+CHECK_OPERATORS = {**NUMERIC_OPERATORS, '==': operator.eq}
+
+
+class _Regressor:
+    """One compiled action, split into what regression needs."""
+    __slots__ = ('index', 'is_move', 'target_bits', 'effect_mask', 'effect_bits', 'effect_facts',
+                 'numeric_effects', 'deltas', 'pre_mask', 'pre_bits', 'pre_facts', 'checks',
+                 'modifiers', 'min_cost', 'move_reduction')
+
+
+class RegressionSpace:
+    """
+    The regression graph of one compiled problem.
+
+    Action costs depend on the state they are applied in, which a partial state only partly
+    fixes. Regressing through an action therefore also fixes every key its cost depends on
+    (its modifier conditions, and agent_position for moves), branching over the values the
+    key can take. Keys no action changes keep their start value and never branch. With every
+    cost fixed, a partial state's g is the exact cost of its suffix from any state satisfying
+    it, so duplicate partial states can be merged like forward states.
+    """
+
+    def __init__(self, compiled, start_code):
+        layout = compiled.layout
+        self.compiled = compiled
+        self.layout = layout
+        self.start_code = start_code
+        self.slots = [(slot, layout.masks[slot], layout.offsets[slot])
+                      for slot in range(len(layout.keys)) if not layout.numeric[slot]]
+        self.position_slot = layout.slot.get('agent_position')
+        self.position_mask = layout.masks[self.position_slot] if self.position_slot is not None else 0
+
+        self.regressors = [self._regressor(i, action) for i, action in enumerate(compiled.actions)]
+        changed = set()
+        for r in self.regressors:
+            changed.update(slot for slot, _ in r.effect_facts)
+        self.supported = True
+        for r in self.regressors:
+            kept = []
+            for mask, bits, slots, numeric in r.modifiers:
+                if numeric & changed:
+                    self.supported = False # A numeric cost condition would need infinite branching
+                kept.append((mask, bits, [s for s in slots if s in changed]))
+            r.modifiers = kept
+
+        # Values a changing key can hold: its start value or any value an action sets it to
+        self.domains = {}
+        for slot in changed:
+            codes = {(start_code & layout.masks[slot]) >> layout.offsets[slot]}
+            codes.update(code for r in self.regressors for s, code in r.effect_facts if s == slot)
+            self.domains[slot] = [(layout.masks[slot], code << layout.offsets[slot]) for code in sorted(codes)]
+
+        # Numeric keys that only ever fall (or only ever rise) are bounded by their start value
+        self.bounds = {}
+        for slot in range(len(layout.keys)):
+            if not layout.numeric[slot]:
+                continue
+            start = layout.value(slot, (start_code & layout.masks[slot]) >> layout.offsets[slot])
+            if start is None or any(slot in r.numeric_effects for r in self.regressors):
+                continue
+            deltas = [r.deltas[slot] for r in self.regressors if slot in r.deltas]
+            self.bounds[slot] = (start if not any(d < 0 for d in deltas) else -math.inf,
+                                 start if not any(d > 0 for d in deltas) else math.inf)
+        self.fact_costs = self._relaxed_costs()
+        self._h_cache = {}
+
+    def _regressor(self, i, action):
+        layout = self.layout
+        compiled = self.compiled.compiled[i]
+        r = _Regressor()
+        r.index = i
+        r.is_move = action.kind == MOVE
+        r.target_bits = compiled.target_bits
+        r.effect_mask = r.effect_bits = 0
+        r.effect_facts = []
+        r.numeric_effects = {}
+        effects = dict(action.combined_effects())
+        if r.is_move and action.target_pos is not None:
+            effects['agent_position'] = action.target_pos
+        for key, value in effects.items():
+            slot = layout.slot[key]
+            if layout.numeric[slot]:
+                r.numeric_effects[slot] = value
+                continue
+            mask, bits = layout.field(key, value)
+            r.effect_mask |= mask
+            r.effect_bits |= bits
+            r.effect_facts.append((slot, bits >> layout.offsets[slot]))
+        r.deltas = {}
+        for key, delta in {**getattr(action, 'shared_deltas', {}), **getattr(action, 'local_deltas', {})}.items():
+            r.deltas[layout.slot[key]] = delta
+        r.pre_mask = r.pre_bits = 0
+        r.pre_facts = []
+        checks = []
+        for key, value in action.preconditions.items():
+            slot = layout.slot[key]
+            if layout.numeric[slot]:
+                checks.append((slot, '==', value, False))
+                continue
+            mask, bits = layout.field(key, value)
+            r.pre_mask |= mask
+            r.pre_bits |= bits
+            r.pre_facts.append((slot, bits >> layout.offsets[slot]))
+        for key, (op, amount) in getattr(action, 'numeric_preconditions', {}).items():
+            checks.append((layout.slot[key], op, amount, False))
+        r.checks = tuple(checks)
+        r.modifiers = []    # (mask, bits, condition slots, numeric condition slots)
+        for modifier in action.cost_modifiers:
+            mask, bits = layout.encode_condition(modifier['condition'])
+            slots = {layout.slot[key] for key in modifier['condition']}
+            r.modifiers.append((mask, bits, [s for s in slots if not layout.numeric[s]],
+                                {s for s in slots if layout.numeric[s]}))
+        r.min_cost = action.min_cost()
+        r.move_reduction = sum(m['adjustment'] for m in action.cost_modifiers if m['adjustment'] < 0)
+        return r
+
+    # --- Heuristic ---
+    def _relaxed_costs(self):
+        """
+        h_max costs of every (slot, code) fact from the start state under the delete relaxation
+        (numeric conditions ignored), as in HSPr: computed once, then h(partial) is a lookup.
+        """
+        layout = self.layout
+        costs = {(slot, (self.start_code & mask) >> offset): 0 for slot, mask, offset in self.slots}
+        changed = True
+        while changed:
+            changed = False
+            for r in self.regressors:
+                pre = max((costs.get(fact, math.inf) for fact in r.pre_facts), default=0)
+                if pre == math.inf:
+                    continue
+                if r.is_move and self.position_slot is not None:
+                    target = self.compiled.actions[r.index].target_pos
+                    target_code = r.target_bits >> layout.offsets[self.position_slot]
+                    cost = math.inf
+                    for (slot, code), source_cost in list(costs.items()):
+                        source = layout.value(slot, code) if slot == self.position_slot else None
+                        if source is None or code == target_code:
+                            continue
+                        step = max(1, calculate_move_cost(source, target) + r.move_reduction)
+                        cost = min(cost, max(pre, source_cost) + step)
+                else:
+                    cost = pre + r.min_cost
+                for fact in r.effect_facts:
+                    if cost < costs.get(fact, math.inf):
+                        costs[fact] = cost
+                        changed = True
+        return costs
+
+    def h(self, mask, bits):
+        """Admissible estimate of the cost from the start to any state satisfying (mask, bits)."""
+        key = (mask, bits)
+        estimate = self._h_cache.get(key)
+        if estimate is None:
+            estimate = 0
+            for slot, slot_mask, offset in self.slots:
+                if mask & slot_mask:
+                    estimate = max(estimate, self.fact_costs.get((slot, (bits & slot_mask) >> offset), math.inf))
+            self._h_cache[key] = estimate
+        return estimate
+
+    # --- Regression ---
+    def _dead(self, check):
+        bound = self.bounds.get(check[0])
+        if bound is None:
+            return False
+        _, op, amount, _ = check
+        low, high = bound
+        return not (low <= amount <= high if op == '==' else CHECK_OPERATORS[op](high if op[0] == '>' else low, amount))
+
+    def checks_hold(self, checks, state_code):
+        layout = self.layout
+        for slot, op, amount, absent_as_zero in checks:
+            value = layout.value(slot, (state_code & layout.masks[slot]) >> layout.offsets[slot])
+            if value is None:
+                if not absent_as_zero:
+                    return False
+                value = 0
+            if not CHECK_OPERATORS[op](value, amount):
+                return False
+        return True
+
+    def satisfied_by(self, partial, state_code):
+        mask, bits, checks = partial
+        return state_code & mask == bits and self.checks_hold(checks, state_code)
+
+    def goal(self, goal_state):
+        """The goal as a partial state, or None if it names a value no state can hold."""
+        layout = self.layout
+        mask = bits = 0
+        checks = []
+        for key, value in goal_state.items():
+            if key not in layout.slot:
+                if value is None:
+                    continue
+                return None
+            slot = layout.slot[key]
+            if layout.numeric[slot]:
+                checks.append((slot, '==', value, False))
+                continue
+            field_mask, field_bits = layout.field(key, value)
+            mask |= field_mask
+            bits |= field_bits
+        return mask, bits, tuple(sorted(checks))
+
+    def predecessors(self, partial, skip_moves=False):
+        """[(action_index, partial state before the action, action cost), ...]"""
+        result = []
+        for r in self.regressors:
+            if not (skip_moves and r.is_move):
+                result.extend((r.index, before, cost) for before, cost in self.regress(partial, r))
+        return result
+
+    def regress(self, partial, r):
+        mask, bits, checks = partial
+        touched = mask & r.effect_mask
+        if (bits ^ r.effect_bits) & touched:
+            return # The action would overwrite part of the partial state with another value
+        relevant = touched != 0
+        before = []
+        for check in checks:
+            slot = check[0]
+            if slot in r.numeric_effects:
+                if not CHECK_OPERATORS[check[1]](r.numeric_effects[slot], check[2]):
+                    return
+                relevant = True
+            elif slot in r.deltas:
+                # Absent keys count as 0 for deltas, and the key exists afterwards
+                before.append((slot, check[1], check[2] - r.deltas[slot], True))
+                relevant = True
+            else:
+                before.append(check)
+        if not relevant:
+            return
+        mask &= ~r.effect_mask
+        bits &= mask
+        if (bits ^ r.pre_bits) & mask & r.pre_mask:
+            return
+        mask |= r.pre_mask
+        bits |= r.pre_bits
+        before.extend(r.checks)
+        if any(self._dead(check) for check in before):
+            return
+        checks = tuple(sorted(set(before)))
+
+        # Fix the keys the cost depends on (only the modifiers not already decided by the mask)
+        open_slots = set()
+        for condition_mask, condition_bits, slots in r.modifiers:
+            if not (bits ^ condition_bits) & mask & condition_mask:
+                open_slots.update(s for s in slots if not mask & self.layout.masks[s])
+        if r.is_move and not mask & self.position_mask:
+            open_slots.add(self.position_slot)
+        start_code = self.start_code
+        for assignment in itertools.product(*(self.domains[slot] for slot in sorted(open_slots))):
+            fixed_mask, fixed_bits = mask, bits
+            for slot_mask, slot_bits in assignment:
+                fixed_mask |= slot_mask
+                fixed_bits |= slot_bits
+            if r.target_bits is not None and fixed_bits & self.position_mask == r.target_bits:
+                continue # A move never targets the spot it starts from
+            cost = self.compiled.cost(r.index, (start_code & ~fixed_mask) | fixed_bits)
+            if cost == math.inf:
+                continue # No walkway between the two stations
+            yield (fixed_mask, fixed_bits, checks), cost
+
+
+class _BackwardTree:
+    """Backward search nodes: partial state, suffix cost, the node it was regressed from and the action."""
+    __slots__ = ('partials', 'costs', 'children', 'actions')
+
+    def __init__(self):
+        self.partials = []
+        self.costs = []
+        self.children = []
+        self.actions = []
+
+    def add(self, partial, cost, child=-1, action_index=-1):
+        self.partials.append(partial)
+        self.costs.append(cost)
+        self.children.append(child)
+        self.actions.append(action_index)
+        return len(self.partials) - 1
+
+    def suffix(self, node):
+        """Action indices from node's partial state to the goal, in execution order."""
+        indices = []
+        while self.children[node] != -1:
+            indices.append(self.actions[node])
+            node = self.children[node]
+        return indices
+
+
+def _simulate(compiled, start_code, indices, goal_mask, goal_bits):
+    """Replays a plan forward; returns [(action_name, action_cost), ...] or None if it fails."""
+    plan = []
+    state_code = start_code
+    for i in indices:
+        if i not in compiled.applicable(state_code):
+            return None
+        cost = compiled.cost(i, state_code)
+        state_code = compiled.apply(i, state_code)
+        if state_code is None:
+            return None
+        plan.append((compiled.actions[i].name, cost))
+    return plan if state_code & goal_mask == goal_bits else None
+
+
+def plan_backward(world_state_dict, agent_state_dict, goal_state, available_actions, heuristic='max',
+                  bidirectional=False, stats=None, max_expansions=None, deadline=None, prune=True):
+    """
+    Regression search from the goal (same contract and optimal costs as plan_actions).
+
+    Narrow goals in wide states regress through a handful of achievers, where forward search
+    branches over every applicable action. Every plan found is replayed forward from the start
+    before it is returned.
+
+    Args:
+        heuristic: Forward heuristic of the bidirectional mode (see plan_actions). The backward
+            direction always uses h_max costs computed from the start state.
+        bidirectional (bool): Expand forward and backward frontiers alternately (the smaller one
+            first) and stop once the best meeting point is proven optimal.
+        stats (SearchStats): Optional; collects the counters (not the timings or on_expand).
+        max_expansions, deadline, prune: As for plan_actions (expansions count both directions).
+
+    Returns:
+        PlanResult. Action sets whose costs depend on changing numeric keys fall back to plan_actions.
+    """
+    if prune:
+        available_actions = prune_actions(available_actions, goal_state)
+    compiled, start_code, goal_mask, goal_bits = compile_problem(
+        [world_state_dict, agent_state_dict], available_actions, goal_state)
+    space = RegressionSpace(compiled, start_code)
+    if not space.supported:
+        return plan_actions(world_state_dict, agent_state_dict, goal_state, available_actions, heuristic=heuristic,
+                            stats=stats, max_expansions=max_expansions, deadline=deadline, prune=prune)
+    started = time.perf_counter()
+    goal = space.goal(goal_state)
+    if goal is None:
+        result = PlanResult(None, None, UNREACHABLE)
+    elif bidirectional:
+        h = resolve_heuristic(heuristic, goal_state, available_actions, compiled.layout)
+        result = _bidirectional(space, goal, goal_mask, goal_bits, h, stats, max_expansions, deadline, prune)
+    else:
+        result = _backward(space, goal, goal_mask, goal_bits, stats, max_expansions, deadline, prune)
+    if stats is not None:
+        stats.searches += 1
+        stats.failures += result.reason == UNREACHABLE
+        stats.budget_stops += result.reason in (EXPANSION_LIMIT, DEADLINE)
+        stats.wall_time += time.perf_counter() - started
+        if result.cost is not None and stats.on_goal is not None:
+            stats.on_goal(*result)
+    return result
+
+
+def _record(stats, expanded, generated, duplicates, peak_heap, peak_visited):
+    if stats is not None:
+        stats.expanded += expanded
+        stats.generated += generated
+        stats.duplicates += duplicates
+        stats.peak_heap = max(stats.peak_heap, peak_heap)
+        stats.peak_visited = max(stats.peak_visited, peak_visited)
+
+
+def _backward(space, goal, goal_mask, goal_bits, stats, max_expansions, deadline, prune):
+    """A* over partial states, from the goal back to the start."""
+    compiled, start_code = space.compiled, space.start_code
+    is_move = compiled.is_move if prune and compiled.moves_compose else None
+    tree = _BackwardTree()
+    root = tree.add(goal, 0)
+    start_estimate = space.h(goal[0], goal[1])
+    pq = [(start_estimate, 0, root)] if start_estimate != math.inf else []
+    visited = {goal: 0}
+    expansions = generated = duplicates = 0
+    peak_heap = len(pq)
+    clock = time.perf_counter
+    result = PlanResult(None, None, UNREACHABLE)
+
+    while pq:
+        _, cost, node = heapq.heappop(pq)
+        partial = tree.partials[node]
+        if cost > visited[partial]:
+            continue
+        if space.satisfied_by(partial, start_code):
+            plan = _simulate(compiled, start_code, tree.suffix(node), goal_mask, goal_bits)
+            if plan is not None:
+                result = PlanResult(cost, plan, FOUND)
+                break
+            continue # Cannot happen with exact suffix costs, but never return an invalid plan
+        if expansions == max_expansions:
+            result = PlanResult(None, None, EXPANSION_LIMIT)
+            break
+        if deadline is not None and clock() > deadline:
+            result = PlanResult(None, None, DEADLINE)
+            break
+        expansions += 1
+
+        skip_moves = is_move is not None and node != root and is_move[tree.actions[node]]
+        for action_index, before, action_cost in space.predecessors(partial, skip_moves):
+            generated += 1
+            new_cost = cost + action_cost
+            if new_cost >= visited.get(before, math.inf):
+                duplicates += 1
+                continue
+            estimate = space.h(before[0], before[1])
+            if estimate == math.inf:
+                continue
+            visited[before] = new_cost
+            heapq.heappush(pq, (new_cost + estimate, new_cost, tree.add(before, new_cost, node, action_index)))
+        peak_heap = max(peak_heap, len(pq))
+
+    _record(stats, expansions, generated, duplicates, peak_heap, len(visited))
+    result.expansions = expansions
+    return result
+
+
+def _bidirectional(space, goal, goal_mask, goal_bits, h, stats, max_expansions, deadline, prune):
+    """
+    Forward A* and backward A* at once. A forward state meets a backward partial state when it
+    satisfies it; the best meeting cost mu is a plan, optimal once max(min f forward, min f
+    backward) >= mu.
+    """
+    compiled, start_code = space.compiled, space.start_code
+    is_move = compiled.is_move if prune and compiled.moves_compose else None
+    best = [math.inf, -1, -1]   # mu, forward node, backward node
+
+    forward = SearchTree()
+    forward_root = forward.add(start_code, 0)
+    forward_visited = {start_code: 0}
+    forward_nodes = {start_code: forward_root}
+    start_estimate = h(start_code)
+    forward_pq = [(start_estimate, 0, forward_root)] if start_estimate != math.inf else []
+
+    backward = _BackwardTree()
+    backward_root = backward.add(goal, 0)
+    backward_visited = {goal: 0}
+    goal_estimate = space.h(goal[0], goal[1])
+    backward_pq = [(goal_estimate, 0, backward_root)] if goal_estimate != math.inf else []
+
+    # Meeting indexes: backward nodes by (mask, bits), and forward states by their bits under
+    # every mask the backward side has used so far
+    backward_index = {}
+    forward_index = {}
+
+    def forward_met(state_code, cost, node):
+        for mask, table in backward_index.items():
+            for b in table.get(state_code & mask, ()):
+                total = cost + backward.costs[b]
+                if total < best[0] and space.checks_hold(backward.partials[b][2], state_code):
+                    best[:] = total, node, b
+
+    def add_forward(state_code, cost, node):
+        if state_code not in forward_visited:
+            for mask, table in forward_index.items():
+                table.setdefault(state_code & mask, []).append(state_code)
+        forward_visited[state_code] = cost
+        forward_nodes[state_code] = node
+        forward_met(state_code, cost, node)
+
+    def add_backward(partial, cost, node):
+        mask, bits, checks = partial
+        backward_visited[partial] = cost
+        table = forward_index.get(mask)
+        if table is None:
+            table = forward_index[mask] = {}
+            for state_code in forward_visited:
+                table.setdefault(state_code & mask, []).append(state_code)
+        backward_index.setdefault(mask, {}).setdefault(bits, []).append(node)
+        for state_code in table.get(bits, ()):
+            total = forward_visited[state_code] + cost
+            if total < best[0] and space.checks_hold(checks, state_code):
+                best[:] = total, forward_nodes[state_code], node
+
+    add_backward(goal, 0, backward_root)
+    expansions = generated = duplicates = 0
+    peak_heap = len(forward_pq) + len(backward_pq)
+    clock = time.perf_counter
+    reason = None
+
+    while forward_pq and backward_pq:
+        # Drop stale tops so both minimum f values are real
+        if forward_pq[0][1] > forward_visited[forward.states[forward_pq[0][2]]]:
+            heapq.heappop(forward_pq)
+            continue
+        if backward_pq[0][1] > backward_visited[backward.partials[backward_pq[0][2]]]:
+            heapq.heappop(backward_pq)
+            continue
+        if max(forward_pq[0][0], backward_pq[0][0]) >= best[0]:
+            break
+        if expansions == max_expansions:
+            reason = EXPANSION_LIMIT
+            break
+        if deadline is not None and clock() > deadline:
+            reason = DEADLINE
+            break
+        expansions += 1
+
+        if len(forward_pq) <= len(backward_pq):
+            _, cost, node = heapq.heappop(forward_pq)
+            state_code = forward.states[node]
+            skip_moves = is_move is not None and node != forward_root and is_move[forward.actions[node]]
+            for action_index, next_code, action_cost in compiled.successors(state_code, skip_moves):
+                generated += 1
+                new_cost = cost + action_cost
+                if new_cost >= forward_visited.get(next_code, math.inf):
+                    duplicates += 1
+                    continue
+                estimate = h(next_code)
+                if estimate == math.inf:
+                    continue
+                child = forward.add(next_code, new_cost, node, action_index)
+                add_forward(next_code, new_cost, child)
+                heapq.heappush(forward_pq, (new_cost + estimate, new_cost, child))
+        else:
+            _, cost, node = heapq.heappop(backward_pq)
+            skip_moves = is_move is not None and node != backward_root and is_move[backward.actions[node]]
+            for action_index, before, action_cost in space.predecessors(backward.partials[node], skip_moves):
+                generated += 1
+                new_cost = cost + action_cost
+                if new_cost >= backward_visited.get(before, math.inf):
+                    duplicates += 1
+                    continue
+                estimate = space.h(before[0], before[1])
+                if estimate == math.inf:
+                    continue
+                child = backward.add(before, new_cost, node, action_index)
+                add_backward(before, new_cost, child)
+                heapq.heappush(backward_pq, (new_cost + estimate, new_cost, child))
+        peak_heap = max(peak_heap, len(forward_pq) + len(backward_pq))
+
+    _record(stats, expansions, generated, duplicates, peak_heap, len(forward_visited) + len(backward_visited))
+    if reason is not None:
+        return PlanResult(None, None, reason, expansions=expansions)
+    # Either mu is proven optimal, or one side ran out and every meeting with it has been seen
+    if best[0] == math.inf:
+        return PlanResult(None, None, UNREACHABLE, expansions=expansions)
+    prefix = [forward.actions[n] for n in _forward_path(forward, best[1])]
+    plan = _simulate(compiled, start_code, prefix + backward.suffix(best[2]), goal_mask, goal_bits)
+    if plan is None:
+        return PlanResult(None, None, UNREACHABLE, expansions=expansions)
+    return PlanResult(best[0], plan, FOUND, expansions=expansions)
+
+
+def _forward_path(tree, node):
+    """Forward nodes from the root (exclusive) to node, in order."""
+    path = []
+    while tree.parents[node] != -1:
+        path.append(node)
+        node = tree.parents[node]
+    path.reverse()
+    return path
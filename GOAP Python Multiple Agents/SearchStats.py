@@ -0,0 +1,65 @@
+class SearchStats:
+    """
+    Optional instrumentation for planner searches: plan_actions(..., stats=SearchStats()).
+
+    One object can be handed to any number of searches; counters add up and peaks keep the
+    maximum, so the same object works per search, per agent or per tick (see merge()).
+    Without a stats object the planner runs its uninstrumented loop and pays nothing.
+
+    Hooks: on_expand(state_code, g_cost) is called for every expanded state and
+    on_goal(total_cost, plan) when a plan is found. Use layout.describe(state_code) to read a state.
+
+    Timings are wall-clock seconds. Each timed step is a few dict or int operations, so the
+    perf_counter calls around them add noticeable overhead: compare splits with each other,
+    not with an uninstrumented run.
+    """
+    TIMINGS = ('preconditions', 'effects', 'costs', 'successors', 'hashing', 'heuristic', 'queue')
+    __slots__ = ('searches', 'failures', 'budget_stops', 'expanded', 'generated', 'duplicates', 'stale', 'evicted',
+                 'peak_heap', 'peak_visited', 'wall_time', 'timings', 'on_expand', 'on_goal')
+
+    def __init__(self, on_expand=None, on_goal=None):
+        self.searches = 0       # Searches run
+        self.failures = 0       # Searches that proved no plan exists
+        self.budget_stops = 0   # Searches stopped by max_expansions, deadline or max_nodes
+        self.expanded = 0       # States popped and expanded
+        self.generated = 0      # Successors produced by the expanded states
+        self.duplicates = 0     # Successors rejected: state already reached at no greater cost
+        self.stale = 0          # Heap entries skipped because a cheaper path was found later
+        self.evicted = 0        # Nodes dropped by a memory-bounded search (BoundedSearch.py) to stay under its cap
+        self.peak_heap = 0
+        self.peak_visited = 0
+        self.wall_time = 0.0
+        # preconditions / effects / costs: compiled action checks, appliers and cost evaluation
+        # successors: a custom successor function (e.g. IncrementalPlanner's memo), not split further
+        # hashing: visited-dict lookups and inserts; heuristic: h(); queue: heap pushes and pops
+        self.timings = dict.fromkeys(self.TIMINGS, 0.0)
+        self.on_expand = on_expand
+        self.on_goal = on_goal
+
+    def merge(self, other):
+        """Adds another SearchStats (e.g. one search, or one worker's result) into this one."""
+        self.searches += other.searches
+        self.failures += other.failures
+        self.budget_stops += other.budget_stops
+        self.expanded += other.expanded
+        self.generated += other.generated
+        self.duplicates += other.duplicates
+        self.stale += other.stale
+        self.evicted += other.evicted
+        self.peak_heap = max(self.peak_heap, other.peak_heap)
+        self.peak_visited = max(self.peak_visited, other.peak_visited)
+        self.wall_time += other.wall_time
+        for name, seconds in other.timings.items():
+            self.timings[name] += seconds
+        return self
+
+    def as_dict(self):
+        """Plain dict of every counter and timing (hooks left out), e.g. for logging as JSON."""
+        result = {name: getattr(self, name) for name in self.__slots__[:-3]}
+        result.update((f"time_{name}", seconds) for name, seconds in self.timings.items())
+        return result
+
+    def __repr__(self):
+        return (f"SearchStats(searches={self.searches}, expanded={self.expanded}, generated={self.generated}, "
+                f"duplicates={self.duplicates}, stale={self.stale}, peak_heap={self.peak_heap}, "
+                f"peak_visited={self.peak_visited}, wall_time={self.wall_time * 1000:.2f}ms)")
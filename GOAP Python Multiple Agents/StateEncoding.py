@@ -0,0 +1,186 @@
+class StateLayout:
+    """
+    Compiled layout for planner states.
+
+    Every state key gets a fixed slot (bit field) and every value seen for that key is
+    interned to a small int, so a whole state packs into one Python int. Hashing, equality
+    and copying a state are then single int operations instead of sorting dict items.
+    Code 0 of every slot is reserved for "key absent" (dict.get(key) is None).
+
+    Numeric slots (keys read or changed by numeric preconditions/deltas) are not interned:
+    they store the integer itself, offset by NUMERIC_BIAS, so quantities of any size share one
+    slot and a delta is a plain addition on the packed int.
+    """
+
+    # Spare bits per slot so values first seen after compilation (e.g. a new start state) still fit
+    HEADROOM_BITS = 2
+    NUMERIC_BITS = 32
+    NUMERIC_BIAS = 1 << (NUMERIC_BITS - 1)
+
+    def __init__(self, key_values, groups=None, numeric_keys=()):
+        """
+        Args:
+            key_values (dict): {key: iterable of values the key can take}.
+            groups (list): Optional list of key lists (e.g. [world_keys, agent_keys]) used by split().
+            numeric_keys (iterable): Keys stored as integers rather than interned values.
+        """
+        self.keys = sorted(key_values, key=str)
+        self.slot = {key: i for i, key in enumerate(self.keys)}
+        self.values = []    # per slot: code -> value
+        self.codes = []     # per slot: value -> code
+        self.offsets = []
+        self.masks = []     # per slot: bit mask in place (already shifted)
+        self.numeric = []   # per slot: True if the slot stores an integer
+        offset = 0
+        for key in self.keys:
+            values = [None]
+            numeric = key in numeric_keys
+            if not numeric:
+                for value in key_values[key]:
+                    if value not in values:
+                        values.append(value)
+            width = self.NUMERIC_BITS if numeric else len(values).bit_length() + self.HEADROOM_BITS
+            self.numeric.append(numeric)
+            self.values.append(values)
+            self.codes.append({v: code for code, v in enumerate(values)})
+            self.offsets.append(offset)
+            self.masks.append(((1 << width) - 1) << offset)
+            offset += width
+        self.total_bits = offset
+        self.groups = [[self.slot[k] for k in group] for group in groups] if groups else [list(range(len(self.keys)))]
+
+    # --- Encoding ---
+    def intern(self, slot, value):
+        """Returns the small-int code of value in slot, interning it if it is new."""
+        if self.numeric[slot]:
+            if value is None:
+                return 0
+            if not isinstance(value, int) or not -self.NUMERIC_BIAS < value < self.NUMERIC_BIAS:
+                raise ValueError(f"Numeric key '{self.keys[slot]}' cannot hold {value!r}")
+            return value + self.NUMERIC_BIAS
+        codes = self.codes[slot]
+        code = codes.get(value)
+        if code is None:
+            code = len(self.values[slot])
+            if (code << self.offsets[slot]) & ~self.masks[slot]:
+                raise ValueError(f"State layout has no room left for value {value!r} of '{self.keys[slot]}'")
+            codes[value] = code
+            self.values[slot].append(value)
+        return code
+
+    def field(self, key, value):
+        """Returns (mask, bits) that select key == value inside a packed state."""
+        slot = self.slot[key]
+        return self.masks[slot], self.intern(slot, value) << self.offsets[slot]
+
+    def encode(self, *state_dicts):
+        """Packs one or more state dicts (later dicts win, like {**a, **b}) into an int."""
+        code = 0
+        for state_dict in state_dicts:
+            for key, value in state_dict.items():
+                slot = self.slot[key]
+                code = (code & ~self.masks[slot]) | (self.intern(slot, value) << self.offsets[slot])
+        return code
+
+    def encode_condition(self, condition):
+        """Packs a partial state (e.g. a goal) into (mask, bits): code & mask == bits when it holds."""
+        mask = bits = 0
+        for key, value in condition.items():
+            if key not in self.slot:
+                # A key no state can contain only matches None
+                if value is None:
+                    continue
+                return None
+            field_mask, field_bits = self.field(key, value)
+            mask |= field_mask
+            bits |= field_bits
+        return mask, bits
+
+    # --- Decoding ---
+    def value(self, slot, slot_code):
+        """The value behind a slot code (already shifted down)."""
+        if self.numeric[slot]:
+            return slot_code - self.NUMERIC_BIAS if slot_code else None
+        return self.values[slot][slot_code]
+
+    def get(self, code, key):
+        slot = self.slot[key]
+        return self.value(slot, (code & self.masks[slot]) >> self.offsets[slot])
+
+    def _decode_slots(self, code, slots):
+        state = {}
+        for slot in slots:
+            value = self.value(slot, (code & self.masks[slot]) >> self.offsets[slot])
+            if value is not None:
+                state[self.keys[slot]] = value
+        return state
+
+    def decode(self, code):
+        """Unpacks a state int back into a (combined) state dict."""
+        return self._decode_slots(code, range(len(self.keys)))
+
+    def split(self, code):
+        """Unpacks a state int into one dict per group (e.g. (world_state, agent_state))."""
+        return tuple(self._decode_slots(code, group) for group in self.groups)
+
+    def describe(self, code):
+        """Readable form of a packed state, for debugging."""
+        return ', '.join(f"{k}={v!r}" for k, v in self.decode(code).items())
+
+
+def build_layout(state_dicts, available_actions, goal_state=None):
+    """
+    Compiles a StateLayout covering every key and value the states, actions and goal mention.
+
+    Each state dict passed in becomes a group, so split() returns the states in the same order.
+    Keys that only appear in an action's effects join the group of the state they affect.
+    """
+    key_values = {}
+    numeric_keys = set()
+    group_keys = [list(state_dict) for state_dict in state_dicts]
+
+    def add(key, value):
+        key_values.setdefault(key, []).append(value)
+
+    for state_dict in state_dicts:
+        for key, value in state_dict.items():
+            add(key, value)
+    for action in available_actions:
+        for key, value in action.preconditions.items():
+            add(key, value)
+        for modifier in action.cost_modifiers:
+            for key, value in modifier['condition'].items():
+                add(key, value)
+        if action.target_pos is not None:
+            add('agent_position', action.target_pos)
+        for key in getattr(action, 'numeric_preconditions', {}):
+            add(key, None)
+            numeric_keys.add(key)
+        # Single agent actions have one effect dict; multi-agent ones split local/shared
+        effect_groups = [getattr(action, 'effects', None), getattr(action, 'shared_effects', None),
+                         getattr(action, 'local_effects', None)]
+        for group, effects in enumerate(e for e in effect_groups if e is not None):
+            for key, value in effects.items():
+                add(key, value)
+                if not any(key in keys for keys in group_keys):
+                    # Shared effects belong to the first (world) group, local effects to the last
+                    group_keys[0 if group == 0 else -1].append(key)
+        # Numeric deltas make the key numeric; new keys join the state the delta changes
+        for deltas, group in (('shared_deltas', 0), ('local_deltas', -1)):
+            for key in getattr(action, deltas, {}):
+                add(key, None)
+                numeric_keys.add(key)
+                if not any(key in keys for keys in group_keys):
+                    group_keys[group].append(key)
+    for key, value in (goal_state or {}).items():
+        add(key, value)
+    for key in key_values:
+        if not any(key in keys for keys in group_keys):
+            group_keys[0].append(key)
+    # A key present in several states belongs to the last one (like {**world, **agent})
+    groups = []
+    for i, keys in enumerate(group_keys):
+        later = set(k for other in group_keys[i + 1:] for k in other)
+        groups.append([k for k in keys if k not in later])
+    return StateLayout(key_values, groups, numeric_keys)
+
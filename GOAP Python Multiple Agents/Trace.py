@@ -0,0 +1,200 @@
+import argparse
+import json
+
+# Event kinds. Every event is a dict {'t': time, 'e': kind, ...fields}; t is the tick (run_simulation)
+# or the clock (run_event_simulation) it happened at.
+RUN = 'run'             # mode ('ticks' or 'events'), world (shared state), agents ({name: local state})
+TICK = 'tick'           # A lockstep tick starts
+PLAN = 'plan'           # agent, plan ([action names], empty if none was found), cost
+JOINT = 'joint'         # agents (how many were planned together), search (ConflictPlanner.last_search)
+EXPAND = 'expand'       # agent, action: a macro-action is run as its steps
+ACTION = 'action'       # agent, action, cost, shared ({key: new value}), local ({key: new value})
+CONFLICT = 'conflict'   # agent, action: its preconditions failed, so the agent replans
+START = 'start'         # agent, action, until: an action starts (event-driven)
+FINISH = 'finish'       # agent, action: an action completes, and is executed (event-driven)
+BLOCKED = 'blocked'     # agent, action: an action cannot start, so the agent replans (event-driven)
+GOAL = 'goal'           # agent: its goal is met
+STUCK = 'stuck'         # agent: no plan can meet its goal
+BUDGET = 'budget'       # agent, reason: its search ran out of budget, and it retries later
+STATUS = 'status'       # completed, in_progress, stuck: the agents after a tick
+END = 'end'             # outcome ('done' or 'stuck'), steps (ticks) or events (event-driven)
+
+
+class Tracer:
+    """
+    Sends simulation events to sinks: a TraceRecorder file, a ConsoleSink, or any object with
+    record(event) and close().
+
+    Whoever emits holds the Tracer or None, and checks for None first, so a run without
+    tracing builds no events at all.
+    """
+    __slots__ = ('sinks', 'now')
+
+    def __init__(self, sinks):
+        self.sinks = list(sinks)
+        self.now = 0    # Time stamped on every event (set by the simulation)
+
+    def emit(self, kind, **fields):
+        event = {'t': self.now, 'e': kind}
+        event.update(fields)
+        for sink in self.sinks:
+            sink.record(event)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+class TraceRecorder:
+    """
+    Appends events to a JSONL file, one compact JSON object per line, through a write buffer.
+
+    The file is truncated on the first event and closed by close() (at the end of every run);
+    a later run appends to it, so one file can hold several runs, each starting with a RUN event.
+    """
+
+    def __init__(self, path, buffer_size=1 << 16):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.file = None
+        self.opened = False
+        self.encode = json.JSONEncoder(separators=(',', ':')).encode
+
+    def record(self, event):
+        if self.file is None:
+            self.file = open(self.path, 'a' if self.opened else 'w', buffering=self.buffer_size, encoding='utf-8')
+            self.opened = True
+        self.file.write(self.encode(event) + '\n')
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class ConsoleSink:
+    """
+    Prints events as the simulation's status lines (what verbose=True shows).
+
+    It follows the world state from the events, as replay does, for the shared state line
+    printed after every agent's turn in lockstep runs.
+    """
+
+    def __init__(self):
+        self.mode = None
+        self.world = {}
+
+    def record(self, event):
+        kind = event['e']
+        line = None
+        if kind == RUN:
+            self.mode = event['mode']
+            self.world = dict(event['world'])
+            line = ("\n--- Starting Multi-Agent Factory Simulation ---" if self.mode == 'ticks'
+                    else "\n--- Starting Event-Driven Factory Simulation ---")
+        elif kind == TICK:
+            line = f"\n--- Step {event['t']} ---"
+        elif kind == PLAN:
+            line = (f"[{event['agent']}] New Plan: {' -> '.join(event['plan'])}" if event['plan']
+                    else f"[{event['agent']}] No plan found.")
+        elif kind == JOINT:
+            line = f"[CBS] Joint plan for {event['agents']} agents: {event['search']}"
+        elif kind == EXPAND:
+            line = f"[{event['agent']}] Expanding {event['action']}"
+        elif kind == ACTION:
+            self.world.update(event['shared'])
+            line = f"[{event['agent']}] Executed: {event['action']}. Cost: {event['cost']}"
+        elif kind == CONFLICT:
+            line = f"[{event['agent']}] ❌ Plan FAILED: Preconditions not met for {event['action']}. Re-planning..."
+        elif kind == START:
+            line = f"[t={event['t']}] {event['agent']} starts {event['action']} (until t={event['until']})"
+        elif kind == FINISH:
+            line = f"\n[t={event['t']}] {event['agent']} finishes {event['action']}"
+        elif kind == BLOCKED:
+            line = f"[t={event['t']}] {event['agent']} cannot start {event['action']}. Re-planning..."
+        elif kind == GOAL:
+            line = f"\n🎉 GOAL ACCOMPLISHED! {event['agent']} has produced the required item."
+        elif kind == STUCK:
+            line = f"[{event['agent']}] Status: STUCK (No possible plan found to complete goal)."
+        elif kind == BUDGET:
+            line = f"[{event['agent']}] Planning budget exhausted ({event['reason']}). Retrying later."
+        elif kind == STATUS:
+            line = (f"\n[Overall Status] COMPLETED: {event['completed']}, "
+                    f"IN_PROGRESS: {event['in_progress']} ({event['stuck']} stuck)")
+        elif kind == END:
+            if self.mode == 'ticks':
+                line = (f"\n✅ ALL GOALS ACHIEVED: All products manufactured in {event['steps']} steps."
+                        if event['outcome'] == 'done' else f"\n⛔ All remaining agents are STUCK at step {event['steps']}.")
+            else:
+                line = (f"\n✅ ALL GOALS ACHIEVED at t={event['t']} after {event['events']} events."
+                        if event['outcome'] == 'done' else f"\n⛔ All remaining agents are STUCK at t={event['t']}.")
+        if line is not None:
+            print(line)
+        if self.mode == 'ticks' and kind in (ACTION, CONFLICT):
+            world = self.world
+            print(f"  Shared State: Steel={world.get('has_raw_steel')}, Widget={world.get('has_finished_widget')}, "
+                  f"Heavy={world.get('has_heavy_duty_assembly')}")
+
+    def close(self):
+        pass
+
+
+def read_trace(path):
+    """Yields the events of a TraceRecorder file, in order."""
+    with open(path, encoding='utf-8') as trace:
+        for line in trace:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _value(value):
+    return tuple(value) if isinstance(value, list) else value # JSON turned positions into lists
+
+
+def replay(events):
+    """
+    Rebuilds the world-state timeline of a trace without planning: every ACTION event carries
+    the values it wrote, so the states follow from the RUN event's by applying them in order.
+
+    Args:
+        events: Events in order, e.g. read_trace(path) or what a sink recorded.
+
+    Yields:
+        (event, world, agents) after each event: the shared state dict and {name: local state}
+        at that point. They are updated in place by later events; copy them to keep them.
+    """
+    world, agents = {}, {}
+    for event in events:
+        if event['e'] == RUN:
+            world = {key: _value(value) for key, value in event['world'].items()}
+            agents = {name: {key: _value(value) for key, value in state.items()}
+                      for name, state in event['agents'].items()}
+        elif event['e'] == ACTION:
+            for key, value in event['shared'].items():
+                world[key] = _value(value)
+            local = agents[event['agent']]
+            for key, value in event['local'].items():
+                local[key] = _value(value)
+        yield event, world, agents
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prints the world-state timeline of a trace file, without planning.")
+    parser.add_argument('path')
+    parser.add_argument('--keys', nargs='+', help="Only show these shared keys")
+    args = parser.parse_args()
+
+    world = {}
+    for event, world, agents in replay(read_trace(args.path)):
+        if event['e'] == RUN:
+            print(f"t={event['t']} {event['mode']} run, {len(agents)} agents: {world}")
+        elif event['e'] == ACTION:
+            changes = {key: value for key, value in event['shared'].items() if not args.keys or key in args.keys}
+            print(f"t={event['t']} {event['agent']} {event['action']}: {changes}")
+        elif event['e'] in (CONFLICT, BLOCKED, GOAL, STUCK, END):
+            print(f"t={event['t']} {event['e']} {event.get('agent', event.get('outcome'))}")
+    print(f"Final world state: {world}")
+
+
+if __name__ == '__main__':
+    main()
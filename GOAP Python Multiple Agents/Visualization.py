@@ -0,0 +1,93 @@
+import math
+
+OVERLAY = 'overlay'     # Every path on one axes
+GRID = 'grid'           # One small panel per agent (small multiples)
+LEGEND_LIMIT = 12       # Overlays of more paths get no legend (it would hide the floor)
+
+
+def render_paths(filename, paths, locations, layout=OVERLAY, columns=None, title=None, dpi=100):
+    """
+    Draws agents' movement paths over the factory stations straight into an image file.
+
+    Headless: it builds a matplotlib Figure without pyplot, so no window opens, no GUI backend
+    is loaded and nothing blocks, and matplotlib is only imported when this is called.
+
+    The overlay reads paths once, one agent at a time, into one packed (n, 2) array each, and
+    draws them all as one line collection plus one scatter of the stops (the same arrays,
+    joined once), so a run with thousands of agents costs two artists rather than two per
+    agent, and each position is held once. The grid needs the number of agents to lay out its
+    panels, so it keeps the (name, xs, ys) references, not copies.
+
+    Args:
+        filename (str): Image file; its extension picks the format (.png, .svg, .pdf, ...).
+        paths: Iterable of (agent_name, xs, ys), e.g. FactoryManager.agent_paths().
+        locations (dict): {station name: (x, y)} drawn under the paths.
+        layout (str): OVERLAY or GRID.
+        columns (int): Panels per row in a grid (default: about square).
+        title (str): Figure title (default: the number of agents).
+        dpi (int): Resolution of raster formats.
+
+    Returns:
+        int: Number of paths drawn.
+    """
+    if layout not in (OVERLAY, GRID):
+        raise ValueError("layout must be 'overlay' or 'grid'")
+    # Imported here: matplotlib costs hundreds of ms, and most runs never draw anything
+    import numpy as np
+    from matplotlib import colormaps
+    from matplotlib.collections import LineCollection
+    from matplotlib.figure import Figure
+    from matplotlib.lines import Line2D
+    colors = colormaps['tab10']
+
+    if layout == GRID:
+        paths = list(paths)
+        columns = columns or max(1, math.ceil(math.sqrt(len(paths))))
+        rows = max(1, math.ceil(len(paths) / columns))
+        # Fixed spacing: a constrained layout costs seconds per hundred panels
+        height = 2.4 * rows + 0.6
+        figure = Figure(figsize=(3.2 * columns, height))
+        margins = {'hspace': 0.3, 'wspace': 0.15, 'top': 1 - 0.6 / height, 'bottom': 0.2 / height, 'left': 0.03, 'right': 0.97}
+        axes = list(figure.subplots(rows, columns, squeeze=False, gridspec_kw=margins).flat)
+        for n, (axis, (name, xs, ys)) in enumerate(zip(axes, paths)):
+            _draw_stations(axis, locations, labels=False)
+            axis.plot(xs, ys, color=colors(n % 10), linestyle='--', linewidth=1.2, marker='o', markersize=3)
+            axis.set_title(name, fontsize=8)
+            axis.set_xticks([]) # The stations give the scale; ticks are most of a panel's drawing time
+            axis.set_yticks([])
+        for axis in axes[len(paths):]:
+            axis.set_visible(False) # Panels past the last agent
+        count = len(paths)
+    else:
+        figure = Figure(figsize=(10, 6), layout='constrained')
+        axis = figure.add_subplot()
+        _draw_stations(axis, locations, labels=True)
+        segments, segment_colors, handles = [], [], []
+        count = 0
+        for name, xs, ys in paths:
+            color = colors(count % 10)
+            segments.append(np.column_stack((xs, ys))) # One packed (n, 2) array per path
+            segment_colors.append(color)
+            if count < LEGEND_LIMIT:
+                handles.append(Line2D([], [], color=color, linestyle='--', label=f'{name} Path'))
+            count += 1
+        axis.add_collection(LineCollection(segments, colors=segment_colors, linestyles='--', linewidths=1.5, alpha=0.7))
+        stops = np.concatenate(segments) if segments else np.empty((0, 2))
+        axis.scatter(stops[:, 0], stops[:, 1], color='red', s=20, zorder=4)
+        axis.autoscale_view()
+        axis.set_xlabel('X Coordinate')
+        axis.set_ylabel('Y Coordinate')
+        axis.grid(True, linestyle=':', alpha=0.5)
+        if 0 < count <= LEGEND_LIMIT:
+            axis.legend(handles=handles)
+    figure.suptitle(title if title is not None else f'GOAP Agent Movement: {count} agents')
+    figure.savefig(filename, dpi=dpi)
+    return count
+
+
+def _draw_stations(axis, locations, labels):
+    axis.scatter([p[0] for p in locations.values()], [p[1] for p in locations.values()], color='blue',
+                 s=100 if labels else 25, zorder=5)
+    if labels:
+        for name, (x, y) in locations.items():
+            axis.annotate(name, (x + 0.5, y), fontsize=9)
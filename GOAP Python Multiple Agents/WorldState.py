@@ -4,6 +4,9 @@ class WorldState:
     LOC_CUTTER = (10, 5)
     LOC_ASSEMBLER = (5, 0)
     LOC_PRESS = (2, 8)
+
+    # Floor plan for movement costs (a Navigation); None walks an open floor (Manhattan distance)
+    navigation = None
     
     def __init__(self, agent_pos=LOC_RECEIVING):
         self.state = {
@@ -17,7 +20,9 @@ class WorldState:
         }
 
 def calculate_move_cost(start_pos, end_pos):
-    """Calculates Manhattan distance as cost for movement."""
+    """Calculates the walking distance as cost for movement: WorldState.navigation's shortest path, or Manhattan distance."""
+    if WorldState.navigation is not None:
+        return WorldState.navigation.distance(start_pos, end_pos)
     dx = abs(end_pos[0] - start_pos[0])
     dy = abs(end_pos[1] - start_pos[1])
     return dx + dy
\ No newline at end of file
@@ -0,0 +1,118 @@
+import threading
+
+
+class WorldStore(dict):
+    """
+    The shared world state as a versioned dict.
+
+    Every write that changes a key's value advances a store-wide clock and stamps the key with
+    it, so versions[key] only ever grows, and version is the clock after the latest change.
+    Reads are plain dict reads, and copy() returns a plain dict snapshot, so the planners take
+    a WorldStore wherever they take the world state dict.
+
+    An agent records versions_of(keys) for the shared keys its plan reads when it adopts the
+    plan. While unchanged(recorded) holds, nobody has written those keys since, so the plan is
+    still valid without rechecking a single precondition. commit() is the optimistic write:
+    it applies an action's shared effects in place only if the keys it was planned against
+    are still at their recorded versions.
+    """
+
+    def __init__(self, state=None):
+        super().__init__(state or {})
+        self.version = 0
+        self.versions = dict.fromkeys(self, 0)  # key -> clock value of its latest change
+        self._lock = threading.Lock()           # Makes commit's check-then-write atomic between threads
+
+    def __setitem__(self, key, value):
+        if key in self and dict.__getitem__(self, key) == value:
+            return # Rewriting a value is not a change, and must not look like a conflict
+        dict.__setitem__(self, key, value)
+        self.version += 1
+        self.versions[key] = self.version
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self.version += 1
+        self.versions[key] = self.version
+
+    def update(self, *args, **changes):
+        # dict.update would bypass __setitem__
+        for key, value in dict(*args, **changes).items():
+            self[key] = value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return dict.__getitem__(self, key)
+
+    def pop(self, key, *default):
+        if key in self:
+            value = dict.__getitem__(self, key)
+            del self[key]
+            return value
+        return dict.pop(self, key, *default)
+
+    def clear(self):
+        for key in list(self):
+            del self[key]
+
+    def popitem(self):
+        key = next(reversed(self))
+        return key, self.pop(key)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def __reduce__(self):
+        # A plain dict plus the version clocks (the lock is not picklable, and is per process anyway)
+        return _restore, (dict(self), self.version, self.versions)
+
+    def version_of(self, key):
+        """Clock value of key's latest change (0 if it never changed, or never existed)."""
+        return self.versions.get(key, 0)
+
+    def versions_of(self, keys):
+        """{key: version} for keys, to check against later with unchanged() or commit()."""
+        versions = self.versions
+        return {key: versions.get(key, 0) for key in keys}
+
+    def changed(self, recorded):
+        """Keys of a versions_of() record that were written since it was taken."""
+        versions = self.versions
+        return [key for key, version in recorded.items() if versions.get(key, 0) != version]
+
+    def unchanged(self, recorded):
+        """True if no key of a versions_of() record was written since it was taken."""
+        versions = self.versions
+        for key, version in recorded.items():
+            if versions.get(key, 0) != version:
+                return False
+        return True
+
+    def commit(self, action, expected=None):
+        """
+        Applies action's shared effects and deltas in place, if the state is still as expected.
+
+        Args:
+            action (Action): The action whose shared effects to write.
+            expected (dict): Optional versions_of() record the action was planned against.
+
+        Returns:
+            list: The conflicting keys (written since expected was recorded), with nothing
+            applied; an empty list once the effects are written.
+        """
+        with self._lock:
+            if expected:
+                conflicts = self.changed(expected)
+                if conflicts:
+                    return conflicts
+            action.apply_shared_effects(self)
+            return []
+
+
+def _restore(state, version, versions):
+    store = WorldStore(state)
+    store.version = version
+    store.versions.update(versions)
+    return store
@@ -0,0 +1,10 @@
+"""
+Benchmarks for the multi-agent planner.
+
+Run them from the 'GOAP Python Multiple Agents' folder so the planner modules are importable:
+    python -m benchmarks.run                      # suite on generated domains, JSON results
+    python -m benchmarks.incremental_replanning
+    python -m benchmarks.parallel_planning
+
+benchmarks.domain_generator builds parameterised factory domains for any of them.
+"""
@@ -0,0 +1,61 @@
+"""
+plan_batched (NumPy and pure-Python expanders) against plan_actions on a generated domain.
+
+Batches trade a few extra expansions (nodes popped together that one-at-a-time A* would
+never have reached) for one vectorised expansion per batch. Every variant must agree on every
+cost, and both backends on every plan.
+
+    python -m benchmarks.batch_expansion --stations 30 --chains 8 --depth 10 --tools 6 --modifiers 6
+"""
+import argparse
+import time
+from Planner import plan_actions
+from SearchStats import SearchStats
+from BatchExpansion import plan_batched, np
+from benchmarks.domain_generator import generate_domain
+
+
+def run(domain, planner, stats=None, **options):
+    start = time.perf_counter()
+    results = [planner(domain.world_state, domain.agent_state_for(i), goal, domain.actions, heuristic='max',
+                       stats=stats, **options)
+               for i, (_, _, goal) in enumerate(domain.agent_specs)]
+    return results, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    for name, default in (('stations', 12), ('chains', 4), ('depth', 7), ('tools', 3), ('modifiers', 3), ('agents', 8)):
+        parser.add_argument(f'--{name}', type=int, default=default)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[16, 64, 256])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    domain = generate_domain(args.stations, args.chains, args.depth, args.tools, args.modifiers, args.agents, args.seed)
+    print(domain)
+    run(domain, plan_actions) # Warm-up: compiles the action sets
+    reference, elapsed = run(domain, plan_actions)
+    costs = [result.cost for result in reference]
+    plans = len(reference)
+    nodes = sum(result.expansions for result in reference)
+    print(f"{'plan_actions':>22}: {1000 * elapsed / plans:7.1f} ms/plan, {nodes / plans:7.0f} nodes/plan")
+
+    backends = ['python'] + (['numpy'] if np is not None else [])
+    for batch_size in args.batch_sizes:
+        plans_by_backend = {}
+        for backend in backends:
+            stats = SearchStats() # Warm-up run, timing the expansions
+            run(domain, plan_batched, stats, batch_size=batch_size, backend=backend)
+            results, elapsed = run(domain, plan_batched, batch_size=batch_size, backend=backend)
+            assert [result.cost for result in results] == costs, "batched search lost optimality"
+            plans_by_backend[backend] = results
+            print(f"{f'{backend} batch {batch_size}':>22}: {1000 * elapsed / plans:7.1f} ms/plan, "
+                  f"{stats.expanded / plans:7.0f} nodes/plan, {1000 * stats.timings['successors'] / plans:6.1f} ms/plan expanding")
+        if len(plans_by_backend) == 2:
+            assert plans_by_backend['python'] == plans_by_backend['numpy'], "backends disagree"
+    if np is None:
+        print("NumPy is not installed: only the pure-Python expander ran")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+plan_bounded (SMA*, a cap on search nodes held) against plan_actions on a generated domain.
+
+Every agent's problem is solved by plan_actions first; plan_bounded then gets caps at fractions
+of the states plan_actions kept (peak_visited). Found plans must cost the same. The lower the
+cap, the lower the peak traced memory and the more states are evicted and expanded again.
+Bytes per node is the peak traced memory over the most nodes (states) held at once.
+
+    python -m benchmarks.bounded_search --stations 20 --chains 6 --depth 9 --fractions 1 0.5 0.25
+"""
+import argparse
+import time
+from Planner import plan_actions
+from SearchStats import SearchStats
+from BoundedSearch import plan_bounded
+from benchmarks.domain_generator import generate_domain
+from benchmarks.run import traced_peak
+
+
+def solve(planner, problems, domain, **options):
+    """(results, SearchStats, seconds, peak traced bytes) for every problem."""
+    stats = SearchStats()
+    start = time.perf_counter()
+    results = [planner(domain.world_state, agent_state, goal, domain.actions, heuristic='max', stats=stats,
+                       **{name: option(i) if callable(option) else option for name, option in options.items()})
+               for i, (agent_state, goal) in enumerate(problems)]
+    elapsed = time.perf_counter() - start
+    _, peak = traced_peak(lambda: [planner(domain.world_state, agent_state, goal, domain.actions, heuristic='max',
+                                           **{name: option(i) if callable(option) else option
+                                              for name, option in options.items()})
+                                   for i, (agent_state, goal) in enumerate(problems)])
+    return results, stats, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    for name, default in (('stations', 12), ('chains', 4), ('depth', 7), ('tools', 3), ('modifiers', 3), ('agents', 6)):
+        parser.add_argument(f'--{name}', type=int, default=default)
+    parser.add_argument('--fractions', type=float, nargs='+', default=[1.0, 0.5, 0.25])
+    parser.add_argument('--max-expansions', type=int, default=500000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    domain = generate_domain(args.stations, args.chains, args.depth, args.tools, args.modifiers, args.agents, args.seed)
+    print(domain)
+    problems = [(domain.agent_state_for(i), goal) for i, (_, _, goal) in enumerate(domain.agent_specs)]
+    plan_actions(domain.world_state, *problems[0], domain.actions, heuristic='max') # Warm-up: compiles the action set
+    reference = []
+    for agent_state, goal in problems:
+        stats = SearchStats()
+        reference.append((plan_actions(domain.world_state, agent_state, goal, domain.actions, heuristic='max', stats=stats),
+                          stats.peak_visited))
+    results, stats, elapsed, peak = solve(plan_actions, problems, domain)
+    print(f"{'plan_actions':>18}: {stats.expanded:8} expanded, {sum(v for _, v in reference):8} states held, "
+          f"{elapsed:6.2f} s, {peak / 2 ** 20:7.1f} MB peak, {peak / stats.peak_visited:4.0f} B/node")
+
+    for fraction in args.fractions:
+        caps = [max(2, int(fraction * visited)) for _, visited in reference]
+        results, stats, elapsed, peak = solve(plan_bounded, problems, domain, max_nodes=lambda i: caps[i],
+                                              max_expansions=args.max_expansions)
+        found = sum(result.cost is not None for result in results)
+        for result, (expected, _) in zip(results, reference):
+            assert result.cost is None or result.cost == expected.cost, "bounded search lost optimality"
+        print(f"{f'cap {fraction:g} x states':>18}: {stats.expanded:8} expanded, {sum(caps):8} states held, "
+              f"{elapsed:6.2f} s, {peak / 2 ** 20:7.1f} MB peak, {peak / stats.peak_visited:4.0f} B/node, "
+              f"{stats.evicted:8} evicted, {found}/{len(problems)} found")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Reactive coordination against conflict-based joint planning ('cbs') on one contended station.
+
+Every agent fetches raw stock, claims the single Press (a shared press_free flag), uses it,
+releases it and delivers its own order. Reactive agents plan alone, so all but one find the
+Press taken when they get there and search again every tick until it is free; CBS plans the
+queue up front with Wait actions. Both must deliver every order.
+
+    python -m benchmarks.conflict_planning --agents 2 4 8 16
+"""
+import argparse
+import time
+from Actions import Action, MOVE
+from FactoryManager import FactoryManager
+
+RECEIVING, PRESS, DOCK = (0, 0), (3, 0), (6, 0)
+
+
+def press_domain(agents):
+    """(actions, world_state, agent_state, agent_specs) with one Press for every agent."""
+    actions = [Action(name=f'Move to {name}', preconditions={}, local_effects={}, shared_effects={},
+                      target_pos=position, kind=MOVE)
+               for name, position in (('Receiving', RECEIVING), ('Press', PRESS), ('Dock', DOCK))]
+    actions += [
+        Action(name='Fetch Raw', preconditions={'agent_position': RECEIVING, 'agent_item': 'empty'},
+               numeric_preconditions={'raw_stock': ('>=', 1)}, local_effects={'agent_item': 'raw'},
+               shared_effects={}, shared_deltas={'raw_stock': -1}, base_cost=3),
+        Action(name='Claim Press', preconditions={'agent_position': PRESS, 'press_free': True, 'agent_item': 'raw'},
+               local_effects={'agent_has_claim': True}, shared_effects={'press_free': False}),
+        Action(name='Use Press', preconditions={'agent_position': PRESS, 'agent_has_claim': True, 'agent_item': 'raw'},
+               local_effects={'agent_item': 'pressed'}, shared_effects={}, base_cost=5),
+        Action(name='Release Press', preconditions={'agent_has_claim': True, 'agent_item': 'pressed'},
+               local_effects={'agent_has_claim': False}, shared_effects={'press_free': True}),
+    ]
+    actions += [Action(name=f'Deliver Order {i}', preconditions={'agent_position': DOCK, 'agent_item': 'pressed',
+                                                                 'agent_has_claim': False},
+                       local_effects={'agent_item': 'empty'}, shared_effects={f'delivered_{i}': True}, base_cost=2)
+                for i in range(agents)]
+    world_state = {'raw_stock': agents, 'press_free': True, **{f'delivered_{i}': False for i in range(agents)}}
+    agent_state = {'agent_item': 'empty', 'agent_has_claim': False}
+    agent_specs = [(f'Agent {i}', RECEIVING, {f'delivered_{i}': True}) for i in range(agents)]
+    return actions, world_state, agent_state, agent_specs
+
+
+def simulate(agents, coordination, max_steps):
+    actions, world_state, agent_state, agent_specs = press_domain(agents)
+    manager = FactoryManager(agent_specs, world_state, verbose=False, collect_stats=True, actions=actions,
+                             agent_state=agent_state, coordination=coordination)
+    start = time.perf_counter()
+    manager.run_simulation(max_steps=max_steps, visualize=False)
+    elapsed = time.perf_counter() - start
+    searches = sum(stats.searches for stats in manager.agent_stats.values())
+    expanded = sum(stats.expanded for stats in manager.agent_stats.values())
+    return manager, elapsed, searches, expanded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--agents', type=int, nargs='+', default=[2, 4, 8, 16])
+    parser.add_argument('--max-steps', type=int, default=1000)
+    args = parser.parse_args()
+
+    for agents in args.agents:
+        results = {}
+        for coordination in ('reactive', 'cbs'):
+            manager, elapsed, searches, expanded = simulate(agents, coordination, args.max_steps)
+            results[coordination] = manager
+            extra = f", CBS {manager.batch_planner.last_search}" if coordination == 'cbs' else ''
+            print(f"{agents:3} agents, {coordination:>8}: {len(manager.tick_stats):4} ticks, "
+                  f"{manager.status_counts['COMPLETED']:3} delivered, {searches:5} searches, "
+                  f"{expanded:7} nodes expanded, {1000 * elapsed:8.1f} ms{extra}")
+        assert results['reactive'].agent_status == results['cbs'].agent_status, "the two modes met different goals"
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Synthetic factory domains for benchmarks, in the shape of the default ACTIONS.
+
+A domain has `stations` locations on a grid (station 0 is Receiving), one Move action per
+station, and `chains` product chains. Each chain works like Fetch Raw Steel -> Cut -> Weld ...:
+
+* Fetch: at Receiving, takes one unit of the chain's raw stock (numeric precondition + delta).
+* `depth` processing stages, each at a random station, turning the carried item into the next one.
+  Some stages need one of the `tools` (picked up at a tool station).
+* Deliver: the last stage also publishes the chain's product to the shared world state.
+
+`modifiers` adds station wear: a world key per worn station that makes its stages slower, and
+each tool makes the stages that accept it cheaper, like the Cutter's cost_modifiers.
+Agents each get a chain's product as their goal (round robin) and start at random stations.
+
+    domain = generate_domain(stations=8, chains=3, depth=4, tools=2, modifiers=2, agents=6)
+    plan_actions(domain.world_state, domain.agent_state_for(0), domain.agent_specs[0][2], domain.actions)
+"""
+import random
+from Actions import Action, MOVE
+
+EMPTY = 'empty' # agent_item when the agent carries nothing
+
+
+class Domain:
+    """Everything needed to plan in, or simulate, a generated domain."""
+
+    def __init__(self, params, stations, actions, world_state, agent_state, agent_specs):
+        self.params = params
+        self.stations = stations            # [(x, y)], index 0 is Receiving
+        self.actions = actions
+        self.world_state = world_state
+        self.agent_state = agent_state      # Local keys every agent starts with (besides agent_position)
+        self.agent_specs = agent_specs      # [(name, start_pos, goal)] as FactoryManager takes them
+
+    def agent_state_for(self, i):
+        """Initial local state of agent i, for calling plan_actions directly."""
+        return {'agent_position': self.agent_specs[i][1], **self.agent_state}
+
+    def __repr__(self):
+        details = ', '.join(f"{k}={v}" for k, v in self.params.items())
+        return f"Domain({details}: {len(self.actions)} actions)"
+
+
+def generate_domain(stations=4, chains=2, depth=3, tools=1, modifiers=1, agents=2, seed=0):
+    """
+    Builds a reproducible random domain (same arguments -> same domain).
+
+    Args:
+        stations (int): Locations, including Receiving (at least 2).
+        chains (int): Independent products.
+        depth (int): Processing stages per chain after the fetch.
+        tools (int): Tools that stages may require or be sped up by.
+        modifiers (int): Stations that start worn (their stages cost more).
+        agents (int): Agents; agent i produces chain i % chains.
+        seed (int): Random seed for station positions and stage placement.
+    """
+    if stations < 2:
+        raise ValueError("A domain needs Receiving and at least one work station")
+    if depth < 1:
+        raise ValueError("Every chain needs at least one processing stage")
+    params = {'stations': stations, 'chains': chains, 'depth': depth, 'tools': tools,
+              'modifiers': modifiers, 'agents': agents, 'seed': seed}
+    rng = random.Random(seed)
+    size = max(10, 3 * stations)
+    positions = [(0, 0)]
+    while len(positions) < stations:
+        position = (rng.randrange(size), rng.randrange(size))
+        if position not in positions:
+            positions.append(position)
+
+    actions = [
+        Action(name=f'Move to Station {s}', preconditions={}, local_effects={}, shared_effects={},
+               base_cost=1, target_pos=position, kind=MOVE)
+        for s, position in enumerate(positions)
+    ]
+    world_state = {}
+    agent_state = {'agent_item': EMPTY}
+
+    # Station wear: the first `modifiers` work stations start worn
+    worn = list(range(1, min(stations, modifiers + 1)))
+    for s in range(1, stations):
+        world_state[f'station_{s}_status'] = 'Worn' if s in worn else 'Optimal'
+
+    for t in range(tools):
+        tool_key = f'agent_has_tool_{t}'
+        agent_state[tool_key] = False
+        actions.append(Action(
+            name=f'Pick Up Tool {t}',
+            preconditions={'agent_position': positions[rng.randrange(1, stations)], tool_key: False},
+            local_effects={tool_key: True}, shared_effects={}, base_cost=2))
+
+    for c in range(chains):
+        stock_key = f'raw_stock_{c}'
+        product_key = f'has_product_{c}'
+        world_state[stock_key] = agents
+        world_state[product_key] = 0
+        actions.append(Action(
+            name=f'Fetch Raw {c}',
+            preconditions={'agent_position': positions[0], 'agent_item': EMPTY},
+            numeric_preconditions={stock_key: ('>=', 1)},
+            local_effects={'agent_item': f'c{c}_s0'}, shared_effects={},
+            shared_deltas={stock_key: -1}, base_cost=5))
+        for k in range(1, depth + 1):
+            s = rng.randrange(1, stations)
+            preconditions = {'agent_position': positions[s], 'agent_item': f'c{c}_s{k - 1}'}
+            cost_modifiers = [{'condition': {f'station_{s}_status': 'Worn'}, 'adjustment': 5}]
+            if tools:
+                t = rng.randrange(tools)
+                if rng.random() < 0.3:
+                    preconditions[f'agent_has_tool_{t}'] = True
+                else:
+                    cost_modifiers.append({'condition': {f'agent_has_tool_{t}': True}, 'adjustment': -3})
+            last = k == depth
+            actions.append(Action(
+                name=f'Chain {c} Stage {k}', preconditions=preconditions,
+                local_effects={'agent_item': EMPTY if last else f'c{c}_s{k}'},
+                shared_effects={product_key: 1} if last else {},
+                base_cost=rng.randint(4, 12), cost_modifiers=cost_modifiers))
+
+    agent_specs = [(f'Agent {i}', positions[rng.randrange(stations)], {f'has_product_{i % chains}': 1})
+                   for i in range(agents)]
+    return Domain(params, positions, actions, world_state, agent_state, agent_specs)
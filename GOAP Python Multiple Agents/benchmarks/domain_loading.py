@@ -0,0 +1,65 @@
+"""
+Startup time of a large domain file: parse, validate, prune and compile, against the cached artifact.
+
+A generated domain is written with save_domain, then loaded cold (no artifact yet) and warm
+(the artifact written by the cold load), each time with empty planner caches as in a fresh
+process. Startup is the load plus compile_problem for every agent, which the warm load has
+already installed. Both loads must give every agent the same start state and successors.
+
+    python -m benchmarks.domain_loading --stations 100 --chains 60 --depth 20 --tools 10 --modifiers 10 --agents 40
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import CompiledActions
+import Pruning
+from DomainLoader import load_domain, save_domain
+from benchmarks.domain_generator import generate_domain
+
+
+def startup(path, cache_dir):
+    """Loads the domain with empty caches; returns it, the load and compile times, and every agent's first expansion."""
+    CompiledActions._COMPILED_CACHE.clear()
+    Pruning._PRUNED_CACHE.clear()
+    start = time.perf_counter()
+    domain = load_domain(path, cache_dir=cache_dir)
+    loaded = time.perf_counter() - start
+    problems = []
+    for i, (_, _, goal) in enumerate(domain.agent_specs):
+        pruned = Pruning.prune_actions(domain.actions, goal)
+        problems.append(CompiledActions.compile_problem([domain.world_state, domain.agent_state_for(i)], pruned, goal))
+    compiled = time.perf_counter() - start - loaded
+    expansions = [(start_code, compiled_actions.successors(start_code))
+                  for compiled_actions, start_code, _, _ in problems]
+    return domain, loaded, compiled, expansions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    for name, default in (('stations', 100), ('chains', 60), ('depth', 20), ('tools', 10), ('modifiers', 10), ('agents', 40)):
+        parser.add_argument(f'--{name}', type=int, default=default)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='goap_domains_')
+    path = os.path.join(directory, 'generated.json')
+    generated = generate_domain(args.stations, args.chains, args.depth, args.tools, args.modifiers, args.agents, args.seed)
+    save_domain(generated, path)
+    print(f"{generated}: {os.path.getsize(path) / 1e6:.1f} MB of JSON")
+
+    results = []
+    for run in ('cold', 'warm'):
+        domain, loaded, compiled, expansions = startup(path, directory)
+        results.append(expansions)
+        print(f"{run:>5}: loaded in {1000 * loaded:7.1f} ms ({'artifact' if domain.from_cache else 'parsed and compiled'}), "
+              f"compile_problem for {len(domain.agent_specs)} agents in {1000 * compiled:6.1f} ms")
+    assert results[0] == results[1], "the cached domain expands differently"
+    artifacts = [name for name in os.listdir(directory) if name.endswith('.pickle')]
+    print(f"artifact: {sum(os.path.getsize(os.path.join(directory, name)) for name in artifacts) / 1e6:.1f} MB")
+    shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
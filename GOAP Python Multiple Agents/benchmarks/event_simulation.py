@@ -0,0 +1,50 @@
+"""
+run_simulation (lockstep ticks) against run_event_simulation (a clock driven by action costs).
+
+A generated domain is run with many agents per product, all competing for the same stations
+and raw stock. Both modes must meet the same goals. Event mode reports the simulated time
+the shift took, i.e. when the last goal was met with every action lasting its cost.
+
+    python -m benchmarks.event_simulation --agents 200
+"""
+import argparse
+import time
+from FactoryManager import FactoryManager
+from benchmarks.domain_generator import generate_domain
+
+
+def simulate(domain, event_driven, max_steps):
+    manager = FactoryManager(domain.agent_specs, domain.world_state, verbose=False, collect_stats=True,
+                             actions=domain.actions, agent_state=domain.agent_state)
+    start = time.perf_counter()
+    if event_driven:
+        manager.run_event_simulation(visualize=False)
+    else:
+        manager.run_simulation(max_steps=max_steps, visualize=False)
+    elapsed = time.perf_counter() - start
+    searches = sum(stats.searches for stats in manager.agent_stats.values())
+    return manager, elapsed, searches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    for name, default in (('stations', 12), ('chains', 4), ('depth', 7), ('tools', 3), ('modifiers', 3), ('agents', 200)):
+        parser.add_argument(f'--{name}', type=int, default=default)
+    parser.add_argument('--max-steps', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    domain = generate_domain(args.stations, args.chains, args.depth, args.tools, args.modifiers, args.agents, args.seed)
+    print(domain)
+
+    ticks, elapsed, searches = simulate(domain, False, args.max_steps)
+    print(f"ticks : {len(ticks.tick_stats):6} ticks, {ticks.status_counts['COMPLETED']:4} goals met, "
+          f"{searches:6} searches, {elapsed:6.2f} s")
+    events, elapsed, searches = simulate(domain, True, args.max_steps)
+    print(f"events: {events.events:6} events, {events.status_counts['COMPLETED']:4} goals met, "
+          f"{searches:6} searches, {elapsed:6.2f} s, shift over at t={events.now}")
+    assert ticks.agent_status == events.agent_status, "the two modes met different goals"
+
+
+if __name__ == '__main__':
+    main()
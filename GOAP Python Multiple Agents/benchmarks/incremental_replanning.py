@@ -0,0 +1,95 @@
+"""
+Full replanning vs IncrementalPlanner under heavy contention for raw steel.
+
+Every agent keeps taking widget orders. Raw steel is only restocked (to 2 units) every few
+ticks, so most agents find it gone, fail their fetch and replan on almost every tick.
+Both modes run the same lockstep loop; only the planner differs.
+
+    python -m benchmarks.incremental_replanning --agents 12 --ticks 400
+"""
+import argparse
+import time
+from WorldState import WorldState
+from Actions import ACTIONS
+from Planner import IncrementalPlanner
+
+ACTIONS_BY_NAME = {action.name: action for action in ACTIONS}
+STATIONS = [WorldState.LOC_RECEIVING, WorldState.LOC_CUTTER, WorldState.LOC_ASSEMBLER, WorldState.LOC_PRESS]
+GOALS = [{'has_finished_widget': 1}, {'has_heavy_duty_assembly': 1}]
+
+
+def run_scenario(agent_count, ticks, restock_interval, incremental):
+    world_state = WorldState().state
+    world_state['has_raw_steel'] = 2
+    agents = []
+    for i in range(agent_count):
+        agents.append({
+            'goal': GOALS[i % len(GOALS)],
+            'state': {
+                'agent_position': STATIONS[i % len(STATIONS)],
+                'agent_has_steel': False,
+                'agent_has_plate': False,
+                'agent_has_machined_part': False,
+            },
+            'plan': None,
+            'planner': IncrementalPlanner(reuse=incremental),
+        })
+
+    replans = conflicts = orders = 0
+    start = time.perf_counter()
+    for tick in range(ticks):
+        if tick % restock_interval == 0:
+            world_state['has_raw_steel'] = 2 # Supplier delivery
+        for agent in agents:
+            # Ship a finished product and take the next order
+            if all(world_state.get(k) == v for k, v in agent['goal'].items()):
+                for k in agent['goal']:
+                    world_state[k] = 0
+                orders += 1
+                agent['plan'] = None
+            if not agent['plan']:
+                replans += 1
+                _, agent['plan'] = agent['planner'].plan(world_state, agent['state'], agent['goal'], ACTIONS)
+                if not agent['plan']:
+                    continue
+            action = ACTIONS_BY_NAME[agent['plan'].pop(0)[0]]
+            if not action.check_preconditions(world_state, agent['state']):
+                conflicts += 1
+                agent['plan'] = None
+                continue
+            world_state.update(action.apply_shared_effects(world_state.copy()))
+            agent['state'].update(action.apply_local_effects(agent['state'].copy()))
+    elapsed = time.perf_counter() - start
+
+    return {
+        'mode': 'incremental' if incremental else 'full',
+        'replans': replans,
+        'conflicts': conflicts,
+        'orders': orders,
+        'searches': sum(a['planner'].searches for a in agents),
+        'expansions': sum(a['planner'].expansions for a in agents),
+        'seconds': elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--agents', type=int, default=12)
+    parser.add_argument('--ticks', type=int, default=400)
+    parser.add_argument('--restock-interval', type=int, default=25)
+    args = parser.parse_args()
+
+    results = [run_scenario(args.agents, args.ticks, args.restock_interval, incremental)
+               for incremental in (False, True)]
+    print(f"{'mode':<12}{'replans':>9}{'conflicts':>11}{'orders':>8}{'searches':>10}{'expansions':>12}{'seconds':>9}")
+    for r in results:
+        print(f"{r['mode']:<12}{r['replans']:>9}{r['conflicts']:>11}{r['orders']:>8}"
+              f"{r['searches']:>10}{r['expansions']:>12}{r['seconds']:>9.3f}")
+    full, incremental = results
+    if incremental['expansions']:
+        print(f"\nIncremental replanning expanded {full['expansions'] / incremental['expansions']:.1f}x fewer nodes "
+              f"and ran {full['seconds'] / incremental['seconds']:.1f}x faster.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+plan_many against one plan_actions call per goal, for a dispatcher pricing many orders.
+
+Every order asks for one chain's product, optionally delivered at a station (agent_position),
+so there are chains x (stations + 1) distinct orders. Both ways must agree on every cost.
+
+    python -m benchmarks.multi_goal --stations 12 --chains 4 --orders 50
+"""
+import argparse
+import itertools
+import time
+from Planner import plan_actions, plan_many
+from SearchStats import SearchStats
+from benchmarks.domain_generator import generate_domain
+
+
+def build_orders(domain, count):
+    chains = domain.params['chains']
+    orders = [{f'has_product_{c}': 1} for c in range(chains)]
+    for c, position in itertools.product(range(chains), domain.stations):
+        orders.append({f'has_product_{c}': 1, 'agent_position': position})
+    return orders[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    for name, default in (('stations', 12), ('chains', 4), ('depth', 7), ('tools', 3), ('modifiers', 3)):
+        parser.add_argument(f'--{name}', type=int, default=default)
+    parser.add_argument('--orders', type=int, default=50)
+    parser.add_argument('--agents', type=int, default=4, help="Agents (start states) to price the orders for")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    domain = generate_domain(args.stations, args.chains, args.depth, args.tools, args.modifiers, args.agents, args.seed)
+    orders = build_orders(domain, args.orders)
+    print(f"{domain}, {len(orders)} orders")
+    totals = {'plan_actions': [0.0, 0], 'plan_many': [0.0, 0]}
+    for i in range(args.agents):
+        agent_state = domain.agent_state_for(i)
+        stats = SearchStats()
+        start = time.perf_counter()
+        separate = [plan_actions(domain.world_state, agent_state, order, domain.actions, heuristic='max', stats=stats)
+                    for order in orders]
+        totals['plan_actions'][0] += time.perf_counter() - start
+        totals['plan_actions'][1] += stats.expanded
+
+        stats = SearchStats()
+        start = time.perf_counter()
+        shared = plan_many(domain.world_state, agent_state, orders, domain.actions, stats=stats)
+        totals['plan_many'][0] += time.perf_counter() - start
+        totals['plan_many'][1] += stats.expanded
+        if [r.cost for r in shared] != [r.cost for r in separate]:
+            raise AssertionError(f"plan_many disagrees with plan_actions for agent {i}")
+        best = min(range(len(orders)), key=lambda k: (shared[k].cost is None, shared[k].cost))
+        print(f"  Agent {i}: cheapest order {orders[best]} at cost {shared[best].cost}")
+
+    for name, (seconds, expanded) in totals.items():
+        print(f"{name:<13} {1000 * seconds / args.agents:8.1f} ms/agent {expanded / args.agents:9.0f} nodes/agent")
+    print(f"plan_many priced the orders {totals['plan_actions'][0] / totals['plan_many'][0]:.1f}x faster.")
+
+
+if __name__ == '__main__':
+    main()
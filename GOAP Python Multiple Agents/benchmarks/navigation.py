@@ -0,0 +1,92 @@
+"""
+Navigation tables on large floors: build and reopen time, table size, and lookup cost.
+
+The floor is a warehouse grid with rows of shelving (walls) broken by cross aisles, and
+`locations` stations spread over the aisles. The first run builds the table (one BFS per
+station) into --cache-dir; the second maps the cached file. Then a generated domain is planned
+on the same floor, with the detours around the shelves in every move cost.
+
+    python -m benchmarks.navigation --locations 500 --width 160 --height 120
+"""
+import argparse
+import random
+import shutil
+import tempfile
+import time
+from Navigation import Navigation
+from Planner import plan_actions
+from SearchStats import SearchStats
+from WorldState import WorldState, calculate_move_cost
+from benchmarks.domain_generator import generate_domain
+
+
+def warehouse(width, height, aisle=3, cross_aisle=40):
+    """Rows of shelving every `aisle` rows, broken by a cross aisle every `cross_aisle` columns."""
+    rows = []
+    for y in range(height):
+        shelf = y % aisle == aisle - 1 and 0 < y < height - 1
+        rows.append(''.join('#' if shelf and x % cross_aisle not in (0, 1) else '.' for x in range(width)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--locations', type=int, default=500)
+    parser.add_argument('--width', type=int, default=160)
+    parser.add_argument('--height', type=int, default=120)
+    parser.add_argument('--lookups', type=int, default=200000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cache-dir', help="Table directory (default: a fresh temporary one)")
+    args = parser.parse_args()
+
+    rows = warehouse(args.width, args.height)
+    rng = random.Random(args.seed)
+    cells = [(x, y) for y, row in enumerate(rows) for x, cell in enumerate(row) if cell == '.']
+    locations = rng.sample(cells, args.locations)
+    cache_dir = args.cache_dir or tempfile.mkdtemp(prefix='goap_navigation_')
+
+    start = time.perf_counter()
+    navigation = Navigation.from_grid(rows, locations, cache_dir=cache_dir)
+    built = time.perf_counter() - start
+    start = time.perf_counter()
+    reopened = Navigation.from_grid(rows, locations, cache_dir=cache_dir)
+    mapped = time.perf_counter() - start
+    print(f"{len(cells)} walkable cells, {args.locations} locations: "
+          f"{'built' if navigation.built else 'mapped'} in {built:.2f}s, reopened in {mapped * 1000:.1f}ms, "
+          f"table {4 * args.locations ** 2 / 1e6:.1f} MB at {navigation.path}")
+
+    pairs = [(rng.choice(locations), rng.choice(locations)) for _ in range(args.lookups)]
+    for name, table in (('manhattan', None), ('navigation', reopened)):
+        WorldState.navigation = table
+        start = time.perf_counter()
+        total = sum(calculate_move_cost(a, b) for a, b in pairs)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>10}: {1e9 * elapsed / len(pairs):6.0f} ns per lookup, mean distance {total / len(pairs):.1f}")
+
+    # Plan a generated domain whose stations stand on the warehouse floor
+    domain = generate_domain(stations=12, chains=4, depth=7, tools=3, modifiers=3, agents=8, seed=args.seed)
+    floor_stations = dict(zip(domain.stations, rng.sample(locations, len(domain.stations))))
+    for action in domain.actions:
+        if action.target_pos is not None:
+            action.target_pos = floor_stations[action.target_pos]
+        if 'agent_position' in action.preconditions:
+            action.preconditions['agent_position'] = floor_stations[action.preconditions['agent_position']]
+    for name, table in (('manhattan', None), ('navigation', reopened)):
+        WorldState.navigation = table
+        stats = SearchStats()
+        start = time.perf_counter()
+        costs = [plan_actions(domain.world_state, {**domain.agent_state_for(i), 'agent_position': floor_stations[start_pos]},
+                              goal, domain.actions, heuristic='max', stats=stats)[0]
+                 for i, (_, start_pos, goal) in enumerate(domain.agent_specs)]
+        elapsed = time.perf_counter() - start
+        print(f"{name:>10}: costs {costs}, {stats.expanded / len(costs):.0f} nodes/plan, {1000 * elapsed / len(costs):.1f} ms/plan")
+
+    WorldState.navigation = None
+    navigation.close()
+    reopened.close()
+    if not args.cache_dir:
+        shutil.rmtree(cache_dir)
+
+
+if __name__ == '__main__':
+    main()
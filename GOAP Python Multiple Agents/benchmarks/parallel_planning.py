@@ -0,0 +1,75 @@
+"""
+Speedup curve of ParallelPlanner against the number of pool workers.
+
+Builds a batch of distinct planning requests (agent positions, inventories, steel stock and
+goals), plans the whole batch once in-process (workers=0) and then with 1..--max-workers
+pool workers, checking every run returns the same plans.
+
+    python -m benchmarks.parallel_planning --max-workers 8 --rounds 3
+"""
+import argparse
+import itertools
+import os
+import time
+from WorldState import WorldState
+from Actions import ACTIONS
+from ParallelPlanner import ParallelPlanner
+
+STATIONS = [WorldState.LOC_RECEIVING, WorldState.LOC_CUTTER, WorldState.LOC_ASSEMBLER, WorldState.LOC_PRESS]
+GOALS = [{'has_finished_widget': 1}, {'has_heavy_duty_assembly': 1}]
+
+
+def build_requests():
+    """Every distinct (agent state, goal) combination of the default domain."""
+    requests = []
+    for position, steel, plate, part, goal in itertools.product(
+            STATIONS, (False, True), (False, True), (False, True), GOALS):
+        agent_state = {
+            'agent_position': position,
+            'agent_has_steel': steel,
+            'agent_has_plate': plate,
+            'agent_has_machined_part': part,
+        }
+        requests.append((agent_state, goal))
+    return requests
+
+
+def time_batches(workers, world_states, requests, rounds):
+    planner = ParallelPlanner(ACTIONS, workers)
+    planner.plan_all(world_states[0], requests[:1]) # Start the pool outside the timing
+    results = []
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for world_state in world_states:
+            results.append(planner.plan_all(world_state, requests))
+    elapsed = time.perf_counter() - start
+    planner.close()
+    return elapsed, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count())
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    world_states = []
+    for steel in (0, 1, 2):
+        world_state = WorldState().state
+        world_state['has_raw_steel'] = steel
+        world_states.append(world_state)
+    requests = build_requests()
+    searches = args.rounds * len(world_states) * len(requests)
+
+    baseline, expected = time_batches(0, world_states, requests, args.rounds)
+    print(f"{searches} searches per run on {os.cpu_count()} CPU(s)\n")
+    print(f"{'workers':>8}{'seconds':>10}{'plans/s':>10}{'speedup':>9}")
+    print(f"{'0':>8}{baseline:>10.3f}{searches / baseline:>10.0f}{1.0:>9.2f}")
+    for workers in range(1, args.max_workers + 1):
+        elapsed, results = time_batches(workers, world_states, requests, args.rounds)
+        assert results == expected, "parallel plans differ from in-process plans"
+        print(f"{workers:>8}{elapsed:>10.3f}{searches / elapsed:>10.0f}{baseline / elapsed:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
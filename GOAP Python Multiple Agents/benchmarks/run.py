@@ -0,0 +1,170 @@
+"""
+Benchmark suite: plan_actions and FactoryManager.run_simulation on generated domains.
+
+For each scenario (a set of domain_generator parameters) it records:
+  * planning: plans/s, ms per plan, nodes expanded and generated per plan, peak traced memory
+  * simulation: wall time, ticks, whether every goal was met, searches, nodes, peak traced memory
+
+Results are written as JSON. Pass an earlier results file as --baseline to flag scenarios
+whose plans/s dropped by more than --tolerance (exit status 1), e.g. in CI:
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --baseline results.json
+    python -m benchmarks.run --stations 12 --chains 4 --depth 6 --tools 3 --modifiers 3 --agents 16
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from Planner import plan_actions
+from SearchStats import SearchStats
+from FactoryManager import FactoryManager
+from benchmarks.domain_generator import generate_domain
+
+SCENARIOS = {
+    'small': dict(stations=4, chains=2, depth=3, tools=1, modifiers=1, agents=2),
+    'medium': dict(stations=8, chains=3, depth=5, tools=2, modifiers=2, agents=6),
+    'large': dict(stations=12, chains=4, depth=7, tools=3, modifiers=3, agents=12),
+}
+
+
+def traced_peak(function):
+    """Runs function under tracemalloc and returns (result, peak bytes allocated meanwhile)."""
+    tracemalloc.start()
+    try:
+        result = function()
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_planning(domain, repeat):
+    problems = [(domain.agent_state_for(i), goal) for i, (_, _, goal) in enumerate(domain.agent_specs)]
+
+    def plan_all(stats=None):
+        return [plan_actions(domain.world_state, agent_state, goal, domain.actions, heuristic='max', stats=stats)
+                for agent_state, goal in problems]
+
+    expected = plan_all() # Warm-up: compiles the action set (cached for the timed runs)
+    stats = SearchStats()
+    assert plan_all(stats) == expected
+    _, peak = traced_peak(plan_all)
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        plan_all()
+    elapsed = time.perf_counter() - start
+    plans = repeat * len(problems)
+    return {
+        'plans': plans,
+        'seconds': elapsed,
+        'plans_per_second': plans / elapsed,
+        'ms_per_plan': 1000 * elapsed / plans,
+        'expanded_per_plan': stats.expanded / len(problems),
+        'generated_per_plan': stats.generated / len(problems),
+        'unsolved': sum(1 for cost, _ in expected if cost is None),
+        'mean_cost': sum(cost for cost, _ in expected if cost is not None) / max(1, len(problems)),
+        'peak_memory_bytes': peak,
+    }
+
+
+def bench_simulation(domain, max_steps):
+    def simulate():
+        manager = FactoryManager(domain.agent_specs, domain.world_state, verbose=False, collect_stats=True,
+                                 actions=domain.actions, agent_state=domain.agent_state)
+        start = time.perf_counter()
+        goals_met = manager.run_simulation(max_steps=max_steps, visualize=False)
+        return manager, goals_met, time.perf_counter() - start
+
+    manager, goals_met, elapsed = simulate()
+    _, peak = traced_peak(simulate)
+    searches = sum(stats.searches for stats in manager.agent_stats.values())
+    return {
+        'seconds': elapsed,
+        'ticks': len(manager.tick_stats),
+        'all_goals_met': goals_met,
+        'searches': searches,
+        'expanded': sum(stats.expanded for stats in manager.agent_stats.values()),
+        'peak_memory_bytes': peak,
+    }
+
+
+def run_scenario(name, params, repeat, max_steps):
+    domain = generate_domain(**params)
+    return {
+        'name': name,
+        'params': domain.params,
+        'actions': len(domain.actions),
+        'planning': bench_planning(domain, repeat),
+        'simulation': bench_simulation(domain, max_steps),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Returns one message per scenario whose plans/s fell more than tolerance below the baseline."""
+    before = {scenario['name']: scenario for scenario in baseline['scenarios']}
+    regressions = []
+    for scenario in results['scenarios']:
+        old = before.get(scenario['name'])
+        if old is None or old['params'] != scenario['params']:
+            continue
+        old_rate = old['planning']['plans_per_second']
+        new_rate = scenario['planning']['plans_per_second']
+        if new_rate < old_rate * (1 - tolerance):
+            regressions.append(f"{scenario['name']}: {new_rate:.0f} plans/s vs {old_rate:.0f} in the baseline")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    for name in ('stations', 'chains', 'depth', 'tools', 'modifiers', 'agents'):
+        parser.add_argument(f'--{name}', type=int, help="Run one custom scenario instead of the presets")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=10, help="Timed rounds of planning for every agent")
+    parser.add_argument('--max-steps', type=int, default=500)
+    parser.add_argument('--output', help="Write the JSON results here (default: stdout)")
+    parser.add_argument('--baseline', help="Earlier JSON results to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed plans/s drop vs the baseline")
+    args = parser.parse_args()
+
+    custom = {name: getattr(args, name) for name in ('stations', 'chains', 'depth', 'tools', 'modifiers', 'agents')
+              if getattr(args, name) is not None}
+    if custom:
+        scenarios = {'custom': {**SCENARIOS['small'], **custom}}
+    else:
+        scenarios = {name: SCENARIOS[name] for name in args.scenarios}
+
+    results = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'scenarios': [],
+    }
+    for name, params in scenarios.items():
+        scenario = run_scenario(name, {**params, 'seed': args.seed}, args.repeat, args.max_steps)
+        results['scenarios'].append(scenario)
+        planning, simulation = scenario['planning'], scenario['simulation']
+        print(f"{name:>8}: {planning['plans_per_second']:8.0f} plans/s, {planning['expanded_per_plan']:7.1f} nodes/plan, "
+              f"simulation {simulation['seconds']:.3f}s over {simulation['ticks']} ticks", file=sys.stderr)
+
+    report = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+    else:
+        print(report)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
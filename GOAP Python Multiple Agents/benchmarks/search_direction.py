@@ -0,0 +1,52 @@
+"""
+Forward, backward (regression) and bidirectional search on generated domains.
+
+Plans every agent's goal with each direction, checks they agree on the optimal costs and
+reports nodes expanded and generated per plan. Regression pays off when goals are narrow and
+states are wide (many stations, chains and tools).
+
+    python -m benchmarks.search_direction --stations 12 --chains 4 --depth 7 --tools 3
+"""
+import argparse
+import time
+from Planner import plan_actions
+from Regression import plan_backward
+from SearchStats import SearchStats
+from benchmarks.domain_generator import generate_domain
+
+DIRECTIONS = {
+    'forward': lambda world, agent, goal, actions, stats: plan_actions(world, agent, goal, actions, heuristic='max',
+                                                                       stats=stats),
+    'backward': lambda world, agent, goal, actions, stats: plan_backward(world, agent, goal, actions, stats=stats),
+    'bidirectional': lambda world, agent, goal, actions, stats: plan_backward(world, agent, goal, actions,
+                                                                             bidirectional=True, stats=stats),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    for name, default in (('stations', 12), ('chains', 4), ('depth', 7), ('tools', 3), ('modifiers', 3), ('agents', 12)):
+        parser.add_argument(f'--{name}', type=int, default=default)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    domain = generate_domain(args.stations, args.chains, args.depth, args.tools, args.modifiers, args.agents, args.seed)
+    problems = [(domain.agent_state_for(i), goal) for i, (_, _, goal) in enumerate(domain.agent_specs)]
+    print(domain)
+    print(f"{'direction':<14} {'expanded/plan':>14} {'generated/plan':>15} {'ms/plan':>8}")
+    expected = None
+    for name, plan in DIRECTIONS.items():
+        stats = SearchStats()
+        start = time.perf_counter()
+        costs = [plan(domain.world_state, agent_state, goal, domain.actions, stats).cost for agent_state, goal in problems]
+        elapsed = time.perf_counter() - start
+        if expected is None:
+            expected = costs
+        elif costs != expected:
+            raise AssertionError(f"{name} search returned costs {costs}, forward search {expected}")
+        print(f"{name:<14} {stats.expanded / len(problems):14.1f} {stats.generated / len(problems):15.1f} "
+              f"{1000 * elapsed / len(problems):8.2f}")
+
+
+if __name__ == '__main__':
+    main()
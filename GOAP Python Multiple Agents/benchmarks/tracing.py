@@ -0,0 +1,68 @@
+"""
+FactoryManager.run_simulation without a trace, with a JSONL trace file, and with console output.
+
+The console run prints into a buffer, so only the formatting is timed, not a terminal. The
+trace file is then replayed, and the replayed world state must be the one the run ended in.
+
+    python -m benchmarks.tracing --agents 400
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+from FactoryManager import FactoryManager
+from Trace import read_trace, replay
+from benchmarks.domain_generator import generate_domain
+
+
+def simulate(domain, max_steps, repeat, **options):
+    """(manager, best seconds of repeat runs)"""
+    best = None
+    for _ in range(repeat):
+        manager = FactoryManager(domain.agent_specs, domain.world_state, actions=domain.actions,
+                                 agent_state=domain.agent_state, **options)
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            manager.run_simulation(max_steps=max_steps, visualize=False)
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return manager, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    for name, default in (('stations', 12), ('chains', 4), ('depth', 7), ('tools', 3), ('modifiers', 3), ('agents', 200)):
+        parser.add_argument(f'--{name}', type=int, default=default)
+    parser.add_argument('--max-steps', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    domain = generate_domain(args.stations, args.chains, args.depth, args.tools, args.modifiers, args.agents, args.seed)
+    print(domain)
+    simulate(domain, args.max_steps, 1, verbose=False) # Warm-up: compiles the action sets
+    _, off = simulate(domain, args.max_steps, args.repeat, verbose=False)
+    print(f"{'no trace':>12}: {off:6.3f} s")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'trace.jsonl')
+        manager, elapsed = simulate(domain, args.max_steps, args.repeat, verbose=False, trace=path)
+        events = 0
+        start = time.perf_counter()
+        for _, world, agents in replay(read_trace(path)):
+            events += 1
+        replayed = time.perf_counter() - start
+        size = os.path.getsize(path)
+        assert world == dict(manager.world_state), "replay ended in another world state"
+        assert all(agents[agent.name] == agent.agent_state for agent in manager.agents), "replay lost an agent state"
+        print(f"{'JSONL trace':>12}: {elapsed:6.3f} s ({100 * (elapsed / off - 1):+.0f}%), {events} events, "
+              f"{size / 2 ** 10:.0f} KiB, replayed in {replayed:.3f} s")
+
+    _, elapsed = simulate(domain, args.max_steps, args.repeat, verbose=True)
+    print(f"{'console':>12}: {elapsed:6.3f} s ({100 * (elapsed / off - 1):+.0f}%)")
+
+
+if __name__ == '__main__':
+    main()
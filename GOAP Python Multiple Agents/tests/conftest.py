@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The modules import each other flat, as when run from this folder (python main.py)
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if HERE not in sys.path:
+    sys.path.insert(0, HERE)
@@ -0,0 +1,20 @@
+from BoundedSearch import plan_bounded
+from Planner import plan_actions, FOUND
+from SearchStats import SearchStats
+from benchmarks.domain_generator import generate_domain
+
+
+def test_capped_plans_stay_optimal():
+    domain = generate_domain(12, 4, 7, 3, 3, 3, 1)
+    for i, (_, _, goal) in enumerate(domain.agent_specs):
+        reference = SearchStats()
+        expected = plan_actions(domain.world_state, domain.agent_state_for(i), goal, domain.actions, heuristic='max',
+                                stats=reference)
+        for fraction in (1.0, 0.5, 0.25):
+            stats = SearchStats()
+            cap = int(fraction * reference.peak_visited)
+            result = plan_bounded(domain.world_state, domain.agent_state_for(i), goal, domain.actions, heuristic='max',
+                                  max_nodes=cap, stats=stats)
+            assert result.reason == FOUND and result.cost == expected.cost
+            assert stats.peak_visited <= cap + len(domain.actions) # One expansion's successors over the cap at most
+            assert (stats.evicted > 0) == (fraction < 1)
@@ -0,0 +1,35 @@
+from ConflictPlanner import ConflictPlanner, WAIT
+from benchmarks.conflict_planning import press_domain, RECEIVING
+
+
+def test_new_plans_wait_for_fixed_plans():
+    actions, world_state, agent_state, _ = press_domain(2)
+    # Agent 0 already holds raw stock and is on its way to claim the Press
+    busy = {**agent_state, 'agent_position': RECEIVING, 'agent_item': 'raw'}
+    remaining = [('Move to Press', 3), ('Claim Press', 1), ('Use Press', 5), ('Release Press', 1),
+                 ('Move to Dock', 3), ('Deliver Order 0', 2)]
+    requests = [(busy, {'delivered_0': True}), ({**agent_state, 'agent_position': RECEIVING}, {'delivered_1': True})]
+    planner = ConflictPlanner(actions + [WAIT])
+
+    alone = planner.plan_all(world_state, requests[1:])
+    assert alone[0][1][2][0] == 'Claim Press' # Planned alone, it would claim the Press right after agent 0
+
+    results = planner.plan_all(world_state, requests, fixed={0: remaining})
+    assert results[0] == (sum(cost for _, cost in remaining), remaining)
+    assert planner.last_search['resolved']
+    assert planner._first_conflict(world_state, requests, {0: remaining}, results) == (None, 0)
+    names = [name for name, _ in results[1][1]]
+    assert names.index('Claim Press') == 3 and WAIT.name in names # Agent 0 releases it earlier in tick 3
+
+
+def test_repair_matches_search():
+    actions, world_state, agent_state, agent_specs = press_domain(3)
+    requests = [({**agent_state, 'agent_position': position}, goal) for _, position, goal in agent_specs]
+    joint = {}
+    for greedy in (True, False):
+        planner = ConflictPlanner(actions + [WAIT], greedy=greedy)
+        joint[greedy] = planner.plan_all(world_state, requests)
+        assert planner.last_search['resolved']
+        assert planner._first_conflict(world_state, requests, {}, joint[greedy]) == (None, 0)
+    # Every agent only ever waits for the Press, so repairing the plans costs what searching again does
+    assert sum(cost for cost, _ in joint[True]) == sum(cost for cost, _ in joint[False])
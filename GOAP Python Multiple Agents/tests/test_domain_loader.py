@@ -0,0 +1,74 @@
+import os
+import random
+import subprocess
+import sys
+import pytest
+from BatchExpansion import plan_batched, make_expander
+from CompiledActions import compile_problem
+from DomainLoader import load_domain
+from Planner import plan_actions
+from Pruning import prune_actions
+from benchmarks.domain_generator import generate_domain
+from conftest import HERE
+
+FACTORY = os.path.join(HERE, 'domains', 'factory.json')
+
+
+def _write_artifact(cache_dir):
+    """Loads the factory in another process, which writes the compiled artifact with its own versions."""
+    subprocess.run([sys.executable, '-c', f"from DomainLoader import load_domain; load_domain({FACTORY!r}, cache_dir={cache_dir!r})"],
+                   cwd=HERE, check=True)
+
+
+def test_cached_action_sets_get_fresh_versions(tmp_path):
+    _write_artifact(str(tmp_path))
+    generated = generate_domain(12, 4, 7, 3, 3, 2)
+    for i, (_, _, goal) in enumerate(generated.agent_specs):
+        plan_batched(generated.world_state, generated.agent_state_for(i), goal, generated.actions, heuristic='max',
+                     backend='python')
+
+    domain = load_domain(FACTORY, cache_dir=str(tmp_path))
+    assert domain.from_cache
+    goal = domain.agent_specs[0][2]
+    state_dicts = [domain.world_state, domain.agent_state_for(0)]
+    compiled = compile_problem(state_dicts, prune_actions(domain.actions, goal), goal)[0]
+    assert make_expander(compiled, 'python').compiled is compiled
+    batched = plan_batched(*state_dicts, goal, domain.actions, heuristic='max', backend='python')
+    assert batched.cost == plan_actions(*state_dicts, goal, domain.actions, heuristic='max').cost
+
+
+@pytest.mark.skipif(not hasattr(os, 'getuid'), reason="POSIX permissions")
+def test_shared_cache_dir_is_not_unpickled(tmp_path):
+    _write_artifact(str(tmp_path))
+    os.chmod(tmp_path, 0o777)
+    with pytest.warns(RuntimeWarning):
+        domain = load_domain(FACTORY, cache_dir=str(tmp_path))
+    assert not domain.from_cache
+
+
+@pytest.mark.skipif(not hasattr(os, 'getuid'), reason="POSIX permissions")
+def test_writable_artifact_is_rebuilt(tmp_path):
+    _write_artifact(str(tmp_path))
+    for name in os.listdir(tmp_path):
+        os.chmod(tmp_path / name, 0o666)
+    assert not load_domain(FACTORY, cache_dir=str(tmp_path)).from_cache
+    assert load_domain(FACTORY, cache_dir=str(tmp_path)).from_cache # The rebuilt artifact is private
+
+
+def test_damaged_artifact_is_rebuilt(tmp_path):
+    _write_artifact(str(tmp_path))
+    (name,) = os.listdir(tmp_path)
+    artifact = tmp_path / name
+    good = artifact.read_bytes()
+    expected = load_domain(FACTORY, use_cache=False)
+    damaged = [good[:len(good) // 2]]
+    rng = random.Random(0)
+    for position in rng.sample(range(len(good)), 40):
+        flipped = bytearray(good)
+        flipped[position] ^= 1 << rng.randrange(8)
+        damaged.append(bytes(flipped))
+    for data in damaged:
+        artifact.write_bytes(data)
+        domain = load_domain(FACTORY, cache_dir=str(tmp_path)) # Rebuilt (or a harmless flip), never raising
+        assert len(domain.actions) == len(expected.actions)
+    assert load_domain(FACTORY, cache_dir=str(tmp_path)).from_cache # The last rebuild wrote a good artifact back
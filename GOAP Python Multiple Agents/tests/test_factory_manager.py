@@ -0,0 +1,14 @@
+from FactoryManager import FactoryManager
+
+
+def test_event_run_ends_when_budgets_never_suffice():
+    # A zero time budget never finds a plan, so each agent retries, then is parked for good
+    manager = FactoryManager(verbose=False, search_options={'time_budget': 0.0})
+    assert not manager.run_event_simulation(visualize=False, budget_retries=5)
+    assert manager.events == len(manager.agents) * 6 and manager.now == 5
+
+
+def test_event_run_with_anytime_search_meets_goals():
+    # One expansion per try: the default retries leave the search room to finish
+    manager = FactoryManager(verbose=False, search_options={'anytime': True, 'max_expansions': 1})
+    assert manager.run_event_simulation(visualize=False)
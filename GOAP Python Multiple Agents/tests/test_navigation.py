@@ -0,0 +1,44 @@
+import os
+import pytest
+from Navigation import Navigation, _HEADER
+
+FLOOR = ['.....',
+         '.###.',
+         '.....']
+STATIONS = [(0, 0), (4, 0), (2, 2)]
+
+
+def _plant(directory):
+    """Builds the table in directory, then overwrites it with a forged one of the right size (all zeros)."""
+    navigation = Navigation.from_grid(FLOOR, STATIONS, cache_dir=str(directory))
+    expected = {(a, b): navigation.distance(a, b) for a in STATIONS for b in STATIONS}
+    navigation.close()
+    (name,) = os.listdir(directory)
+    size = os.path.getsize(directory / name)
+    with open(directory / name, 'r+b') as f:
+        header = f.read(_HEADER.size)
+        f.seek(0)
+        f.write(header + bytes(size - len(header)))
+    return directory / name, expected
+
+
+@pytest.mark.skipif(not hasattr(os, 'getuid'), reason="POSIX permissions")
+def test_shared_cache_dir_is_not_mapped(tmp_path):
+    _, expected = _plant(tmp_path)
+    os.chmod(tmp_path, 0o777)
+    with pytest.warns(RuntimeWarning):
+        navigation = Navigation.from_grid(FLOOR, STATIONS, cache_dir=str(tmp_path))
+    assert navigation.built # Built in memory, not read from the planted file
+    assert {(a, b): navigation.distance(a, b) for a in STATIONS for b in STATIONS} == expected
+    navigation.close()
+
+
+@pytest.mark.skipif(not hasattr(os, 'getuid'), reason="POSIX permissions")
+def test_writable_table_is_rebuilt(tmp_path):
+    path, expected = _plant(tmp_path)
+    os.chmod(path, 0o666)
+    navigation = Navigation.from_grid(FLOOR, STATIONS, cache_dir=str(tmp_path))
+    assert navigation.built
+    assert {(a, b): navigation.distance(a, b) for a in STATIONS for b in STATIONS} == expected
+    navigation.close()
+    assert not Navigation.from_grid(FLOOR, STATIONS, cache_dir=str(tmp_path)).built # The rebuilt table is private
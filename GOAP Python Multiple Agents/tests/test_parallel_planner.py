@@ -0,0 +1,21 @@
+from Actions import ACTIONS
+from ParallelPlanner import ParallelPlanner
+from Planner import plan_actions
+from WorldState import WorldState
+
+AGENT = {'agent_position': (0, 0), 'agent_has_steel': False, 'agent_has_plate': False, 'agent_has_machined_part': False}
+
+
+def test_agents_with_different_keys():
+    world_state = WorldState().state
+    goal = {'has_finished_widget': True}
+    requests = [(AGENT, goal), ({**AGENT, 'extra_key': 1}, goal)]
+    later = [({**AGENT, 'agent_position': (5, 0), 'other_key': 'x'}, goal)]
+    planner = ParallelPlanner(ACTIONS, max_workers=0)
+    try:
+        for batch in (requests, later): # The second batch brings a key the first layout lacks
+            expected = [plan_actions(world_state, agent_state, goal_state, ACTIONS, heuristic='max')
+                        for agent_state, goal_state in batch]
+            assert [cost for cost, _ in planner.plan_all(world_state, batch)] == [result.cost for result in expected]
+    finally:
+        planner.close()
@@ -1,9 +1,18 @@
+import operator
 from WorldState import WorldState, calculate_move_cost
 
+# Action kinds: movement actions change agent_position to target_pos, task actions only apply effects
+MOVE = 'move'
+TASK = 'task'
+
+# Comparisons allowed in numeric_preconditions
+NUMERIC_OPERATORS = {'>=': operator.ge, '>': operator.gt, '<=': operator.le, '<': operator.lt}
+
 class Action:
-    def __init__(self, name, preconditions, effects, base_cost=1, target_pos=None, cost_modifiers=None):
+    def __init__(self, name, preconditions, effects, base_cost=1, target_pos=None, cost_modifiers=None, kind=TASK):
         # Changed 'cost' to 'base_cost' for clarity
         self.name = name
+        self.kind = kind
         self.preconditions = preconditions
         self.effects = effects
         self.base_cost = base_cost
@@ -15,7 +24,7 @@ class Action:
         # Calculates the actual cost, applying movement costs, reductions, and penalties.
         current_cost = self.base_cost
         # 1. Apply Dynamic Movement Cost
-        if self.name.startswith('Move to'):
+        if self.kind == MOVE:
             current_pos = world_state_dict['agent_position']
             current_cost = calculate_move_cost(current_pos, self.target_pos)
         # 2. Apply Optional Cost Modifiers (Penalties and Reductions)
@@ -38,18 +47,37 @@ class Action:
         if not all(world_state_dict.get(k) == v for k, v in self.preconditions.items()):
             return False
         # Prevent moving to the same spot
-        if self.name.startswith('Move to'):
+        if self.kind == MOVE:
             if world_state_dict['agent_position'] == self.target_pos:
                 return False
         
         return True
     
+    def min_cost(self):
+        """Lower bound of get_cost over every possible state (used by admissible heuristics)."""
+        if self.kind == MOVE:
+            # A move always changes position, so it is never cheaper than the cost floor of 1
+            return 1
+        # Assume every reduction fires and no penalty does
+        reductions = sum(m['adjustment'] for m in self.cost_modifiers if m['adjustment'] < 0)
+        return max(1, self.base_cost + reductions)
+
+    def produces(self, key, value):
+        """True if applying this action sets key to value."""
+        if key == 'agent_position' and self.kind == MOVE:
+            return self.target_pos == value
+        return key in self.effects and self.effects[key] == value
+
+    def combined_effects(self):
+        """All static effects of the action as one dict."""
+        return self.effects
+
     def apply_effects(self, world_state_copy):
         # Applies static effects
         world_state_copy.update(self.effects)
         
         # Dynamic Position Update
-        if self.name.startswith('Move to') and self.target_pos is not None:
+        if self.kind == MOVE and self.target_pos is not None:
             world_state_copy['agent_position'] = self.target_pos
         
         return world_state_copy
@@ -60,9 +88,9 @@ LOC = WorldState
 # 🏭 Manufacturing Action List with Penalties
 ACTIONS = [
     # --- MOVEMENT ACTIONS ---
-    Action(name='Move to Receiving', base_cost=1, preconditions={}, effects={}, target_pos=LOC.LOC_RECEIVING),
+    Action(name='Move to Receiving', base_cost=1, preconditions={}, effects={}, target_pos=LOC.LOC_RECEIVING, kind=MOVE),
     
-    Action(name='Move to Cutter', base_cost=1, preconditions={}, effects={}, target_pos=LOC.LOC_CUTTER,
+    Action(name='Move to Cutter', base_cost=1, preconditions={}, effects={}, target_pos=LOC.LOC_CUTTER, kind=MOVE,
            cost_modifiers=[
                {
                    'condition': {'has_raw_steel': True}, 
@@ -70,7 +98,7 @@ ACTIONS = [
                }
            ]),
     
-    Action(name='Move to Assembler', base_cost=1, preconditions={}, effects={}, target_pos=LOC.LOC_ASSEMBLER,
+    Action(name='Move to Assembler', base_cost=1, preconditions={}, effects={}, target_pos=LOC.LOC_ASSEMBLER, kind=MOVE,
            cost_modifiers=[
                {
                    'condition': {'has_raw_steel': True}, 
@@ -78,7 +106,7 @@ ACTIONS = [
                }
            ]),
            
-    Action(name='Move to Tool Rack', base_cost=1, preconditions={}, effects={}, target_pos=LOC.LOC_TOOL_RACK),
+    Action(name='Move to Tool Rack', base_cost=1, preconditions={}, effects={}, target_pos=LOC.LOC_TOOL_RACK, kind=MOVE),
     
     # --- SETUP ACTIONS ---
     Action(
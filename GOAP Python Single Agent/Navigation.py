@@ -0,0 +1,252 @@
+import hashlib
+import heapq
+import math
+import mmap
+import os
+import struct
+from array import array
+from collections import deque
+from PrivateCache import user_cache_dir, is_private, private_dir
+
+# Distance table file: header (magic, location count), then count x count int32 distances
+_MAGIC = b'GOAPNAV1'
+_HEADER = struct.Struct('<8sI4x')
+_UNREACHABLE = -1
+_EXTRA_ROWS = 64 # Single-source rows kept for positions that are not indexed locations
+
+
+class Navigation:
+    """
+    Walking distances between the locations of a floor plan, precomputed once.
+
+    The floor is an undirected graph with positive integer step costs: from_grid() builds it
+    from a text grid (one cell per character, walls block), from_graph() from weighted edges.
+    One shortest-path search per location (BFS on grids, Dijkstra on weighted graphs) fills a
+    locations x locations table that is written to a cache file and memory-mapped, so
+    distance() is two dict lookups and an index into shared pages. The cache file is named by
+    a hash of the floor plan and locations: later runs (and ParallelPlanner workers) map the
+    same file instead of rebuilding it. Only files in a private directory that belong to the
+    user are mapped, since wrong distances would break the heuristics' admissibility; in a
+    directory others can write to, the table is built and kept in memory instead.
+
+    Building costs one search per location, O(locations x cells); memory is the graph plus
+    4 bytes per table entry, which stays on disk until it is read (500 locations: 1 MB).
+
+    Set WorldState.navigation to a Navigation to make calculate_move_cost, and with it action
+    costs and the planner's heuristics, use these distances instead of Manhattan distance.
+    Shortest paths obey the triangle inequality, so every heuristic stays admissible.
+    """
+
+    def __init__(self, spec, nodes, neighbours, locations, cache_dir=None):
+        """
+        Use from_grid() or from_graph().
+
+        Args:
+            spec (tuple): Hashable description of the floor plan, for the cache key and pickling.
+            nodes (list): Every graph node.
+            neighbours (list): neighbours[i] = [(node index, step cost), ...].
+            locations (list): Positions (nodes) to precompute distances between.
+            cache_dir (str): Where the table file lives (default: goap_navigation in the user's
+                cache directory, created private).
+        """
+        self.spec = spec
+        self.cache_dir = cache_dir
+        self.nodes = nodes
+        self.node_index = {node: i for i, node in enumerate(nodes)}
+        self.neighbours = neighbours
+        self.locations = list(dict.fromkeys(locations))
+        for location in self.locations:
+            if location not in self.node_index:
+                raise ValueError(f"Location {location} is not on the floor plan")
+        self.index = {location: i for i, location in enumerate(self.locations)}
+        self.size = len(self.locations)
+        self.unit_steps = all(cost == 1 for edges in neighbours for _, cost in edges)
+        self.adjacent = [[j for j, _ in edges] for edges in neighbours] if self.unit_steps else None
+        self._extra = {}    # position -> {node index: distance}, for positions outside the table
+
+        key = hashlib.sha256(repr((spec, self.locations)).encode()).hexdigest()[:32]
+        directory = cache_dir if cache_dir is not None else user_cache_dir('goap_navigation')
+        self.path = os.path.join(directory, f'{key}.dist')
+        self.built = False
+        if not private_dir(directory, 'distance tables'):
+            self._map = None
+            self._table = memoryview(self._build())
+            self.built = True
+        elif not self._open():
+            self._write(self._build())
+            self.built = True
+            if not self._open():
+                raise OSError(f"Could not map the distance table {self.path}")
+
+    @classmethod
+    def from_grid(cls, rows, locations, walls='#', cache_dir=None):
+        """
+        A 4-connected grid: rows[y][x] is the cell at position (x, y), and each step costs 1.
+
+        On an open grid the distances equal calculate_move_cost's Manhattan distances.
+        """
+        rows = tuple(rows)
+        nodes = [(x, y) for y, row in enumerate(rows) for x, cell in enumerate(row) if cell not in walls]
+        node_index = {node: i for i, node in enumerate(nodes)}
+        neighbours = []
+        for x, y in nodes:
+            edges = []
+            for step in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+                j = node_index.get(step)
+                if j is not None:
+                    edges.append((j, 1))
+            neighbours.append(edges)
+        return cls(('grid', rows, walls), nodes, neighbours, locations, cache_dir)
+
+    @classmethod
+    def from_graph(cls, edges, locations=None, cache_dir=None):
+        """
+        A graph of walkways: edges is [(a, b, cost), ...] or {(a, b): cost} with positive integer
+        costs, walkable both ways. Locations default to every node.
+        """
+        if isinstance(edges, dict):
+            edges = [(a, b, cost) for (a, b), cost in edges.items()]
+        edges = tuple(sorted(edges, key=repr))
+        nodes = list(dict.fromkeys(node for a, b, _ in edges for node in (a, b)))
+        node_index = {node: i for i, node in enumerate(nodes)}
+        neighbours = [[] for _ in nodes]
+        for a, b, cost in edges:
+            if not isinstance(cost, int) or cost < 1:
+                raise ValueError(f"Edge {a} -> {b} needs a positive integer cost, got {cost!r}")
+            neighbours[node_index[a]].append((node_index[b], cost))
+            neighbours[node_index[b]].append((node_index[a], cost))
+        return cls(('graph', edges), nodes, neighbours, nodes if locations is None else locations, cache_dir)
+
+    def __reduce__(self):
+        # Pickled (e.g. for pool workers) as its floor plan: unpickling maps the cached file again
+        kind = self.spec[0]
+        if kind == 'grid':
+            return _from_grid, (self.spec[1], self.locations, self.spec[2], self.cache_dir)
+        return _from_graph, (self.spec[1], self.locations, self.cache_dir)
+
+    def __eq__(self, other):
+        # Same floor plan and locations, e.g. a copy unpickled from a compiled domain: same cache keys
+        return isinstance(other, Navigation) and other.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+    def _single_source(self, source, targets=None):
+        """Distances from node index source: {node index: distance}, stopping once targets are settled."""
+        remaining = len(targets) if targets is not None else -1
+        distances = {source: 0}
+        if targets is not None and source in targets:
+            remaining -= 1
+        if self.unit_steps:
+            # BFS over plain index lists: the build runs one per location over every cell
+            adjacent = self.adjacent
+            reached = [_UNREACHABLE] * len(self.nodes)
+            reached[source] = 0
+            queue = deque([source])
+            while queue and remaining:
+                node = queue.popleft()
+                step = reached[node] + 1
+                for neighbour in adjacent[node]:
+                    if reached[neighbour] == _UNREACHABLE:
+                        reached[neighbour] = step
+                        queue.append(neighbour)
+                        if targets is not None and neighbour in targets:
+                            remaining -= 1
+            return {node: distance for node, distance in enumerate(reached) if distance != _UNREACHABLE}
+        heap = [(0, source)]
+        settled = set()
+        while heap and remaining:
+            distance, node = heapq.heappop(heap)
+            if node in settled:
+                continue
+            settled.add(node)
+            if targets is not None and node in targets and node != source:
+                remaining -= 1
+            for neighbour, cost in self.neighbours[node]:
+                if distance + cost < distances.get(neighbour, math.inf):
+                    distances[neighbour] = distance + cost
+                    heapq.heappush(heap, (distance + cost, neighbour))
+        return distances
+
+    def _build(self):
+        """Fills the table with one search per location. Returns it (an int32 array, row by row)."""
+        n = self.size
+        table = array('i', [_UNREACHABLE]) * (n * n)
+        location_nodes = [self.node_index[location] for location in self.locations]
+        for i, source in enumerate(location_nodes):
+            # The graph is undirected: row i only needs the locations after i, earlier ones are filled in
+            later = set(location_nodes[i + 1:])
+            distances = self._single_source(source, later)
+            table[i * n + i] = 0
+            for j in range(i + 1, n):
+                distance = distances.get(location_nodes[j])
+                if distance is not None:
+                    table[i * n + j] = table[j * n + i] = distance
+        return table
+
+    def _write(self, table):
+        """Writes the table next to its final path, then moves it there."""
+        partial = f'{self.path}.{os.getpid()}.tmp'
+        with open(partial, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, self.size))
+            table.tofile(f)
+        os.replace(partial, self.path) # Atomic, so concurrent builders never see half a table
+
+    def _open(self):
+        """Maps the cached table. Returns False if it is missing, not private or does not match these locations."""
+        try:
+            with open(self.path, 'rb') as f:
+                if not is_private(os.fstat(f.fileno())):
+                    return False # Checked on the open file, so it cannot be swapped after the check
+                header = f.read(_HEADER.size)
+                if len(header) != _HEADER.size or _HEADER.unpack(header) != (_MAGIC, self.size):
+                    return False
+                if os.fstat(f.fileno()).st_size != _HEADER.size + 4 * self.size * self.size:
+                    return False
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, struct.error):
+            return False
+        self._table = memoryview(self._map)[_HEADER.size:].cast('i')
+        return True
+
+    def distance(self, start_pos, end_pos):
+        """Shortest walking distance between two positions (math.inf if no path connects them)."""
+        i = self.index.get(start_pos)
+        j = self.index.get(end_pos)
+        if i is not None and j is not None:
+            distance = self._table[i * self.size + j]
+        else:
+            # A position outside the table: search from it once and keep the row
+            position, other = (start_pos, end_pos) if i is None else (end_pos, start_pos)
+            row = self._extra.get(position)
+            if row is None:
+                if position not in self.node_index:
+                    raise ValueError(f"Position {position} is not on the floor plan")
+                if len(self._extra) >= _EXTRA_ROWS:
+                    self._extra.clear()
+                row = self._extra[position] = self._single_source(self.node_index[position])
+            distance = row.get(self.node_index.get(other), _UNREACHABLE)
+        return math.inf if distance == _UNREACHABLE else distance
+
+    def nearest(self, position, positions):
+        """The shortest distance from position to any of positions."""
+        return min((self.distance(position, p) for p in positions), default=math.inf)
+
+    def close(self):
+        """Unmaps the table file (the file itself stays cached)."""
+        if getattr(self, '_table', None) is not None:
+            self._table.release()
+            self._table = None
+            if self._map is not None:
+                self._map.close()
+
+    def __repr__(self):
+        return f"Navigation({self.spec[0]}, {len(self.nodes)} nodes, {self.size} locations, {self.path})"
+
+
+def _from_grid(rows, locations, walls, cache_dir):
+    return Navigation.from_grid(rows, locations, walls, cache_dir)
+
+
+def _from_graph(edges, locations, cache_dir):
+    return Navigation.from_graph(edges, locations, cache_dir)
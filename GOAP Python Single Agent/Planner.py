@@ -1,47 +1,338 @@
 import heapq
+import math
+import time
+from array import array
+from Heuristics import resolve_heuristic
+from CompiledActions import compile_problem
+from Pruning import prune_actions
 
-def plan_actions(start_state_dict, goal_state, available_actions):
-    
-    def get_state_tuple(state_dict):
-        """Converts the state dictionary into a stable, hashable tuple."""
-        # The agent_position tuple is already hashable, but we sort the dict items 
-        # to ensure the order is consistent regardless of dictionary implementation.
-        return tuple(sorted(state_dict.items()))
-
-    # Initial state setup
-    start_state_tuple = get_state_tuple(start_state_dict)
-    
-    # Priority Queue: (g_cost, state_tuple, plan)
-    pq = [(0, start_state_tuple, [])]
-    
-    # Visited states: {state_tuple: total_cost}
-    visited = {start_state_tuple: 0}
+# Why a search stopped (PlanResult.reason)
+FOUND = 'found'
+UNREACHABLE = 'unreachable'         # Proved: no plan exists from this state
+EXPANSION_LIMIT = 'max_expansions'  # Gave up: max_expansions reached first
+DEADLINE = 'deadline'               # Gave up: deadline passed first
+MEMORY_LIMIT = 'max_nodes'          # Gave up: the plan needs more nodes in memory than allowed (BoundedSearch.py)
+
+# Searches still running after this many expansions run a relaxed reachability test once, so
+# unreachable goals fail without exhausting the state space (cheap searches never pay for it)
+RELAXED_CHECK_AFTER = 256
+
+
+class PlanResult(tuple):
+    """
+    The (total_cost, plan) pair returned by the planners, so `cost, plan = plan_actions(...)`
+    keeps working, with details of the search as attributes:
+
+        reason: FOUND, UNREACHABLE, EXPANSION_LIMIT or DEADLINE.
+        bound: the plan costs at most bound x the optimal cost (1.0 = optimal, inf = no plan).
+        expansions: nodes expanded.
+    """
+
+    def __new__(cls, cost, plan, reason=FOUND, bound=1.0, expansions=0):
+        result = super().__new__(cls, (cost, plan))
+        result.reason = reason
+        result.bound = bound if cost is not None else math.inf
+        result.expansions = expansions
+        return result
+
+    def __reduce__(self):
+        return PlanResult, (self[0], self[1], self.reason, self.bound, self.expansions)
+
+    @property
+    def cost(self):
+        return self[0]
+
+    @property
+    def plan(self):
+        return self[1]
+
+
+def plan_actions(start_state_dict, goal_state, available_actions, heuristic=None, report_savings=False, stats=None,
+                 weight=1.0, max_expansions=None, deadline=None, prune=True):
+    """
+    A* search for the cheapest action sequence that reaches goal_state.
+
+    Args:
+        heuristic: None for uniform-cost search, a name from Heuristics.HEURISTICS
+            ('goal_count', 'distance', 'max') or a callable h(state_dict, goal_state).
+            It must never overestimate the remaining cost, otherwise plans may not be optimal.
+        report_savings (bool): Also run the uniform-cost search and print how many
+            node expansions the heuristic saved.
+        stats (SearchStats): Optional object that collects counters, timings and hooks for this search.
+        weight (float): Weighted A* (f = g + weight * h). Values above 1 expand fewer nodes and
+            return a plan costing at most weight x the optimum.
+        max_expansions (int): Stop with reason EXPANSION_LIMIT after expanding this many nodes.
+        deadline (float): Stop with reason DEADLINE once time.perf_counter() passes this value.
+        prune (bool): Search only the actions relevant to the goal and never chain two moves
+            (see Pruning.py). Neither changes the optimal cost; False searches every action.
+
+    Returns:
+        PlanResult: (total_cost, [(action_name, action_cost), ...]), or (None, None) if no plan
+        was found, with .reason, .bound and .expansions.
+    """
+    if weight < 1:
+        raise ValueError("weight must be at least 1 (1 = optimal A*)")
+    if prune:
+        available_actions = prune_actions(available_actions, goal_state)
+    # Compile the state layout and the actions over it (cached between searches)
+    compiled, start_code, goal_mask, goal_bits = compile_problem([start_state_dict], available_actions, goal_state)
+    h = resolve_heuristic(heuristic, goal_state, available_actions, compiled.layout)
+    if weight != 1:
+        base_h = h
+        h = lambda state_code: weight * base_h(state_code)
+    result = _search(compiled, start_code, goal_mask, goal_bits, h, stats=stats,
+                     max_expansions=max_expansions, deadline=deadline,
+                     unreachable=lambda: not compiled.may_reach(start_code, goal_state), prune_moves=prune)
+    if result.cost is not None:
+        result.bound = weight
+
+    if report_savings:
+        baseline = _search(compiled, start_code, goal_mask, goal_bits, lambda state_code: 0).expansions
+        print(f"[Planner] Heuristic expanded {result.expansions} nodes vs {baseline} for uniform-cost search "
+              f"(saved {baseline - result.expansions}).")
+
+    return result
+
+
+class SearchTree:
+    """
+    Array-backed search nodes.
+
+    A node is an index into parallel arrays holding its packed state, g-cost, parent node and
+    the index of the action that produced it. Plans are rebuilt by walking parent pointers
+    once the goal is popped, instead of copying a plan list on every heap push.
+    """
+    __slots__ = ('states', 'costs', 'parents', 'actions')
+
+    def __init__(self):
+        self.states = []
+        self.costs = []
+        self.parents = array('l')
+        self.actions = array('l')
+
+    def add(self, state_code, cost, parent=-1, action_index=-1):
+        self.states.append(state_code)
+        self.costs.append(cost)
+        self.parents.append(parent)
+        self.actions.append(action_index)
+        return len(self.states) - 1
+
+    def plan(self, node, available_actions):
+        """Rebuilds [(action_name, action_cost), ...] leading to node."""
+        plan = []
+        while self.parents[node] != -1:
+            parent = self.parents[node]
+            plan.append((available_actions[self.actions[node]].name, self.costs[node] - self.costs[parent]))
+            node = parent
+        plan.reverse()
+        return plan
+
+
+def _search(compiled, start_code, goal_mask, goal_bits, h, successors=None, closed=None, stats=None,
+            max_expansions=None, deadline=None, unreachable=None, prune_moves=False):
+    """
+    The A* loop behind plan_actions.
+
+    Args:
+        successors: Optional replacement for compiled.successors(state_code, skip_moves) (e.g. a memoised one).
+        closed (dict): Optional dict filled with {state_code: g_cost} for every expanded state.
+        stats (SearchStats): Optional; runs the instrumented copy of this loop instead.
+        max_expansions, deadline: Optional budgets (see plan_actions).
+        unreachable: Optional callable, run once after RELAXED_CHECK_AFTER expansions; True
+            proves the goal unreachable and ends the search.
+        prune_moves (bool): Don't expand moves from a state reached by a move, when the
+            compiled actions' moves compose (see Pruning.moves_compose).
+
+    Returns:
+        PlanResult with bound 1.0 (callers that weight h set the bound).
+    """
+    if stats is not None:
+        return _search_instrumented(compiled, start_code, goal_mask, goal_bits, h, successors, closed, stats,
+                                    max_expansions, deadline, unreachable, prune_moves)
+
+    # States are packed into ints by a compiled StateLayout (see StateEncoding.py) and actions
+    # are compiled to bit masks over it (see CompiledActions.py): hashing, visited lookups,
+    # precondition checks and effects are all int operations.
+    tree = SearchTree()
+    root = tree.add(start_code, 0)
+    start_estimate = h(start_code)
+    if start_estimate == math.inf:
+        return PlanResult(None, None, UNREACHABLE) # Fails fast: the heuristic proves it
+
+    # Priority Queue: (f_cost = g_cost + h, g_cost, node)
+    pq = [(start_estimate, 0, root)]
+
+    # Visited states: {state_code: total_cost}
+    visited = {start_code: 0}
+    expansions = 0
+    if successors is None:
+        successors = compiled.successors
+    clock = time.perf_counter
+    check_at = RELAXED_CHECK_AFTER if unreachable is not None else -1
+    # A state reached by a move only needs its task successors (the root was not reached by one)
+    is_move = compiled.is_move if prune_moves and compiled.moves_compose else None
+
+    while pq:
+        _, cost, node = heapq.heappop(pq)
+        current_code = tree.states[node]
+
+        # Skip stale entries: a cheaper path to this state was pushed after this one
+        if cost > visited[current_code]:
+            continue
+
+        # 1. Goal Check (then the budgets, checked once per expansion)
+        if current_code & goal_mask == goal_bits:
+            return PlanResult(cost, tree.plan(node, compiled.actions), FOUND, 1.0, expansions)
+        if expansions == max_expansions:
+            return PlanResult(None, None, EXPANSION_LIMIT, expansions=expansions)
+        if deadline is not None and clock() > deadline:
+            return PlanResult(None, None, DEADLINE, expansions=expansions)
+        if expansions == check_at and unreachable():
+            return PlanResult(None, None, UNREACHABLE, expansions=expansions)
+        expansions += 1
+        if closed is not None:
+            closed[current_code] = cost
+
+        # 2. Explore the applicable actions (found through the precondition index)
+        skip_moves = is_move is not None and node != root and is_move[tree.actions[node]]
+        for action_index, next_code, action_cost in successors(current_code, skip_moves):
+            new_cost = cost + action_cost
+
+            # 3. A* check (If this is a cheaper path to an already visited state)
+            if next_code not in visited or new_cost < visited[next_code]:
+                estimate = h(next_code)
+                if estimate == math.inf:
+                    continue # The goal cannot be reached from here
+                visited[next_code] = new_cost
+                child = tree.add(next_code, new_cost, node, action_index)
+                heapq.heappush(pq, (new_cost + estimate, new_cost, child))
+
+    return PlanResult(None, None, UNREACHABLE, expansions=expansions)
+
+
+def _timed_successors(compiled, timings):
+    """compiled.successors, with the precondition, effect and cost steps timed separately."""
+    clock = time.perf_counter
+    applicable, apply, action_cost = compiled.applicable, compiled.apply, compiled.cost
+
+    def successors(state_code, skip_moves=False):
+        started = clock()
+        indices = applicable(state_code, skip_moves)
+        checked = clock()
+        next_codes = [apply(i, state_code) for i in indices]
+        applied = clock()
+        result = []
+        for i, next_code in zip(indices, next_codes):
+            if next_code is not None:
+                cost = action_cost(i, state_code)
+                if cost != math.inf:
+                    result.append((i, next_code, cost))
+        timings['preconditions'] += checked - started
+        timings['effects'] += applied - checked
+        timings['costs'] += clock() - applied
+        return result
+    return successors
+
+
+def _search_instrumented(compiled, start_code, goal_mask, goal_bits, h, successors, closed, stats,
+                         max_expansions, deadline, unreachable, prune_moves):
+    """
+    _search with SearchStats counters, timings and hooks.
+
+    Kept as a separate copy of the loop so that searches without stats pay nothing for it.
+    Same expansion order and results as _search.
+    """
+    clock = time.perf_counter
+    started = clock()
+    timings = stats.timings
+    on_expand, on_goal = stats.on_expand, stats.on_goal
+    if successors is None:
+        successors = _timed_successors(compiled, timings)
+        timed_separately = True
+    else:
+        timed_separately = False
+
+    tree = SearchTree()
+    root = tree.add(start_code, 0)
+    start_estimate = h(start_code)
+    pq = [(start_estimate, 0, root)] if start_estimate != math.inf else []
+    visited = {start_code: 0}
+    expansions = generated = duplicates = stale = 0
+    peak_heap = len(pq)
+    result = PlanResult(None, None, UNREACHABLE)
+    check_at = RELAXED_CHECK_AFTER if unreachable is not None else -1
+    is_move = compiled.is_move if prune_moves and compiled.moves_compose else None
 
     while pq:
-        cost, current_state_tuple, plan = heapq.heappop(pq)
-        current_state_dict = dict(current_state_tuple)
-
-        # 1. Goal Check
-        if all(current_state_dict.get(k) == v for k, v in goal_state.items()):
-            return cost, plan
-
-        # 2. Explore Actions
-        for action in available_actions:
-            if action.check_preconditions(current_state_dict):
-                
-                # 3. Calculate new state and cost
-                next_state_dict = current_state_dict.copy()
-                next_state_dict = action.apply_effects(next_state_dict)
-                
-                action_cost = action.get_cost(current_state_dict)
-                new_cost = cost + action_cost
-                
-                next_state_tuple = get_state_tuple(next_state_dict)
-
-                # 4. A* check (If this is a cheaper path to an already visited state)
-                if next_state_tuple not in visited or new_cost < visited[next_state_tuple]:
-                    visited[next_state_tuple] = new_cost
-                    new_plan = plan + [(action.name, action_cost)]
-                    heapq.heappush(pq, (new_cost, next_state_tuple, new_plan))
-
-    return None, None
\ No newline at end of file
+        tick = clock()
+        _, cost, node = heapq.heappop(pq)
+        timings['queue'] += clock() - tick
+        current_code = tree.states[node]
+
+        if cost > visited[current_code]:
+            stale += 1
+            continue
+
+        if current_code & goal_mask == goal_bits:
+            result = PlanResult(cost, tree.plan(node, compiled.actions), FOUND)
+            if on_goal is not None:
+                on_goal(*result)
+            break
+        if expansions == max_expansions:
+            result = PlanResult(None, None, EXPANSION_LIMIT)
+            break
+        if deadline is not None and clock() > deadline:
+            result = PlanResult(None, None, DEADLINE)
+            break
+        if expansions == check_at and unreachable():
+            break
+        expansions += 1
+        if closed is not None:
+            closed[current_code] = cost
+        if on_expand is not None:
+            on_expand(current_code, cost)
+
+        tick = clock()
+        children = successors(current_code, is_move is not None and node != root and is_move[tree.actions[node]])
+        if not timed_separately:
+            timings['successors'] += clock() - tick
+
+        for action_index, next_code, action_cost in children:
+            generated += 1
+            new_cost = cost + action_cost
+
+            tick = clock()
+            known = visited.get(next_code)
+            timings['hashing'] += clock() - tick
+            if known is not None and new_cost >= known:
+                duplicates += 1
+                continue
+
+            tick = clock()
+            estimate = h(next_code)
+            timings['heuristic'] += clock() - tick
+            if estimate == math.inf:
+                continue
+
+            tick = clock()
+            visited[next_code] = new_cost
+            timings['hashing'] += clock() - tick
+            child = tree.add(next_code, new_cost, node, action_index)
+            tick = clock()
+            heapq.heappush(pq, (new_cost + estimate, new_cost, child))
+            timings['queue'] += clock() - tick
+        if len(pq) > peak_heap:
+            peak_heap = len(pq)
+
+    stats.searches += 1
+    stats.failures += result.reason == UNREACHABLE
+    stats.budget_stops += result.reason in (EXPANSION_LIMIT, DEADLINE)
+    stats.expanded += expansions
+    stats.generated += generated
+    stats.duplicates += duplicates
+    stats.stale += stale
+    stats.peak_heap = max(stats.peak_heap, peak_heap)
+    stats.peak_visited = max(stats.peak_visited, len(visited))
+    stats.wall_time += clock() - started
+    result.expansions = expansions
+    return result
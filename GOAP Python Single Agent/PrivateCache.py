@@ -0,0 +1,32 @@
+import os
+import warnings
+
+
+def user_cache_dir(name):
+    """
+    name under the user's own cache directory ($XDG_CACHE_HOME, %LOCALAPPDATA% or ~/.cache).
+    Never a shared temp directory: anyone can plant files there, and cached files are trusted.
+    """
+    base = os.environ.get('XDG_CACHE_HOME') or (os.name == 'nt' and os.environ.get('LOCALAPPDATA'))
+    return os.path.join(base or os.path.join(os.path.expanduser('~'), '.cache'), name)
+
+
+def is_private(info):
+    """True if a stat result belongs to the current user and nobody else can write to it."""
+    if not hasattr(os, 'getuid'):
+        return True # Windows: per-user profile directories are not shared
+    return info.st_uid == os.getuid() and not info.st_mode & 0o022
+
+
+def private_dir(directory, contents):
+    """
+    Creates directory (for the user only) if it is missing. Returns True if it is private;
+    otherwise warns with a RuntimeWarning that the contents (e.g. 'compiled domains') in it are
+    not used, and returns False. Files opened from a private directory still need is_private
+    on their fstat: an existing file keeps the owner and mode it was created with.
+    """
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    if is_private(os.stat(directory)):
+        return True
+    warnings.warn(f"{directory} is writable by other users: the {contents} in it are not used", RuntimeWarning)
+    return False
@@ -0,0 +1,106 @@
+from Actions import MOVE
+
+# Optimality-preserving pruning, run once per (action set, goal) before searching.
+# Neither pass can remove the cheapest plan, so plan_actions applies them by default.
+
+def moves_compose(available_actions):
+    """
+    True if moving straight to a station never costs more than getting there through another one.
+
+    Move costs are distances (calculate_move_cost obeys the triangle inequality), so this holds
+    as long as moves only change agent_position, need nothing, and have no cost reductions or
+    modifiers that depend on where the agent stands. Then the search never needs two moves in
+    a row (e.g. away and back with nothing done in between), and moves to stations no action
+    needs can be dropped.
+    """
+    for action in available_actions:
+        if action.kind != MOVE:
+            continue
+        if (action.preconditions or action.combined_effects() or getattr(action, 'numeric_preconditions', None)
+                or getattr(action, 'local_deltas', None) or getattr(action, 'shared_deltas', None)):
+            return False
+        for modifier in action.cost_modifiers:
+            if modifier['adjustment'] < 0 or 'agent_position' in modifier['condition']:
+                return False
+    return True
+
+
+def _changed_keys(action):
+    keys = set(action.combined_effects())
+    keys.update(getattr(action, 'local_deltas', {}))
+    keys.update(getattr(action, 'shared_deltas', {}))
+    if action.kind == MOVE:
+        keys.add('agent_position')
+    return keys
+
+
+def _read_keys(action):
+    keys = set(action.preconditions)
+    keys.update(getattr(action, 'numeric_preconditions', {}))
+    for modifier in action.cost_modifiers:
+        keys.update(modifier['condition'])
+    return keys
+
+
+def relevant_actions(available_actions, goal_state):
+    """
+    Backward relevance analysis: the actions that can ever matter for reaching goal_state.
+
+    Starting from the goal keys, an action is relevant if it changes a relevant key. Its
+    precondition keys and cost-modifier condition keys then become relevant too: modifier keys
+    count because changing them can make a relevant action cheaper. Whatever is left can
+    neither enable the goal nor change a plan's cost. When moves compose (see moves_compose),
+    moves are also only kept towards the stations the goal or a relevant action needs.
+
+    Returns:
+        list: The relevant actions, in their original order.
+    """
+    relevant_keys = set(goal_state)
+    relevant = [False] * len(available_actions)
+    changed = True
+    while changed:
+        changed = False
+        for i, action in enumerate(available_actions):
+            if not relevant[i] and _changed_keys(action) & relevant_keys:
+                relevant[i] = changed = True
+                relevant_keys |= _read_keys(action)
+    kept = [action for i, action in enumerate(available_actions) if relevant[i]]
+
+    if not moves_compose(available_actions):
+        return kept
+    # Stations worth walking to: every position a relevant action, modifier or the goal mentions
+    needed = set()
+    if 'agent_position' in goal_state:
+        needed.add(goal_state['agent_position'])
+    for action in kept:
+        if action.kind != MOVE and 'agent_position' in action.preconditions:
+            needed.add(action.preconditions['agent_position'])
+        for modifier in action.cost_modifiers:
+            if 'agent_position' in modifier['condition']:
+                return kept # Standing somewhere can change a cost, so every station may matter
+    return [action for action in kept if action.kind != MOVE or action.target_pos in needed]
+
+
+# Pruned action lists are reused while the same action set is planned towards the same goal
+_PRUNED_CACHE = {}
+_PRUNED_CACHE_SIZE = 256
+
+def _cache_key(available_actions, goal_state):
+    return tuple(available_actions), tuple(sorted(goal_state.items(), key=str))
+
+def prune_actions(available_actions, goal_state):
+    """relevant_actions, cached per (action set, goal). Returns a tuple, so it can key other caches."""
+    cache_key = _cache_key(available_actions, goal_state)
+    pruned = _PRUNED_CACHE.get(cache_key)
+    if pruned is None:
+        if len(_PRUNED_CACHE) >= _PRUNED_CACHE_SIZE:
+            _PRUNED_CACHE.clear()
+        pruned = _PRUNED_CACHE[cache_key] = tuple(relevant_actions(list(available_actions), goal_state))
+    return pruned
+
+
+def preload_pruned(available_actions, goal_state, pruned):
+    """Seeds the cache with a pruned tuple computed earlier (e.g. loaded from a compiled domain file)."""
+    if len(_PRUNED_CACHE) >= _PRUNED_CACHE_SIZE:
+        _PRUNED_CACHE.clear()
+    _PRUNED_CACHE[_cache_key(available_actions, goal_state)] = tuple(pruned)
@@ -4,6 +4,9 @@ class WorldState:
     LOC_CUTTER = (10, 5)        # Machine 1: Processes raw material
     LOC_ASSEMBLER = (5, 0)      # Machine 2: Finishes the part
     LOC_TOOL_RACK = (2, 8)      # Where the Cutting Tool is stored
+
+    # Floor plan for movement costs (a Navigation); None walks an open floor (Manhattan distance)
+    navigation = None
     
     def __init__(self, agent_pos=LOC_RECEIVING):
         self.state = {
@@ -15,8 +18,10 @@ class WorldState:
             'agent_position': agent_pos  # Agent's (x, y) coordinates
         }
 
-# Helper function for cost remains the same
+# Helper function for cost: the walking distance on WorldState.navigation, or Manhattan distance
 def calculate_move_cost(start_pos, end_pos):
+    if WorldState.navigation is not None:
+        return WorldState.navigation.distance(start_pos, end_pos)
     dx = abs(end_pos[0] - start_pos[0])
     dy = abs(end_pos[1] - start_pos[1])
     return dx + dy
\ No newline at end of file
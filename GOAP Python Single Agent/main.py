@@ -12,7 +12,7 @@ print(f"Agent Start Position: {initial_state_dict['agent_position']}")
 print(f"Goal: {goal}")
 
 # The planning step
-total_cost, plan_with_costs = plan_actions(initial_state_dict, goal, ACTIONS)
+total_cost, plan_with_costs = plan_actions(initial_state_dict, goal, ACTIONS, heuristic='max')
 
 # --- Execution ---
 if plan_with_costs: